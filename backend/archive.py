@@ -0,0 +1,126 @@
+import os
+import uuid
+import operator
+from functools import reduce
+import datetime
+from typing import Dict, List
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlmodel import Session, select, delete
+
+from backend.db import engine as default_engine
+from backend.models import QueryLog
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive/querylog")
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "50000"))
+
+# --- Cold-storage schema: QueryLog columns + hive 'date' partition ---
+_TYPES = {str: pa.string(), bool: pa.bool_(), int: pa.int64(), float: pa.float64(),
+          datetime.datetime: pa.timestamp("us")}
+
+def _column_type(field) -> pa.DataType:
+    ann = field.annotation
+    # Optional[X] archives as X (nullable)
+    args = [a for a in getattr(ann, "__args__", ()) if a is not type(None)]
+    if len(args) == 1:
+        ann = args[0]
+    return _TYPES.get(ann, pa.string())
+
+ARCHIVE_SCHEMA = pa.schema([(name, _column_type(f)) for name, f in QueryLog.model_fields.items()])
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def _to_table(rows: List[QueryLog]) -> pa.Table:
+    cols = {name: [getattr(r, name) for r in rows] for name in ARCHIVE_SCHEMA.names}
+    table = pa.Table.from_pydict(cols, schema=ARCHIVE_SCHEMA)
+    return table.append_column("date", pa.array([r.timestamp.strftime("%Y-%m-%d") for r in rows], pa.string()))
+
+# --- Retention job: hot SQLite -> cold day-partitioned Parquet ---
+def archive_querylog(days: int = ARCHIVE_RETENTION_DAYS, archive_dir: str = ARCHIVE_DIR,
+                     batch_rows: int = ARCHIVE_BATCH_ROWS, engine=None) -> Dict:
+    """
+    Move QueryLog rows older than `days` into zstd Parquet partitioned by date.
+    Each batch is deleted from SQLite only after its Parquet files are written.
+    QueryRollup summaries are kept, so dashboard totals still cover archived rows.
+    """
+    engine = engine or default_engine
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    moved, files_before = 0, _count_files(archive_dir)
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(QueryLog).where(QueryLog.timestamp < cutoff)
+                .order_by(QueryLog.timestamp).limit(batch_rows)
+            ).all()
+            if not rows:
+                break
+            pq.write_to_dataset(
+                _to_table(rows), root_path=archive_dir, partitioning=PARTITIONING,
+                compression="zstd", basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            )
+            ids = [r.id for r in rows]
+            session.exec(delete(QueryLog).where(QueryLog.id.in_(ids)))
+            session.commit()
+            moved += len(ids)
+    return {
+        "cutoff": cutoff.isoformat(),
+        "rows_archived": moved,
+        "files_written": _count_files(archive_dir) - files_before,
+        "archive_dir": archive_dir,
+    }
+
+def _count_files(path: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(path)) if os.path.isdir(path) else 0
+
+# --- Unified audit query over hot + cold storage ---
+def query_audit(start: datetime.datetime | None = None, end: datetime.datetime | None = None,
+                role: str | None = None, username: str | None = None, limit: int = 1000,
+                archive_dir: str = ARCHIVE_DIR, engine=None) -> List[Dict]:
+    """
+    Rows matching the filters, newest first, from SQLite and the Parquet archive.
+    Date filters prune partitions; role/username are pushed into the Parquet scan.
+    """
+    engine = engine or default_engine
+    with Session(engine) as session:
+        stmt = select(QueryLog)
+        if start:
+            stmt = stmt.where(QueryLog.timestamp >= start)
+        if end:
+            stmt = stmt.where(QueryLog.timestamp < end)
+        if role:
+            stmt = stmt.where(QueryLog.role == role)
+        if username:
+            stmt = stmt.where(QueryLog.username == username)
+        hot = [r.model_dump() for r in session.exec(stmt.order_by(QueryLog.timestamp.desc()).limit(limit)).all()]
+
+    cold: List[Dict] = []
+    if os.path.isdir(archive_dir) and len(hot) < limit:
+        # explicit schema: files archived before a column was added read it back as null
+        dataset = ds.dataset(archive_dir, format="parquet", partitioning=PARTITIONING,
+                             schema=ARCHIVE_SCHEMA.append(pa.field("date", pa.string())))
+        filters = []
+        if start:
+            filters.append(ds.field("date") >= start.strftime("%Y-%m-%d"))
+            filters.append(ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us")))
+        if end:
+            filters.append(ds.field("date") <= end.strftime("%Y-%m-%d"))
+            filters.append(ds.field("timestamp") < pa.scalar(end, pa.timestamp("us")))
+        if role:
+            filters.append(ds.field("role") == role)
+        if username:
+            filters.append(ds.field("username") == username)
+        expr = reduce(operator.and_, filters) if filters else None
+        table = dataset.to_table(columns=ARCHIVE_SCHEMA.names, filter=expr)
+        if table.num_rows:
+            table = table.sort_by([("timestamp", "descending")]).slice(0, limit - len(hot))
+            cold = table.to_pylist()
+
+    # a crash between Parquet write and SQLite delete can leave a row in both; keep one
+    seen, out = set(), []
+    for row in sorted(hot + cold, key=lambda r: r["timestamp"], reverse=True):
+        if row["id"] not in seen:
+            seen.add(row["id"])
+            out.append(row)
+    return out[:limit]
@@ -0,0 +1,152 @@
+import os
+import time
+import queue
+import logging
+import datetime
+import threading
+from typing import Dict, List
+from sqlmodel import Session
+
+from backend.db import engine
+from backend.models import QueryLog, gen_uuid
+from backend import rollups
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_S = float(os.getenv("AUDIT_FLUSH_INTERVAL_S", "0.5"))
+# A failing batch is retried this many times (backoff doubling from AUDIT_RETRY_BACKOFF_S)
+# before it is split and written row by row
+AUDIT_RETRIES = int(os.getenv("AUDIT_RETRIES", "3"))
+AUDIT_RETRY_BACKOFF_S = float(os.getenv("AUDIT_RETRY_BACKOFF_S", "0.2"))
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditLogWriter:
+    """
+    Write-behind QueryLog writer. Requests enqueue rows and return at once;
+    a background thread commits them in batched transactions, updating the
+    per-minute QueryRollup summaries in the same transaction.
+    """
+
+    def __init__(self, maxsize: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL_S):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict] = {}   # enqueued but not yet committed rows
+        self.counters = {"rows_written": 0, "updates_written": 0, "batches": 0, "errors": 0,
+                         "retries": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name="audit-writer")
+        self._thread.start()
+
+    # --- request side ---
+    def log(self, **fields) -> str:
+        """Queue a QueryLog row; returns its id immediately. Blocks only if the queue is full."""
+        row = {"id": gen_uuid(), "timestamp": datetime.datetime.utcnow(), **fields}
+        with self._lock:
+            self._pending[row["id"]] = row
+        self._queue.put(("insert", row))
+        return row["id"]
+
+    def update(self, query_id: str, **fields) -> bool:
+        """Queue an update; works whether or not the row has been flushed yet."""
+        with self._lock:
+            known = query_id in self._pending
+        if not known:
+            with Session(engine) as session:
+                known = session.get(QueryLog, query_id) is not None
+        if not known:
+            return False
+        self._queue.put(("update", {"id": query_id, **fields}))
+        return True
+
+    # --- writer side ---
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            item = first
+            while True:
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[tuple]):
+        try:
+            if self._write_with_retry(batch):
+                return
+            # The batch keeps failing: write op by op so a single bad row is dropped
+            # rather than everything queued alongside it.
+            for op in batch:
+                if not self._write_with_retry([op], attempts=1):
+                    self.counters["dropped"] += 1
+                    log.error("audit %s dropped (id=%s)", op[0], op[1]["id"])
+        finally:
+            with self._lock:
+                for op, data in batch:
+                    if op == "insert":
+                        self._pending.pop(data["id"], None)
+
+    def _write_with_retry(self, ops: List[tuple], attempts: int = AUDIT_RETRIES + 1) -> bool:
+        """Commit ops in one transaction, retrying transient failures with exponential backoff."""
+        for attempt in range(attempts):
+            try:
+                self._write(ops)
+            except Exception as e:
+                self.counters["errors"] += 1
+                log.warning("audit flush failed (%d ops, attempt %d/%d): %s", len(ops), attempt + 1, attempts, e)
+                if attempt + 1 < attempts:
+                    self.counters["retries"] += 1
+                    time.sleep(AUDIT_RETRY_BACKOFF_S * 2 ** attempt)
+                continue
+            self.counters["batches"] += 1
+            self.counters["rows_written"] += sum(1 for op, _ in ops if op == "insert")
+            self.counters["updates_written"] += sum(1 for op, _ in ops if op == "update")
+            return True
+        return False
+
+    def _write(self, ops: List[tuple]):
+        with Session(engine) as session:
+            inserted: Dict[str, QueryLog] = {}
+            for op, data in ops:
+                if op == "insert":
+                    row = QueryLog(**data)
+                    inserted[row.id] = row
+                    session.add(row)
+                    rollups.apply_inserts(session, [row])
+                else:
+                    row = inserted.get(data["id"]) or session.get(QueryLog, data["id"])
+                    if row is None:
+                        continue
+                    if "feedback" in data:
+                        rollups.apply_feedback_change(session, row, row.feedback, data["feedback"])
+                    for key, val in data.items():
+                        if key != "id":
+                            setattr(row, key, val)
+                    session.add(row)
+            session.commit()
+
+    def close(self, timeout: float | None = 30.0):
+        """Drain everything queued so far, then stop the writer."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "queued": self._queue.qsize(), "pending_rows": len(self._pending)}
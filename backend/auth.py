@@ -1,10 +1,15 @@
 import os
+import time
+import threading
+from collections import deque
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import select
+from sqlalchemy import event, inspect
 from typing import Generator
 from dotenv import load_dotenv
 
@@ -22,6 +27,10 @@ SECRET_KEY = os.getenv("JWT_SECRET", "devsecret_replace_me")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# --- Principal cache config ---
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "60"))
+
 # --- Password helpers ---
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
@@ -47,8 +56,77 @@ def authenticate_user(session, username: str, password: str):
         return None
     return user
 
+# --- Principal cache ---
+# Validated users keyed by JWT subject. Role changes and deletes made through the ORM
+# in this process invalidate immediately; other processes see them within AUTH_CACHE_TTL_S.
+_principal_cache: TTLCache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_S)
+_cache_lock = threading.Lock()
+_auth_counters = {"hits": 0, "misses": 0, "invalidations": 0, "logins": 0}
+_auth_latency = deque(maxlen=1024)    # recent get_current_user durations (s)
+_login_latency = deque(maxlen=256)    # recent authenticate_user durations (s)
+
+def invalidate_user(username: str | None = None):
+    """Drop one cached principal, or all of them when username is None."""
+    with _cache_lock:
+        if username is None:
+            _principal_cache.clear()
+        else:
+            _principal_cache.pop(username, None)
+        _auth_counters["invalidations"] += 1
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_changed(mapper, connection, target):
+    invalidate_user(target.username)
+    # a renamed user must not stay cached under the old subject either
+    for old in inspect(target).attrs.username.history.deleted or ():
+        invalidate_user(old)
+
+def _cached_user(username: str) -> User | None:
+    with _cache_lock:
+        user = _principal_cache.get(username)
+        _auth_counters["hits" if user is not None else "misses"] += 1
+    if user is not None:
+        return user
+    with get_session_ctx() as session:
+        user = get_user_by_username(username, session)
+        if user is not None:
+            session.expunge(user)
+    if user is not None:
+        with _cache_lock:
+            _principal_cache[username] = user
+    return user
+
+def _p95(values) -> float:
+    ordered = sorted(values)
+    return ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0
+
+def auth_stats() -> dict:
+    with _cache_lock:
+        lookups = _auth_counters["hits"] + _auth_counters["misses"]
+        auth_lat, login_lat = list(_auth_latency), list(_login_latency)
+        return {
+            **_auth_counters,
+            "cached_principals": len(_principal_cache),
+            "hit_rate": round(_auth_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "auth_latency_ms_avg": round(1000 * sum(auth_lat) / len(auth_lat), 3) if auth_lat else 0.0,
+            "auth_latency_ms_p95": round(1000 * _p95(auth_lat), 3),
+            "login_latency_ms_avg": round(1000 * sum(login_lat) / len(login_lat), 3) if login_lat else 0.0,
+        }
+
+# --- Login (bcrypt is slow by design; callers run this off the event loop) ---
+def login_user(username: str, password: str) -> User | None:
+    start = time.perf_counter()
+    with get_session_ctx() as session:
+        user = authenticate_user(session, username, password)
+    with _cache_lock:
+        _auth_counters["logins"] += 1
+        _login_latency.append(time.perf_counter() - start)
+    return user
+
 # --- Token verification ---
 def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    start = time.perf_counter()
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -62,10 +140,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError as e:
         raise credentials_exception from e
 
-    with get_session_ctx() as session:
-        user = get_user_by_username(username, session)
+    user = _cached_user(username)
     if user is None:
         raise credentials_exception
+    with _cache_lock:
+        _auth_latency.append(time.perf_counter() - start)
     return user
 
 # --- Role-based restriction helper ---
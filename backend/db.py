@@ -1,5 +1,6 @@
 import os
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import inspect, text, event
 from contextlib import contextmanager
 from dotenv import load_dotenv
 
@@ -10,9 +11,36 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./regiguard.db")
 engine = create_engine(DATABASE_URL, echo=False)
 
+# --- SQLite: WAL so readers never wait on the (write-behind) audit writer ---
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
 # --- Initialize tables ---
 def init_db():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+
+# --- Lightweight migration: add new nullable columns and indexes to existing tables ---
+def add_missing_columns():
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}'))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 # --- FastAPI dependency (used in Depends) ---
 def get_session():
@@ -0,0 +1,144 @@
+import os
+import time
+import uuid
+import datetime
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from backend.parsing import parse_job_file
+
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# docs handed to add_documents (and so embedded) per batch
+INGEST_BATCH_DOCS = int(os.getenv("INGEST_BATCH_DOCS", "32"))
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "regiguard_uploads"))
+MAX_JOBS_KEPT = 100
+
+
+class IngestJob:
+    def __init__(self, access: str, filenames: List[str]):
+        self.id = uuid.uuid4().hex
+        self.access = access
+        self.status = "queued"   # queued | parsing | indexing | done | failed
+        self.files_total = len(filenames)
+        self.files_parsed = 0
+        self.docs_indexed = 0    # new or updated; unchanged docs are only counted in outcomes
+        self.chunks_indexed = 0
+        self.outcomes = {"new": 0, "updated": 0, "skipped": 0}
+        self.errors: List[Dict] = []
+        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+            return {
+                "id": self.id,
+                "status": self.status,
+                "access": self.access,
+                "created_at": self.created_at,
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "docs_indexed": self.docs_indexed,
+                "chunks_indexed": self.chunks_indexed,
+                "outcomes": dict(self.outcomes),
+                "progress": 1.0 if self.status in ("done", "failed") or not self.files_total else
+                min(1.0, round((self.files_parsed + sum(self.outcomes.values()) + len(self.errors)) / (2 * self.files_total), 3)),
+                "elapsed_s": round(elapsed, 3),
+                "docs_per_s": round(self.docs_indexed / elapsed, 2) if elapsed else 0.0,
+                "chunks_per_s": round(self.chunks_indexed / elapsed, 2) if elapsed else 0.0,
+                "errors": list(self.errors),
+            }
+
+
+class IngestJobManager:
+    """Parses uploads in a process pool and indexes them in batches on a background thread."""
+
+    def __init__(self, add_documents, parse_workers: int = INGEST_PARSE_WORKERS,
+                 batch_docs: int = INGEST_BATCH_DOCS):
+        self._add_documents = add_documents
+        self._batch_docs = batch_docs
+        # spawn, not fork: the API process has live threads (audit writer, executors) and open
+        # SQLite / model handles that a forked parser would inherit mid-state
+        self._pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        os.makedirs(INGEST_SPOOL_DIR, exist_ok=True)
+
+    def spool_path(self) -> str:
+        return os.path.join(INGEST_SPOOL_DIR, uuid.uuid4().hex)
+
+    def submit(self, access: str, files: List[tuple[str, str]]) -> IngestJob:
+        """files: [(filename, spooled path)] already written to disk."""
+        job = IngestJob(access, [name for name, _ in files])
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOBS_KEPT:
+                self._jobs.pop(next(iter(self._jobs)))
+        threading.Thread(target=self._run, args=(job, files), daemon=True, name=f"ingest-{job.id[:8]}").start()
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict]:
+        return [j.to_dict() for j in list(self._jobs.values())]
+
+    def _index_batch(self, job: IngestJob, batch: List[Dict]):
+        with job._lock:
+            job.status = "indexing"
+        try:
+            results = self._add_documents(batch)
+        except Exception as e:
+            with job._lock:
+                job.errors.extend({"file": d["id"], "error": f"indexing failed: {e}"} for d in batch)
+            return
+        with job._lock:
+            for r in results:
+                job.docs_indexed += r["status"] in ("new", "updated")
+                job.chunks_indexed += r.get("chunks", 0)
+                job.outcomes[r["status"]] = job.outcomes.get(r["status"], 0) + 1
+
+    def _run(self, job: IngestJob, files: List[tuple[str, str]]):
+        with job._lock:
+            job.status = "parsing"
+            job.started = time.perf_counter()
+        batch: List[Dict] = []
+        try:
+            futures = {self._pool.submit(parse_job_file, path, name): name for name, path in files}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    parsed = fut.result()
+                    if not parsed["text"].strip():
+                        raise ValueError("no extractable text")
+                    batch.append({"id": name, "text": parsed["text"], "access": job.access})
+                except Exception as e:
+                    with job._lock:
+                        job.errors.append({"file": name, "error": str(e)})
+                with job._lock:
+                    job.files_parsed += 1
+                if len(batch) >= self._batch_docs:
+                    self._index_batch(job, batch)
+                    batch = []
+            if batch:
+                self._index_batch(job, batch)
+            with job._lock:
+                job.status = "done"
+        except Exception as e:
+            with job._lock:
+                job.status = "failed"
+                job.errors.append({"file": None, "error": str(e)})
+        finally:
+            with job._lock:
+                job.finished = time.perf_counter()
+            for _, path in files:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
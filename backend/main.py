@@ -1,10 +1,14 @@
+import io
 import os
+import csv
+import json
 import time
-from typing import List
+import asyncio
+from typing import List, Optional
 from datetime import datetime
-from sqlmodel import Session
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from dotenv import load_dotenv  # <-- load .env early
 
@@ -12,15 +16,26 @@ from dotenv import load_dotenv  # <-- load .env early
 load_dotenv()
 
 # --- Internal imports ---
-from backend.db import init_db, get_session, get_session_ctx
-from backend.models import User, QueryLog, DocIn, QueryIn
+from backend.db import init_db, engine
+from backend.rollups import rebuild_if_empty
+from backend.archive import archive_querylog, query_audit, ARCHIVE_RETENTION_DAYS
+from backend.models import User, DocIn, QueryIn, QueryBatchIn, SupersedeIn
 from backend.auth import (
-    authenticate_user,
+    login_user,
     create_access_token,
     get_current_user,
+    auth_stats,
 )
 from backend.rag.pipeline import RegiPipeline
-from backend.rag.vectorstore import add_documents
+from backend.jobs import IngestJobManager
+from backend.audit import AuditLogWriter
+from backend import metrics
+from backend.parsing import SUPPORTED_EXTENSIONS
+
+# Background compaction of tombstoned vectors (seconds between runs; 0 disables)
+COMPACT_INTERVAL_S = float(os.getenv("COMPACT_INTERVAL_S", "600"))
+# Most questions accepted by one /query/batch request
+QUERY_BATCH_MAX_ITEMS = int(os.getenv("QUERY_BATCH_MAX_ITEMS", "100"))
 
 # --- Initialize FastAPI ---
 app = FastAPI(title="RegiGuard API", version="1.0")
@@ -47,8 +62,112 @@ def admin_required(current_user: User = Depends(get_current_user)):
 @app.on_event("startup")
 def on_startup():
     init_db()
+    backfilled = rebuild_if_empty(engine)
+    if backfilled:
+        print(f"[RegiGuard] Backfilled query rollups from {backfilled} log rows")
+    app.state.audit = AuditLogWriter()
     app.state.pipeline = RegiPipeline()
-    print("✅ RegiPipeline initialized")
+    print(f"✅ RegiPipeline initialized (vector store opened in {app.state.pipeline.store.open_seconds:.2f}s)")
+    app.state.jobs = IngestJobManager(app.state.pipeline.add_documents)
+    app.state.compaction = {"running": False, "last": None, "error": None}
+    metrics.register_collector(collect_runtime_stats)
+    if COMPACT_INTERVAL_S > 0:
+        app.state.compaction_task = asyncio.create_task(compaction_loop())
+
+@app.on_event("shutdown")
+def on_shutdown():
+    task = getattr(app.state, "compaction_task", None)
+    if task:
+        task.cancel()
+    jobs = getattr(app.state, "jobs", None)
+    if jobs:
+        jobs.close()
+    pipeline = getattr(app.state, "pipeline", None)
+    if pipeline:
+        pipeline.close()
+    audit = getattr(app.state, "audit", None)
+    if audit:
+        audit.close()   # drains queued rows before exit
+
+# --- Scrape-time samples from components that keep their own counters ---
+def collect_runtime_stats():
+    pipeline: RegiPipeline = app.state.pipeline
+    samples = []
+    cache = pipeline.cache.stats() if pipeline.cache is not None else {}
+    for key in ("hits_exact", "hits_semantic", "misses", "evictions", "expirations", "invalidations"):
+        if key in cache:
+            samples.append(("regiguard_answer_cache_events_total", "counter",
+                            "Answer cache events by kind", cache[key], {"event": key}))
+    if cache:
+        samples.append(("regiguard_answer_cache_entries", "gauge", "Answer cache size", cache["size"], {}))
+    auth = auth_stats()
+    for key in ("hits", "misses"):
+        samples.append(("regiguard_auth_cache_lookups_total", "counter",
+                        "Principal cache lookups by result", auth[key], {"result": key}))
+    samples.append(("regiguard_auth_latency_seconds_avg", "gauge", "Recent mean auth latency",
+                    auth["auth_latency_ms_avg"] / 1000, {}))
+    audit = app.state.audit.stats()
+    samples.append(("regiguard_audit_queue_depth", "gauge", "Audit rows waiting to be written", audit["queued"], {}))
+    samples.append(("regiguard_audit_rows_written_total", "counter", "Audit rows committed", audit["rows_written"], {}))
+    for key in ("errors", "retries", "dropped"):
+        samples.append(("regiguard_audit_write_failures_total", "counter",
+                        "Audit write failures: failed attempts, retries, and ops dropped", audit[key], {"event": key}))
+    store = pipeline.store.stats()
+    samples.append(("regiguard_vectorstore_open_seconds", "gauge", "Time taken to open the vector store",
+                    store["open_seconds"] or 0.0, {}))
+    samples.append(("regiguard_tombstones", "gauge", "Retired doc versions awaiting compaction", store["tombstones"], {}))
+    if store.get("bm25"):
+        samples.append(("regiguard_bm25_terms", "gauge", "Distinct terms in the keyword index", store["bm25"]["terms"], {}))
+        samples.append(("regiguard_bm25_postings", "gauge", "Postings in the keyword index", store["bm25"]["postings"], {}))
+    flights = pipeline.singleflight_stats()
+    samples.append(("regiguard_singleflight_inflight", "gauge", "Distinct queries executing with singleflight",
+                    flights["inflight"], {}))
+    samples.append(("regiguard_singleflight_coalesce_ratio", "gauge",
+                    "Share of queries served by an identical in-flight execution", flights["coalesce_rate"], {}))
+    samples.append(("regiguard_worker_rss_bytes", "gauge", "Resident memory of this API worker",
+                    metrics.process_rss_bytes(), {"pid": str(os.getpid())}))
+    embed = pipeline.embed_service_stats()
+    if embed and "error" not in embed:
+        samples.append(("regiguard_embed_service_rss_bytes", "gauge", "Resident memory of the embedding service",
+                        embed["rss_bytes"], {}))
+        samples.append(("regiguard_embed_service_batches_total", "counter", "Micro-batches encoded",
+                        embed["batches"], {}))
+        samples.append(("regiguard_embed_service_requests_total", "counter", "Encode requests served",
+                        embed["requests"], {}))
+        for le, count in embed["batch_size"]["buckets"].items():
+            samples.append(("regiguard_embed_service_batch_size_batches", "counter",
+                            "Micro-batches by size bucket (texts, non-cumulative)", count, {"le": le}))
+        for q in ("p50", "p95", "p99"):
+            if embed["encode_seconds"][q] is not None:
+                samples.append(("regiguard_embed_service_encode_seconds", "gauge", "Recent batch encode latency",
+                                embed["encode_seconds"][q], {"quantile": q}))
+                samples.append(("regiguard_embed_service_queue_wait_seconds", "gauge",
+                                "Recent wait before a request's batch started", embed["queue_wait_seconds"][q],
+                                {"quantile": q}))
+    return samples
+
+# --- Background compaction ---
+async def run_compaction():
+    state = app.state.compaction
+    if state["running"]:
+        return
+    state["running"] = True
+    try:
+        pipeline: RegiPipeline = app.state.pipeline
+        state["last"] = await asyncio.to_thread(pipeline.compact)
+        state["error"] = None
+        print(f"[RegiGuard] Compaction done: {state['last']}")
+    except Exception as e:
+        state["error"] = str(e)
+        print(f"[RegiGuard] Compaction failed: {e}")
+    finally:
+        state["running"] = False
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL_S)
+        if len(app.state.pipeline.store.tombstones or []):
+            await run_compaction()
 
 # --- Root Healthcheck ---
 @app.get("/")
@@ -57,11 +176,9 @@ def root():
 
 # --- JWT Login ---
 @app.post("/token")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session)
-):
-    user = authenticate_user(session, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    # bcrypt verification runs in a worker thread so login spikes don't stall queries
+    user = await asyncio.to_thread(login_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -72,41 +189,141 @@ def login(
     access_token = create_access_token(subject=user.username, role=user.role)
     return {"access_token": access_token, "token_type": "bearer"}
 
+# --- Query logging (write-behind; returns the query id immediately) ---
+def query_log_fields(user: User, question: str, res: dict, latency: float, ttft: float | None = None) -> dict:
+    # several chunks of one doc may be retrieved; log each doc/version once
+    top_docs, doc_versions = [], []
+    for d in res.get("docs", []):
+        if d["id"] not in top_docs:
+            top_docs.append(d["id"])
+        v = d.get("metadata", {}).get("version")
+        if v and f"{d.get('id')}@{v}" not in doc_versions:
+            doc_versions.append(f"{d.get('id')}@{v}")
+
+    timings = res.get("timings") or {}
+    gate = res.get("gate") or {}
+    return dict(
+        username=user.username,
+        role=user.role,
+        question=question,
+        top_docs=";".join(top_docs) if top_docs else None,
+        relevance_score=res.get("relevance"),
+        latency_s=round(latency, 3),
+        ttft_s=round(ttft, 3) if ttft is not None else None,
+        doc_versions=";".join(doc_versions) if doc_versions else None,
+        plan_s=timings.get("plan_s"),
+        retrieve_s=timings.get("retrieve_s"),
+        answer_s=timings.get("answer_s"),
+        reflect_s=timings.get("reflect_s"),
+        gate_decision=gate.get("decision"),
+        gate_k=gate.get("k"),
+        answer_source=res.get("source") or ("cache" if res.get("cached") else "rag"),
+        coalesced=bool(res.get("coalesced")),
+    )
+
+def log_query(user: User, question: str, res: dict, latency: float, ttft: float | None = None) -> str:
+    audit: AuditLogWriter = app.state.audit
+    return audit.log(**query_log_fields(user, question, res, latency, ttft))
+
 # --- RAG Query Endpoint ---
 @app.post("/query")
-def query_endpoint(payload: QueryIn, current_user: User = Depends(get_current_user)):
+async def query_endpoint(payload: QueryIn, current_user: User = Depends(get_current_user)):
     start = time.perf_counter()
     role = current_user.role
 
     pipeline: RegiPipeline = app.state.pipeline
-    res = pipeline.run(payload.question, role=role, k=payload.max_docs)
+    res = await pipeline.arun(payload.question, role=role, k=payload.max_docs, use_cache=payload.use_cache)
 
     latency = time.perf_counter() - start
+    metrics.QUERY_SECONDS.observe(latency, endpoint="query")
 
-    # Log query details
-    doc_versions = []
-    for d in res.get("docs", []):
-        v = d.get("metadata", {}).get("version")
-        if v:
-            doc_versions.append(f"{d.get('id')}@{v}")
-    doc_versions_str = ";".join(doc_versions) if doc_versions else None
-
-    with get_session_ctx() as session:
-        qlog = QueryLog(
-            username=current_user.username,
-            role=role,
-            question=payload.question,
-            top_docs=";".join([d["id"] for d in res.get("docs", [])]) if res.get("docs") else None,
-            relevance_score=res.get("relevance"),
-            latency_s=round(latency, 3),
-            doc_versions=doc_versions_str
-        )
-        session.add(qlog)
-        session.commit()
-        res["query_id"] = str(qlog.id)
-
+    # Log query details (blocking DB write stays off the event loop)
+    res["query_id"] = await asyncio.to_thread(log_query, current_user, payload.question, res, latency)
     return res
 
+# --- Streaming RAG Query Endpoint (server-sent events) ---
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream_endpoint(payload: QueryIn, current_user: User = Depends(get_current_user)):
+    pipeline: RegiPipeline = app.state.pipeline
+
+    async def events():
+        start = time.perf_counter()
+        ttft = None
+        try:
+            async for ev in pipeline.astream(payload.question, role=current_user.role,
+                                             k=payload.max_docs, use_cache=payload.use_cache):
+                if ev["event"] == "docs":
+                    yield sse("docs", {"plan": ev["plan"], "docs": ev["docs"]})
+                elif ev["event"] == "token":
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    yield sse("token", {"text": ev["text"]})
+                elif ev["event"] == "result":
+                    res = ev["result"]
+                    latency = time.perf_counter() - start
+                    metrics.QUERY_SECONDS.observe(latency, endpoint="query_stream")
+                    query_id = await asyncio.to_thread(log_query, current_user, payload.question, res, latency, ttft)
+                    yield sse("done", {
+                        "relevance": res["relevance"],
+                        "ok": res["ok"],
+                        "cached": res.get("cached", False),
+                        "source": res.get("source", "rag"),
+                        "coalesced": res.get("coalesced", False),
+                        "gate": res.get("gate"),
+                        "query_id": query_id,
+                        "ttft_s": round(ttft, 3) if ttft is not None else None,
+                        "latency_s": round(latency, 3),
+                    })
+        except Exception as e:
+            # the response has already started, so the failure goes to the client as an event
+            latency = time.perf_counter() - start
+            error = f"{type(e).__name__}: {e}"
+            query_id = await asyncio.to_thread(log_query, current_user, payload.question,
+                                               {"source": "error"}, latency, ttft)
+            yield sse("error", {"error": error, "query_id": query_id, "latency_s": round(latency, 3)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Batch RAG Query Endpoint (server-sent events, one "result" per question) ---
+@app.post("/query/batch")
+async def query_batch_endpoint(payload: QueryBatchIn, current_user: User = Depends(get_current_user)):
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(payload.items) > QUERY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {QUERY_BATCH_MAX_ITEMS} questions per batch")
+    if payload.concurrency is not None and payload.concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+    pipeline: RegiPipeline = app.state.pipeline
+    items = [{"question": q.question, "k": q.max_docs, "use_cache": q.use_cache} for q in payload.items]
+    metrics.BATCH_SIZE.observe(len(items))
+
+    async def events():
+        start = time.perf_counter()
+        errors = 0
+        async for i, res in pipeline.arun_batch(items, role=current_user.role,
+                                                concurrency=payload.concurrency, ordered=payload.ordered):
+            latency = time.perf_counter() - start
+            question = items[i]["question"]
+            if res.get("error"):
+                errors += 1
+                # failed items are audited too, so the log covers every question asked
+                query_id = await asyncio.to_thread(log_query, current_user, question, {**res, "source": "error"}, latency)
+                yield sse("result", {"index": i, "question": question, "error": res["error"], "query_id": query_id})
+                continue
+            metrics.QUERY_SECONDS.observe(latency, endpoint="query_batch")
+            # logged as each result completes, so a client that disconnects keeps what it was sent
+            query_id = await asyncio.to_thread(log_query, current_user, question, res, latency)
+            yield sse("result", {"index": i, "question": question, **res, "query_id": query_id})
+        yield sse("done", {"count": len(items), "errors": errors,
+                           "latency_s": round(time.perf_counter() - start, 3)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # --- Feedback Endpoint ---
 @app.post("/feedback")
 def submit_feedback(data: dict, current_user: User = Depends(get_current_user)):
@@ -117,14 +334,9 @@ def submit_feedback(data: dict, current_user: User = Depends(get_current_user)):
     if not query_id:
         raise HTTPException(status_code=400, detail="Query ID required")
 
-    with get_session_ctx() as session:
-        q = session.get(QueryLog, query_id)
-        if not q:
-            raise HTTPException(status_code=404, detail="Query not found")
-        q.feedback = feedback
-        q.feedback_comment = comments
-        session.add(q)
-        session.commit()
+    audit: AuditLogWriter = app.state.audit
+    if not audit.update(query_id, feedback=feedback, feedback_comment=comments):
+        raise HTTPException(status_code=404, detail="Query not found")
 
     return {"status": "recorded"}
 
@@ -132,12 +344,124 @@ def submit_feedback(data: dict, current_user: User = Depends(get_current_user)):
 @app.post("/admin/add_doc")
 def add_doc(docs: List[DocIn], user: User = Depends(admin_required)):
     try:
-        add_documents([d.dict() for d in docs])
-        return {"ok": True, "count": len(docs)}
+        pipeline: RegiPipeline = app.state.pipeline
+        results = pipeline.add_documents([d.dict() for d in docs])
+        summary = {status: sum(1 for r in results if r["status"] == status)
+                   for status in ("new", "updated", "skipped")}
+        return {"ok": True, "count": len(docs), "summary": summary, "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error indexing docs: {e}")
 
+# --- Admin: Background Bulk Ingestion ---
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+@app.post("/admin/jobs")
+async def create_ingest_job(
+    files: List[UploadFile] = File(...),
+    access: str = Form("public"),
+    user: User = Depends(admin_required),
+):
+    if access not in ("public", "internal"):
+        raise HTTPException(status_code=400, detail="access must be 'public' or 'internal'")
+    jobs: IngestJobManager = app.state.jobs
+    for f in files:
+        if (f.filename or "").rsplit(".", 1)[-1].lower() not in SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {f.filename}")
+    spooled = []
+    for f in files:
+        path = jobs.spool_path()
+        # copy in fixed-size chunks so large uploads never sit in memory
+        with open(path, "wb") as out:
+            while chunk := await f.read(UPLOAD_CHUNK_BYTES):
+                await asyncio.to_thread(out.write, chunk)
+        spooled.append((f.filename, path))
+    job = jobs.submit(access, spooled)
+    return job.to_dict()
+
+@app.get("/admin/jobs")
+def list_ingest_jobs(user: User = Depends(admin_required)):
+    return app.state.jobs.list()
+
+@app.get("/admin/jobs/{job_id}")
+def get_ingest_job(job_id: str, user: User = Depends(admin_required)):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+# --- Admin: Retire Documents ---
+@app.delete("/admin/docs/{doc_id}")
+def delete_doc(doc_id: str, user: User = Depends(admin_required)):
+    pipeline: RegiPipeline = app.state.pipeline
+    versions = pipeline.retire_document(doc_id, reason="deleted")
+    if not versions:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"ok": True, "id": doc_id, "tombstoned_versions": versions}
+
+@app.post("/admin/docs/{doc_id}/supersede")
+def supersede_doc(doc_id: str, body: SupersedeIn, user: User = Depends(admin_required)):
+    pipeline: RegiPipeline = app.state.pipeline
+    if not pipeline.store.live_versions(body.superseded_by):
+        raise HTTPException(status_code=404, detail="Replacement document not indexed")
+    versions = pipeline.retire_document(doc_id, reason="superseded", superseded_by=body.superseded_by)
+    if not versions:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"ok": True, "id": doc_id, "superseded_by": body.superseded_by, "tombstoned_versions": versions}
+
+@app.post("/admin/compact")
+async def compact_index(user: User = Depends(admin_required)):
+    if app.state.compaction["running"]:
+        return {"started": False, "running": True}
+    asyncio.create_task(run_compaction())
+    return {"started": True}
+
+@app.get("/admin/compact")
+def compaction_status(user: User = Depends(admin_required)):
+    pipeline: RegiPipeline = app.state.pipeline
+    return {**app.state.compaction, "pending_tombstones": len(pipeline.store.tombstones or [])}
+
+# --- Admin: Audit Archive / Export (hot SQLite + cold Parquet) ---
+@app.post("/admin/audit/archive")
+async def archive_audit(days: int = ARCHIVE_RETENTION_DAYS, user: User = Depends(admin_required)):
+    return await asyncio.to_thread(archive_querylog, days)
+
+@app.get("/admin/audit/export")
+async def export_audit(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    role: Optional[str] = None,
+    username: Optional[str] = None,
+    limit: int = 10000,
+    format: str = "json",
+    user: User = Depends(admin_required),
+):
+    rows = await asyncio.to_thread(query_audit, start, end, role, username, limit)
+    if format == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(rows[0].keys()) if rows else ["id"])
+        writer.writeheader()
+        writer.writerows(rows)
+        return PlainTextResponse(buf.getvalue(), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=querylog_export.csv"})
+    return {"count": len(rows), "rows": rows}
+
+# --- Admin: Pipeline Stats ---
+@app.get("/admin/stats")
+def admin_stats(user: User = Depends(admin_required)):
+    pipeline: RegiPipeline = app.state.pipeline
+    return {**pipeline.stats(), "audit_log": app.state.audit.stats(), "auth": auth_stats()}
+
+# --- Prometheus scrape endpoint ---
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # --- Health Endpoint ---
 @app.get("/health")
 def health():
-    return {"ok": True, "time": datetime.utcnow().isoformat()}
+    pipeline = getattr(app.state, "pipeline", None)
+    return {
+        "ok": True,
+        "time": datetime.utcnow().isoformat(),
+        "vectorstore": pipeline.store.stats() if pipeline else None,
+    }
@@ -0,0 +1,138 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+# --- Minimal Prometheus text-format metrics (no client library dependency) ---
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100)
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], List[Tuple[str, str, str, float, Dict[str, str]]]]] = []
+
+
+def _fmt_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return self.header() + [f"{self.name}{_fmt_labels(dict(k))} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            idx = bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            for key, series in self._series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_fmt_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_fmt_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+                lines.append(f"{self.name}_sum{_fmt_labels(labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_fmt_labels(labels)} {series[-1]}")
+        return lines
+
+
+def process_rss_bytes() -> int:
+    """Resident set size of this process (current on Linux, peak elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def register_collector(fn):
+    """fn() -> [(name, type, help, value, labels)] sampled at scrape time (for stats kept elsewhere)."""
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    seen = set()
+    for fn in _collectors:
+        try:
+            samples = fn()
+        except Exception as e:
+            print(f"[RegiGuard] metrics collector failed: {e}")
+            continue
+        for name, kind, help, value, labels in samples:
+            if name not in seen:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                seen.add(name)
+            lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- RegiGuard metrics ---
+STAGE_SECONDS = Histogram("regiguard_stage_seconds", "Pipeline stage latency in seconds")
+QUERY_SECONDS = Histogram("regiguard_query_seconds", "End-to-end query latency in seconds")
+PROMPT_TOKENS = Histogram("regiguard_prompt_tokens", "Prompt size in tokens", buckets=SIZE_BUCKETS)
+DOCS_RETRIEVED = Counter("regiguard_docs_retrieved_total", "Chunks retrieved for answering")
+QUERIES = Counter("regiguard_queries_total", "Queries answered")
+RETRIEVER_SECONDS = Histogram("regiguard_retriever_seconds", "Per-retriever search latency in seconds")
+RETRIEVALS = Counter("regiguard_retrievals_total", "Retrievals by path (hybrid, vector, bm25, exact)")
+GATE_DECISIONS = Counter("regiguard_relevance_gate_total", "Relevance gate decisions (pass, retry_pass, blocked)")
+CACHE_LOOKUPS = Counter("regiguard_answer_cache_lookups_total", "Answer cache lookups by result")
+LLM_RETRIES = Counter("regiguard_llm_retries_total", "LLM calls retried after an error (batch queries)")
+BATCH_SIZE = Histogram("regiguard_query_batch_size", "Questions per /query/batch request", buckets=COUNT_BUCKETS)
+EMBED_REQUEST_SECONDS = Histogram("regiguard_embed_request_seconds", "Embedding service round trip seen by this worker")
+DOMAIN_ROUTES = Counter("regiguard_domain_routes_total", "Retrievals by domain shard route (routed, fallback, global)")
+SINGLEFLIGHT_CALLS = Counter("regiguard_singleflight_total",
+                             "Queries by singleflight role (leader runs the pipeline, follower shares its result)")
+FACT_LOOKUPS = Counter("regiguard_fact_lookups_total", "Deadline / penalty lookups against the fact index by result")
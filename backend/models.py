@@ -1,6 +1,6 @@
 import uuid
 from sqlmodel import SQLModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 def gen_uuid() -> str:
@@ -19,18 +19,54 @@ class QueryLog(SQLModel, table=True):
     username: str
     role: str
     question: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     # monitoring fields
     top_docs: Optional[str] = None
     relevance_score: Optional[float] = None
     latency_s: Optional[float] = None
+    ttft_s: Optional[float] = None             # time to first token (streaming only)
+    plan_s: Optional[float] = None             # per-stage timings
+    retrieve_s: Optional[float] = None
+    answer_s: Optional[float] = None
+    reflect_s: Optional[float] = None
     doc_versions: Optional[str] = None
+    gate_decision: Optional[str] = None        # relevance gate: 'pass' | 'retry_pass' | 'blocked'
+    gate_k: Optional[int] = None               # k the gate decision was made at
+    answer_source: Optional[str] = None        # 'facts' | 'cache' | 'rag' | 'error'
+    coalesced: Optional[bool] = None           # shared an identical in-flight query's execution
 
     # feedback fields
     feedback: Optional[str] = None             # 'useful' | 'wrong' | 'partial'
     feedback_comment: Optional[str] = None     # user-provided text/comment
 
+# --- Per-minute, per-role QueryLog rollup (maintained by the audit writer) ---
+# Latency histogram buckets (upper bounds, seconds): lat_b0..lat_b8 map to
+# ROLLUP_LATENCY_BUCKETS; lat_b9 counts everything slower.
+ROLLUP_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+class QueryRollup(SQLModel, table=True):
+    minute: datetime = Field(primary_key=True)
+    role: str = Field(primary_key=True)
+    queries: int = 0
+    latency_sum: float = 0.0
+    latency_n: int = 0
+    relevance_sum: float = 0.0
+    relevance_n: int = 0
+    fb_useful: int = 0
+    fb_partial: int = 0
+    fb_wrong: int = 0
+    lat_b0: int = 0
+    lat_b1: int = 0
+    lat_b2: int = 0
+    lat_b3: int = 0
+    lat_b4: int = 0
+    lat_b5: int = 0
+    lat_b6: int = 0
+    lat_b7: int = 0
+    lat_b8: int = 0
+    lat_b9: int = 0
+
 # --- Request Schemas ---
 class DocIn(SQLModel):
     id: str
@@ -40,3 +76,12 @@ class DocIn(SQLModel):
 class QueryIn(SQLModel):
     question: str
     max_docs: int = 3
+    use_cache: bool = True   # set False to bypass the answer cache
+
+class QueryBatchIn(SQLModel):
+    items: List[QueryIn]
+    ordered: bool = True                 # False streams each result as soon as it completes
+    concurrency: Optional[int] = None    # LLM calls in flight; defaults to BATCH_LLM_CONCURRENCY
+
+class SupersedeIn(SQLModel):
+    superseded_by: str   # id of the document that replaces this one
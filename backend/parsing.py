@@ -0,0 +1,29 @@
+import os
+from PyPDF2 import PdfReader
+import docx
+
+SUPPORTED_EXTENSIONS = {"txt", "pdf", "docx"}
+
+# --- File → text (module-level so it can run in a worker process) ---
+def parse_file(path: str, filename: str | None = None) -> str:
+    ext = (filename or path).rsplit(".", 1)[-1].lower()
+    if ext == "txt":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    if ext == "pdf":
+        reader = PdfReader(path)
+        return "\n".join([t for t in (p.extract_text() for p in reader.pages) if t])
+    if ext == "docx":
+        doc = docx.Document(path)
+        return "\n".join([p.text for p in doc.paragraphs])
+    raise ValueError(f"Unsupported file type: .{ext}")
+
+def parse_job_file(path: str, filename: str) -> dict:
+    """Worker entry point: returns {"filename", "text"} and removes the spooled upload."""
+    try:
+        return {"filename": filename, "text": parse_file(path, filename)}
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
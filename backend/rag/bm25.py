@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import math
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_WORD_RE = re.compile(r"[a-z]+|\d+(?:\.\d+)*[a-z]?")
+# heading words that, followed by a number, name one specific provision ("Form 8", "Article 5")
+IDENTIFIER_WORDS = ("form", "article", "regulation", "section", "rule", "clause", "schedule",
+                    "annexure", "annex", "circular", "chapter", "paragraph", "para")
+_IDENT_RE = re.compile(
+    r"\b(" + "|".join(IDENTIFIER_WORDS) + r")s?\s*(?:no\.?\s*)?(\d+(?:\.\d+)*[a-z]?)\b", re.IGNORECASE)
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the this to was
+were what when where which who will with does do under our we you your i can should must
+""".split())
+
+
+def identifiers(text: str) -> List[str]:
+    """Provision identifiers in `text` as single tokens: 'Form 8' -> 'form_8'."""
+    return [f"{m.group(1).lower()}_{m.group(2).lower()}" for m in _IDENT_RE.finditer(text)]
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and numbers minus stopwords, plus one joined token per identifier."""
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+    return words + identifiers(text)
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over stored chunks, keyed by chunk id.
+    Rebuilt from the vector store on open and kept in step with its adds / deletes.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}   # term -> row -> term frequency
+        self._docs: Dict[int, tuple] = {}                # row -> (chunk id, doc id, version, access, domain, length, terms)
+        self._rows: Dict[str, int] = {}                  # chunk id -> row
+        self._versions: Dict[str, Counter] = {}          # doc id -> version -> chunk count
+        self._next_row = 0
+        self._total_len = 0
+        self._n_postings = 0
+        self._untagged = 0   # chunks indexed without a regulation-domain tag (ingested before domains)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _remove_row(self, row: int):
+        cid, doc_id, version, _, domain, length, terms = self._docs.pop(row)
+        del self._rows[cid]
+        versions = self._versions[doc_id]
+        versions[version] -= 1
+        if versions[version] <= 0:
+            del versions[version]
+            if not versions:
+                del self._versions[doc_id]
+        self._total_len -= length
+        self._untagged -= domain is None
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None and posting.pop(row, None) is not None:
+                self._n_postings -= 1
+                if not posting:
+                    del self._postings[term]
+
+    def add(self, ids: List[str], texts: List[str], metas: List[dict]):
+        with self._lock:
+            for cid, text, meta in zip(ids, texts, metas):
+                if cid in self._rows:
+                    self._remove_row(self._rows[cid])
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                row = self._next_row
+                self._next_row += 1
+                meta = meta or {}
+                self._docs[row] = (cid, meta.get("id", cid), meta.get("version", ""),
+                                   meta.get("access", "public"), meta.get("domain"), length, tuple(counts))
+                self._rows[cid] = row
+                self._versions.setdefault(meta.get("id", cid), Counter())[meta.get("version", "")] += 1
+                self._total_len += length
+                self._untagged += meta.get("domain") is None
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[row] = tf
+                self._n_postings += len(counts)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for cid in ids:
+                row = self._rows.get(cid)
+                if row is not None:
+                    self._remove_row(row)
+
+    def domain_tagged(self) -> bool:
+        """True once every indexed chunk carries a regulation-domain tag."""
+        return bool(self._docs) and self._untagged == 0
+
+    def has_version(self, doc_id: str, version: str) -> bool:
+        """Whether any chunk of this doc version is indexed."""
+        with self._lock:
+            return bool(self._versions.get(doc_id, {}).get(version))
+
+    def has_terms(self, terms: Iterable[str]) -> bool:
+        return any(t in self._postings for t in terms)
+
+    def search(self, query: str, k: int = 3, allowed_access: List[str] | None = None,
+               is_dead: Callable[[str, str], bool] | None = None, domains: List[str] | None = None) -> List[Dict]:
+        """Top-k {chunk_id, id, bm25} among chunks the caller may see (in `domains`, if given), best first."""
+        terms = Counter(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+            avgdl = self._total_len / n or 1.0
+            scores: Dict[int, float] = {}
+            for term, qtf in terms.items():
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for row, tf in posting.items():
+                    dl = self._docs[row][5]
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+                    scores[row] = scores.get(row, 0.0) + qtf * idf * norm
+
+            out = []
+            for row, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+                cid, doc_id, version, access, domain, _, _ = self._docs[row]
+                if allowed_access and access not in allowed_access:
+                    continue
+                if domains and domain not in domains:
+                    continue
+                if is_dead is not None and is_dead(doc_id, version):
+                    continue
+                out.append({"chunk_id": cid, "id": doc_id, "bm25": round(score, 4)})
+                if len(out) >= k:
+                    break
+            return out
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the index structures (walks every posting; not for hot paths)."""
+        with self._lock:
+            size = sys.getsizeof(self._postings) + sys.getsizeof(self._docs) + sys.getsizeof(self._rows)
+            for term, posting in self._postings.items():
+                size += sys.getsizeof(term) + sys.getsizeof(posting)
+            for cid, row in self._rows.items():
+                size += sys.getsizeof(cid) + sys.getsizeof(self._docs[row]) + sys.getsizeof(self._docs[row][6])
+            return size
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "chunks": len(self._docs),
+                "terms": len(self._postings),
+                "postings": self._n_postings,
+                "untagged": self._untagged,
+            }
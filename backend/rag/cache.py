@@ -0,0 +1,168 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+# cosine similarity above which two questions count as the same question
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    return _WS_RE.sub(" ", question.lower()).strip().rstrip("?.! ")
+
+Scope = Tuple[Tuple[str, ...], int]
+
+def make_scope(allowed_access: List[str], k: int) -> Scope:
+    """Answers are only shared between callers with the same access set and k."""
+    return tuple(sorted(allowed_access)), k
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    scope: Scope
+    embedding: np.ndarray
+    result: Dict
+    cited: Dict[str, str] = field(default_factory=dict)   # doc id -> version
+    created: float = field(default_factory=time.monotonic)
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of pipeline results, matched exactly on the normalized
+    question or semantically by embedding similarity, within one access scope.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl_s: float = ANSWER_CACHE_TTL_S,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Scope], CacheEntry]" = OrderedDict()
+        self._by_doc: Dict[str, set] = {}
+        self.counters = {"hits_exact": 0, "hits_semantic": 0, "misses": 0,
+                         "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # --- internal helpers (caller holds the lock) ---
+    def _drop(self, key, reason: str | None = None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for doc_id in entry.cited:
+            keys = self._by_doc.get(doc_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_doc[doc_id]
+        if reason:
+            self.counters[reason] += 1
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return self.ttl_s > 0 and time.monotonic() - entry.created > self.ttl_s
+
+    # --- public API ---
+    def get(self, question: str, scope: Scope, embedding: np.ndarray | None = None,
+            is_live: Callable[[str, str], bool] | None = None) -> Dict | None:
+        """
+        Cached result for this question and scope, or None. With is_live(doc_id, version),
+        a hit citing a doc version that is no longer live is dropped instead of served:
+        another process may have re-ingested or retired it without this cache hearing.
+        """
+        norm = normalize_question(question)
+        key, kind = self._find(norm, scope, embedding)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        # checked outside the lock: is_live may sync the store, which notifies this cache
+        if entry is not None and is_live is not None and \
+                not all(is_live(doc_id, version) for doc_id, version in entry.cited.items()):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._drop(key, "invalidations")
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            if entry is None or self._entries.get(key) is not entry:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters[kind] += 1
+            return entry.result
+
+    def _find(self, norm: str, scope: Scope, embedding: np.ndarray | None):
+        """(key, 'hits_exact' | 'hits_semantic') of the best unexpired match, or (None, None) after counting a miss."""
+        with self._lock:
+            key = (norm, scope)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._drop(key, "expirations")
+                entry = None
+            if entry is not None:
+                return key, "hits_exact"
+
+            if embedding is not None and self.threshold < 1.0:
+                best_key, best_sim = None, self.threshold
+                for key, entry in list(self._entries.items()):
+                    if entry.scope != scope:
+                        continue
+                    if self._expired(entry):
+                        self._drop(key, "expirations")
+                        continue
+                    sim = float(np.dot(entry.embedding, embedding))
+                    if sim >= best_sim:
+                        best_key, best_sim = key, sim
+                if best_key is not None:
+                    return best_key, "hits_semantic"
+
+            self.counters["misses"] += 1
+            return None, None
+
+    def put(self, question: str, scope: Scope, embedding: np.ndarray, result: Dict):
+        cited = {}
+        for d in result.get("docs", []):
+            meta = d.get("metadata", {})
+            cited[meta.get("id", d.get("id"))] = meta.get("version", "")
+        key = (normalize_question(question), scope)
+        with self._lock:
+            self._drop(key)   # replacing our own entry is not an eviction
+            self._entries[key] = CacheEntry(key[0], scope, np.asarray(embedding, dtype=np.float32), result, cited)
+            for doc_id in cited:
+                self._by_doc.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)), "evictions")
+
+    def invalidate_docs(self, doc_ids: List[str]):
+        """Drop answers citing any of these docs (and uncited answers, which new docs may now cover)."""
+        with self._lock:
+            stale = set()
+            for doc_id in doc_ids:
+                stale.update(self._by_doc.get(doc_id, ()))
+            stale.update(k for k, e in self._entries.items() if not e.cited)
+            for key in stale:
+                self._drop(key, "invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_doc.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.counters["hits_exact"] + self.counters["hits_semantic"]
+            total = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
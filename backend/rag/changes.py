@@ -0,0 +1,55 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+
+class ChangeLog:
+    """
+    Append-only log of store mutations in SQLite next to the vector store, shared by every
+    process (API worker) that opens it. Each process replays the entries it has not seen,
+    to keep its in-memory state (BM25 index, tombstones, answer cache) in step with the
+    others' writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, ids TEXT NOT NULL, at REAL NOT NULL);
+        """)
+        self._db.commit()
+
+    def append(self, op: str, ids: List[str]) -> int:
+        """Record one mutation ('add' / 'delete' chunk ids, 'retire' doc ids, 'tombstones'); returns its seq."""
+        with self._lock, self._db:
+            return self._db.execute("INSERT INTO changes (op, ids, at) VALUES (?, ?, ?)",
+                                    (op, json.dumps(list(ids)), time.time())).lastrowid
+
+    def latest(self) -> int:
+        """Seq of the newest change ever recorded (0 for none), also once it has been trimmed."""
+        with self._lock:
+            row = self._db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def since(self, seq: int) -> List[Tuple[int, str, List[str]]] | None:
+        """Changes after `seq`, oldest first; None when some of them were already trimmed."""
+        with self._lock:
+            rows = self._db.execute("SELECT seq, op, ids FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+            oldest = self._db.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        if oldest is None or oldest > seq + 1:
+            return None
+        return [(s, op, json.loads(ids)) for s, op, ids in rows]
+
+    def trim(self, older_than_s: float) -> int:
+        """Drop entries older than this; a process further behind than that rebuilds from the store."""
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM changes WHERE at < ?", (time.time() - older_than_s,)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
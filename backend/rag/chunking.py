@@ -0,0 +1,58 @@
+import os
+from functools import lru_cache
+from typing import List, Dict, Tuple
+import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")   # gpt-4o family
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "60"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# don't bother squeezing in a truncated chunk smaller than this
+MIN_PARTIAL_TOKENS = 64
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
+@lru_cache(maxsize=1)
+def get_splitter():
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=TOKEN_ENCODING, chunk_size=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP,
+    )
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+def chunk_id(doc_id: str, version: str, index: int) -> str:
+    """Stable chunk id linking back to the parent doc and version."""
+    return f"{doc_id}@{version}#{index}"
+
+def split_document(text: str) -> List[str]:
+    chunks = [c for c in get_splitter().split_text(text) if c.strip()]
+    return chunks or [text]
+
+# --- Context assembly ---
+def pack_context(docs: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, List[Dict], int]:
+    """
+    Pack best-scoring chunks (lowest distance first) into at most `budget` tokens.
+    Returns (context text, chunks used, tokens used).
+    """
+    enc = get_encoding()
+    parts, used, total = [], [], 0
+    for d in sorted(docs, key=lambda d: d.get("score", 0.0)):
+        block = f"[{d['id']}]\n{d['text']}"
+        tokens = enc.encode(block, disallowed_special=())
+        sep = 2 if parts else 0   # "\n\n" between blocks
+        remaining = budget - total - sep
+        if len(tokens) > remaining:
+            if remaining >= MIN_PARTIAL_TOKENS:
+                parts.append(enc.decode(tokens[:remaining]))
+                used.append(d)
+                total += sep + remaining
+            break
+        parts.append(block)
+        used.append(d)
+        total += sep + len(tokens)
+    return "\n\n".join(parts), used, total
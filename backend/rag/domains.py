@@ -0,0 +1,96 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+# --- Regulation domains: ingest tagging and query routing ---
+# a question is routed to its domain shards only at or above this confidence (see predict_domains)
+DOMAIN_ROUTE_CONFIDENCE = float(os.getenv("DOMAIN_ROUTE_CONFIDENCE", "0.6"))
+# a second domain joins the route when it scores at least this fraction of the best one
+DOMAIN_SECOND_RATIO = float(os.getenv("DOMAIN_SECOND_RATIO", "0.5"))
+# term hits a document needs before it is tagged with a domain rather than "general"
+DOMAIN_MIN_DOC_HITS = int(os.getenv("DOMAIN_MIN_DOC_HITS", "2"))
+GENERAL_DOMAIN = "general"
+
+# strong terms name the regime itself; weak terms are typical of it but not exclusive
+DOMAIN_TERMS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "gdpr": (
+        ("gdpr", "general data protection regulation", "data subject", "right to erasure",
+         "right to be forgotten", "data portability", "supervisory authority", "dpo"),
+        ("personal data", "controller", "controllers", "processor", "lawful basis", "consent", "rectification",
+         "data protection", "eu", "article"),
+    ),
+    "hipaa": (
+        ("hipaa", "phi", "protected health information", "covered entity", "covered entities",
+         "business associate", "hhs"),
+        ("patient", "patients", "health plan", "health plans", "clearinghouse", "clearinghouses",
+         "privacy officer", "medical", "health information", "minimum necessary"),
+    ),
+    "iso27001": (
+        ("iso 27001", "iso/iec 27001", "27001", "isms", "information security management system",
+         "statement of applicability", "annex a"),
+        ("information security", "risk assessment", "risk assessments", "access control", "encryption",
+         "non-conformance", "certification", "certified", "incident management", "audit trail", "audit trails"),
+    ),
+    "mca": (
+        ("mca", "ministry of corporate affairs", "companies act", "roc", "aoc-4", "mgt-7", "adt-1",
+         "dir-3", "inc-22a"),
+        ("agm", "annual return", "director kyc", "private limited", "registered office", "form",
+         "auditor", "filing", "late filing", "incorporation"),
+    ),
+    "sebi": (
+        ("sebi", "lodr", "listing obligations", "listed entity", "listed entities", "insider trading"),
+        ("stock exchange", "stock exchanges", "price-sensitive", "price sensitive", "investor", "investors",
+         "material event", "quarterly results", "quarterly financial results", "trading", "circular"),
+    ),
+}
+STRONG_WEIGHT = 3.0
+WEAK_WEIGHT = 1.0
+
+
+def _pattern(terms: Tuple[str, ...]) -> re.Pattern:
+    return re.compile(r"(?<![\w-])(" + "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+                      + r")(?![\w-])", re.IGNORECASE)
+
+_PATTERNS = {d: (_pattern(strong), _pattern(weak)) for d, (strong, weak) in DOMAIN_TERMS.items()}
+
+
+def domain_scores(text: str) -> Dict[str, float]:
+    """Weighted term hits per domain (domains without hits are left out)."""
+    scores = {}
+    for domain, (strong, weak) in _PATTERNS.items():
+        score = STRONG_WEIGHT * len(strong.findall(text)) + WEAK_WEIGHT * len(weak.findall(text))
+        if score:
+            scores[domain] = score
+    return scores
+
+def classify_document(doc: Dict) -> str:
+    """
+    Domain tag for an ingested doc: an explicit meta['domain'] wins, else the best-scoring
+    domain over its id and text, else 'general' (searched only by unrouted queries).
+    """
+    explicit = (doc.get("meta") or {}).get("domain")
+    if explicit:
+        return str(explicit).lower()
+    scores = domain_scores(doc.get("id", "").replace("_", " ") + "\n" + doc.get("text", ""))
+    if not scores:
+        return GENERAL_DOMAIN
+    best = max(scores, key=scores.get)
+    return best if scores[best] >= DOMAIN_MIN_DOC_HITS * WEAK_WEIGHT else GENERAL_DOMAIN
+
+def predict_domains(question: str) -> Tuple[List[str], float]:
+    """
+    (target domains, confidence) for a question. Confidence is the picked domains' share of
+    all domain-term weight, scaled down while the evidence is weaker than one strong term
+    (a lone "form" or "article" says little); below DOMAIN_ROUTE_CONFIDENCE the domain list
+    is empty (search everything).
+    """
+    scores = domain_scores(question)
+    if not scores:
+        return [], 0.0
+    best = max(scores.values())
+    picked = sorted((d for d, s in scores.items() if s >= best * DOMAIN_SECOND_RATIO), key=scores.get, reverse=True)
+    share = sum(scores[d] for d in picked) / sum(scores.values())
+    confidence = round(share * min(1.0, best / STRONG_WEIGHT), 3)
+    if confidence < DOMAIN_ROUTE_CONFIDENCE:
+        return [], confidence
+    return picked, confidence
@@ -0,0 +1,344 @@
+"""
+Shared embedding service: one process loads each embedding model once and serves
+every uvicorn worker over a Unix socket, merging concurrent encode requests into
+micro-batches (up to EMBED_SERVICE_MAX_BATCH texts, waiting at most
+EMBED_SERVICE_MAX_WAIT_MS for a batch to fill).
+
+    python -m backend.rag.embed_service --backend huggingface
+
+Workers use it with EMBED_BACKEND=service (retrieval and reflection both go
+through the service, so no worker loads torch).
+"""
+import os
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+from .embeddings import get_embeddings, default_model
+from backend.metrics import EMBED_REQUEST_SECONDS, process_rss_bytes
+
+load_dotenv()
+
+EMBED_SERVICE_SOCKET = os.getenv("EMBED_SERVICE_SOCKET", "/tmp/regiguard-embed.sock")
+# backend the service itself loads models with
+EMBED_SERVICE_BACKEND = os.getenv("EMBED_SERVICE_BACKEND", "huggingface")
+EMBED_SERVICE_MAX_BATCH = int(os.getenv("EMBED_SERVICE_MAX_BATCH", "64"))
+EMBED_SERVICE_MAX_WAIT_MS = float(os.getenv("EMBED_SERVICE_MAX_WAIT_MS", "5"))
+EMBED_SERVICE_TIMEOUT_S = float(os.getenv("EMBED_SERVICE_TIMEOUT_S", "60"))
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+_STATS_WINDOW = 4096
+
+_HEADER = struct.Struct(">I")
+
+
+def canonical_model(model: str, backend: str) -> str:
+    """'all-MiniLM-L6-v2' and 'sentence-transformers/all-MiniLM-L6-v2' name one model, loaded once."""
+    if backend not in ("huggingface", "onnx") or "/" in model or os.path.isdir(model):
+        return model
+    return f"sentence-transformers/{model}"
+
+def _percentiles(values) -> Dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    arr = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": round(float(p50), 6), "p95": round(float(p95), 6), "p99": round(float(p99), 6),
+            "max": round(float(arr.max()), 6)}
+
+
+# --- Service side ---
+class MicroBatcher:
+    """Merges concurrent encode requests for one model into batches run on a single encode thread."""
+
+    def __init__(self, embeddings: Embeddings, executor: ThreadPoolExecutor, stats: "ServiceStats",
+                 max_batch: int = EMBED_SERVICE_MAX_BATCH, max_wait_ms: float = EMBED_SERVICE_MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._executor = executor
+        self._stats = stats
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, fut, time.perf_counter()))
+        return await fut
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # exactly what the provider returns in-process; clients normalize if asked
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32).reshape(len(texts), -1)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n += len(item[0])
+
+            flat = [t for texts, _, _ in batch for t in texts]
+            start = time.perf_counter()
+            try:
+                embs = await loop.run_in_executor(self._executor, self._encode, flat)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self._stats.record(len(batch), len(flat), time.perf_counter() - start,
+                               [start - queued for _, _, queued in batch])
+            offset = 0
+            for texts, fut, _ in batch:
+                if not fut.done():
+                    fut.set_result(embs[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+class ServiceStats:
+    """Batch-size distribution and encode / queue-wait latency over a sliding window."""
+
+    def __init__(self):
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self.batch_buckets = {b: 0 for b in BATCH_SIZE_BUCKETS}
+        self.batch_buckets["+Inf"] = 0
+        self._batch_sizes = deque(maxlen=_STATS_WINDOW)
+        self._encode_s = deque(maxlen=_STATS_WINDOW)
+        self._wait_s = deque(maxlen=_STATS_WINDOW)
+
+    def record(self, requests: int, texts: int, encode_s: float, waits: List[float]):
+        self.requests += requests
+        self.texts += texts
+        self.batches += 1
+        self.batch_buckets[next((b for b in BATCH_SIZE_BUCKETS if texts <= b), "+Inf")] += 1
+        self._batch_sizes.append(texts)
+        self._encode_s.append(encode_s)
+        self._wait_s.extend(waits)
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "errors": self.errors,
+            "requests_per_batch": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "batch_size": {"buckets": {str(k): v for k, v in self.batch_buckets.items()},
+                           "mean": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0,
+                           **_percentiles(self._batch_sizes)},
+            "encode_seconds": _percentiles(self._encode_s),
+            "queue_wait_seconds": _percentiles(self._wait_s),
+        }
+
+
+class EmbedService:
+    def __init__(self, socket_path: str = EMBED_SERVICE_SOCKET, backend: str = EMBED_SERVICE_BACKEND,
+                 max_batch: int = EMBED_SERVICE_MAX_BATCH, max_wait_ms: float = EMBED_SERVICE_MAX_WAIT_MS):
+        self.socket_path = socket_path
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.stats = ServiceStats()
+        # one encode thread: the model's own intra-op threads parallelise each batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-service")
+        self._batchers: Dict[str, MicroBatcher] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.started = time.time()
+
+    def _load(self, model: str):
+        start = time.perf_counter()
+        embeddings = get_embeddings(model, backend=self.backend)
+        print(f"[RegiGuard] embed service loaded {model} ({self.backend}) in {time.perf_counter() - start:.2f}s")
+        return embeddings
+
+    async def batcher(self, model: str | None) -> MicroBatcher:
+        model = canonical_model(model or default_model(self.backend), self.backend)
+        if model not in self._batchers:
+            if model not in self._loading:
+                self._loading[model] = asyncio.get_running_loop().run_in_executor(self._executor, self._load, model)
+            try:
+                embeddings = await self._loading[model]
+            finally:
+                self._loading.pop(model, None)
+            if model not in self._batchers:
+                self._batchers[model] = MicroBatcher(embeddings, self._executor, self.stats,
+                                                     self.max_batch, self.max_wait_ms)
+        return self._batchers[model]
+
+    def info(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": process_rss_bytes(),
+            "backend": self.backend,
+            "models": sorted(self._batchers),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "uptime_s": round(time.time() - self.started, 1),
+            **self.stats.to_dict(),
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    size = _HEADER.unpack(await reader.readexactly(_HEADER.size))[0]
+                    req = json.loads(await reader.readexactly(size))
+                except asyncio.IncompleteReadError:
+                    break
+                if req.get("op") == "stats":
+                    writer.write(_frame(json.dumps(self.info()).encode()))
+                else:
+                    try:
+                        embs = await (await self.batcher(req.get("model"))).encode(req["texts"])
+                        writer.write(_frame(json.dumps({"ok": True, "shape": list(embs.shape)}).encode()))
+                        writer.write(_frame(embs.tobytes()))
+                    except Exception as e:
+                        self.stats.errors += 1
+                        writer.write(_frame(json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"}).encode()))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, preload: List[str | None] | None = None):
+        for model in preload or []:
+            await self.batcher(model)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)   # stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        print(f"[RegiGuard] embed service listening on {self.socket_path} "
+              f"(max batch {self.max_batch}, max wait {self.max_wait_ms}ms)")
+        async with server:
+            await server.serve_forever()
+
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload)) + payload
+
+
+# --- Worker side ---
+class EmbedServiceClient(Embeddings):
+    """
+    LangChain Embeddings and SentenceTransformer-style .encode() backed by the
+    shared service. One connection per calling thread; requests from all
+    threads and workers are batched together on the service side.
+    """
+
+    def __init__(self, model: str | None = None, socket_path: str = EMBED_SERVICE_SOCKET,
+                 timeout: float = EMBED_SERVICE_TIMEOUT_S):
+        # None: whatever model the service defaults to for its backend
+        self.model = model
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"embedding service not reachable at {self.socket_path} "
+                                      f"(start it with `python -m backend.rag.embed_service`): {e}") from e
+            self._local.sock = sock
+        return sock
+
+    def _recv(self, sock: socket.socket, n: int) -> bytes:
+        buf = bytearray(n)
+        view, got = memoryview(buf), 0
+        while got < n:
+            read = sock.recv_into(view[got:])
+            if not read:
+                raise ConnectionError("embedding service closed the connection")
+            got += read
+        return buf
+
+    def _request(self, req: Dict) -> Tuple[Dict, bytes | None]:
+        # one reconnect, so a restarted service doesn't fail the caller
+        for attempt in (0, 1):
+            sock = self._connect()
+            try:
+                sock.sendall(_frame(json.dumps(req).encode()))
+                header = json.loads(self._recv(sock, _HEADER.unpack(self._recv(sock, _HEADER.size))[0]))
+                body = None
+                if header.get("ok") and "shape" in header:
+                    body = self._recv(sock, _HEADER.unpack(self._recv(sock, _HEADER.size))[0])
+                return header, body
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+
+    def encode(self, texts, batch_size: int | None = None, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, **_):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        header, body = self._request({"op": "encode", "model": self.model, "texts": texts})
+        EMBED_REQUEST_SECONDS.observe(time.perf_counter() - start)
+        if not header.get("ok"):
+            raise RuntimeError(f"embedding service error: {header.get('error')}")
+        embs = np.frombuffer(body, dtype=np.float32).reshape(header["shape"])
+        if normalize_embeddings and len(embs):
+            embs /= np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+        return embs[0] if single else embs
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts, normalize_embeddings=False).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text], normalize_embeddings=False)[0].tolist()
+
+    def stats(self) -> Dict:
+        header, _ = self._request({"op": "stats"})
+        return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=EMBED_SERVICE_SOCKET)
+    parser.add_argument("--backend", default=EMBED_SERVICE_BACKEND, help="embedding backend the service loads")
+    parser.add_argument("--max-batch", type=int, default=EMBED_SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_SERVICE_MAX_WAIT_MS)
+    parser.add_argument("--preload", nargs="*", default=None,
+                        help="models to load before accepting requests (no value: the backend's default model)")
+    args = parser.parse_args()
+    preload = args.preload or ([None] if args.preload is not None else [])
+    service = EmbedService(args.socket, args.backend, args.max_batch, args.max_wait_ms)
+    try:
+        asyncio.run(service.serve(preload))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+import threading
+from typing import Callable, Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "openai" (default, falls back to huggingface), "huggingface" (torch), "onnx" (onnxruntime), "hash",
+# or "service" (the shared embedding service process, see embed_service.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+# texts per embedding request / forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# intra-op threads for local backends; 0 leaves the runtime default (all cores)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+# dynamic int8 weight quantization of the ONNX model
+EMBED_QUANTIZE = os.getenv("EMBED_QUANTIZE", "false").lower() == "true"
+EMBED_MAX_LENGTH = int(os.getenv("EMBED_MAX_LENGTH", "256"))
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./onnx_models")
+
+LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_MODELS = {
+    "openai": "text-embedding-3-large",
+    "huggingface": LOCAL_MODEL,
+    "onnx": LOCAL_MODEL,
+    "hash": "hash-384",
+}
+
+
+# --- Provider registry ---
+_PROVIDERS: Dict[str, Callable[[str], Embeddings]] = {}
+_instances: Dict[tuple, Embeddings] = {}
+_instances_lock = threading.Lock()
+
+def register_provider(name: str):
+    """Register `factory(model) -> Embeddings` under an EMBED_BACKEND name."""
+    def wrap(factory):
+        _PROVIDERS[name] = factory
+        return factory
+    return wrap
+
+def providers() -> List[str]:
+    return sorted(_PROVIDERS)
+
+def current_backend() -> str:
+    return os.getenv("EMBED_BACKEND", EMBED_BACKEND)
+
+def default_model(backend: str | None = None) -> str:
+    backend = backend or current_backend()
+    if backend == "service":
+        backend = os.getenv("EMBED_SERVICE_BACKEND", "huggingface")
+    return DEFAULT_MODELS.get(backend, LOCAL_MODEL)
+
+def get_embeddings(model: str | None = None, backend: str | None = None) -> Embeddings:
+    """
+    One embeddings instance per (backend, model) per process, so retrieval and
+    reflection share a loaded model instead of each holding their own copy.
+    """
+    backend = backend or current_backend()
+    if backend not in _PROVIDERS:
+        raise ValueError(f"Unknown EMBED_BACKEND '{backend}' (choose from {', '.join(providers())})")
+    model = model or default_model(backend)
+    key = (backend, model)
+    inst = _instances.get(key)
+    if inst is None:
+        with _instances_lock:
+            inst = _instances.get(key)
+            if inst is None:
+                inst = _PROVIDERS[backend](model)
+                _instances[key] = inst
+    return inst
+
+
+# --- Encoder view for reflection ---
+class _EmbeddingsEncoder:
+    """SentenceTransformer.encode() call shape over a LangChain Embeddings object."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, **_):
+        single = isinstance(texts, str)
+        embs = np.asarray(self.embeddings.embed_documents([texts] if single else list(texts)), dtype=np.float32)
+        if normalize_embeddings and len(embs):
+            embs /= np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+        return embs[0] if single else embs
+
+def as_encoder(embeddings):
+    """Object with .encode() backed by the same loaded model as `embeddings`."""
+    if hasattr(embeddings, "encode"):
+        return embeddings
+    client = getattr(embeddings, "client", None)   # HuggingFaceEmbeddings wraps a SentenceTransformer
+    if hasattr(client, "encode"):
+        return client
+    return _EmbeddingsEncoder(embeddings)
+
+
+# --- ONNX Runtime backend ---
+def _model_file(model: str, filename: str) -> str:
+    """`model` is a local export directory or a Hugging Face hub repo id."""
+    if os.path.isdir(model):
+        return os.path.join(model, filename)
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(model, filename)
+
+def quantized_model_path(model: str, source: str) -> str:
+    """int8 (dynamic, weights only) copy of `source`, built once and cached under ONNX_CACHE_DIR."""
+    out = os.path.join(ONNX_CACHE_DIR, model.strip("/").replace("/", "__"), "model_int8.onnx")
+    if not os.path.exists(out):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        tmp = out + ".tmp"
+        quantize_dynamic(source, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, out)
+        print(f"[RegiGuard] Quantized {model} to int8 -> {out}")
+    return out
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformer exported to ONNX (`onnx/model.onnx` on the hub), run on
+    onnxruntime's CPU provider with mean pooling: no torch at query time.
+    """
+
+    def __init__(self, model: str = LOCAL_MODEL, quantize: bool = EMBED_QUANTIZE, threads: int = EMBED_THREADS,
+                 batch_size: int = EMBED_BATCH_SIZE, max_length: int = EMBED_MAX_LENGTH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model = model
+        self.quantize = quantize
+        self.batch_size = batch_size
+        path = _model_file(model, "onnx/model.onnx")
+        if quantize:
+            path = quantized_model_path(model, path)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        # InferenceSession.run is thread-safe, so one session serves every request thread
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self._output = "last_hidden_state" if "last_hidden_state" in outputs else outputs[0]
+
+        self.tokenizer = Tokenizer.from_file(_model_file(model, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        encs = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encs], dtype=np.int64)
+        feed = {"input_ids": np.array([e.ids for e in encs], dtype=np.int64), "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encs], dtype=np.int64)
+        out = self.session.run([self._output], feed)[0]
+        if out.ndim == 2:   # export already pooled
+            return out.astype(np.float32)
+        m = mask[..., None].astype(np.float32)
+        return (out * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size: int | None = None, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, **_):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batch_size = batch_size or self.batch_size
+        # length-sorted batches keep padding (and wasted FLOPs) down
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embs = None
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            vecs = self._forward([texts[i] for i in idx])
+            if embs is None:
+                embs = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            embs[idx] = vecs
+        if embs is None:
+            embs = np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embs):
+            embs /= np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+        return embs[0] if single else embs
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+# --- Built-in providers ---
+@register_provider("huggingface")
+def _huggingface(model: str) -> Embeddings:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    if EMBED_THREADS:
+        import torch
+        torch.set_num_threads(EMBED_THREADS)
+    return HuggingFaceEmbeddings(model_name=model, encode_kwargs={"batch_size": EMBED_BATCH_SIZE})
+
+@register_provider("openai")
+def _openai(model: str) -> Embeddings:
+    """Try OpenAI embeddings first; on any failure, fall back to a HuggingFace sentence-transformer."""
+    from langchain_openai import OpenAIEmbeddings
+    try:
+        return OpenAIEmbeddings(model=model, chunk_size=EMBED_BATCH_SIZE)
+    except Exception as e:
+        # fallback to local HuggingFace embeddings (offline)
+        print(f"[RegiGuard] OpenAIEmbeddings failed, falling back to HuggingFace: {e}")
+        return _huggingface(LOCAL_MODEL)
+
+@register_provider("onnx")
+def _onnx(model: str) -> Embeddings:
+    return OnnxEmbeddings(model)
+
+@register_provider("hash")
+def _hash(model: str) -> Embeddings:
+    # offline stand-in used by the load-test harness
+    from .fakes import HashingEmbeddings
+    return HashingEmbeddings()
+
+@register_provider("service")
+def _service(model: str) -> Embeddings:
+    from .embed_service import EmbedServiceClient
+    return EmbedServiceClient(model)
@@ -0,0 +1,253 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from .bm25 import tokenize
+
+# --- Structured deadline / penalty facts: extracted at ingest, served without retrieval ---
+# share of a question's content terms a fact has to contain before it answers the question
+FACT_MATCH_THRESHOLD = float(os.getenv("FACT_MATCH_THRESHOLD", "0.6"))
+# facts listed in one answer
+FACT_MAX_RESULTS = int(os.getenv("FACT_MAX_RESULTS", "3"))
+
+# planner intent -> fact kind that answers it
+FACT_KINDS = {"deadline_lookup": "deadline", "penalty_lookup": "penalty"}
+# words that only say what kind of fact is wanted; they never have to match the fact text
+INTENT_TERMS = frozenset("""
+deadline deadlines due date dates penalty penalties fine fines time limit last long many days
+""".split())
+
+_MONTHS = ("january|february|march|april|may|june|july|august|september|october|november|december"
+           "|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec")
+_FORM_RE = re.compile(r"\bForm\s+(?:No\.?\s*)?([A-Z]{2,5}-?\s?\d+[A-Z]?|\d+[A-Z]?)\b(\s+KYC\b)?", re.IGNORECASE)
+_DEADLINE_RE = re.compile(
+    r"\b(?:within\s+(?:\d+|[a-z]+)\s+(?:(?:business|working|calendar)\s+)?(?:days?|hours?|weeks?|months?|years?)"
+    r"(?:\s+(?:of|from|after|before|following)\s+[^.;,:()–—]+)?"
+    r"|(?:by|on or before|no later than|not later than)\s+(?:the\s+)?\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?"
+    rf"(?:{_MONTHS})\b(?:\s+(?:annually|every year|each year))?)",
+    re.IGNORECASE)
+_PENALTY_RE = re.compile(r"\b(?:penalt(?:y|ies)|fines?|fined|punishable|liable to pay|late fees?)\b", re.IGNORECASE)
+_AMOUNT_RE = re.compile(
+    r"(₹|rs\.?|inr|usd|\$|eur|€|gbp|£)\s?(\d[\d,]*(?:\.\d+)?)(?:\s?(lakhs?|crores?|million|billion))?", re.IGNORECASE)
+_CURRENCIES = {"₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "$": "USD", "usd": "USD",
+               "€": "EUR", "eur": "EUR", "£": "GBP", "gbp": "GBP"}
+_MULTIPLIERS = {"lakh": 1e5, "lakhs": 1e5, "crore": 1e7, "crores": 1e7, "million": 1e6, "billion": 1e9}
+_LIST_MARKER_RE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+_SENTENCE_RE = re.compile(r"(?<=[.;!?])\s+(?=[A-Z])")
+_Q_TOKEN_RE = re.compile(r"[a-z]+|\d+[a-z]?")
+# e-form series a bare "MGT-7" / "aoc4" in a question may name without the word "Form"
+FORM_PREFIXES = frozenset("""
+aoc adt ben chg cra csr dir dpt gnl inc llp mbp mgt msc msme pas ptc sh spice stk urc
+""".split())
+
+
+def form_key(form: str) -> str:
+    """Comparable key for a form number: 'MGT-7', 'mgt 7' and 'MGT7' all give 'formmgt7'."""
+    return "form" + re.sub(r"[^a-z0-9]", "", form.lower())
+
+def question_form_keys(question: str) -> List[str]:
+    """
+    Form keys a question names: 'Form 8', 'Form MGT-7', or a known e-form series ('MGT-7', 'aoc4').
+    Other word-number pairs ('Article 33', 'in 2024', 'within 72 hours') are not form references.
+    """
+    toks = _Q_TOKEN_RE.findall(question.lower())
+    keys = set()
+    for a, b in zip(toks, toks[1:]):
+        if not b[0].isdigit():
+            continue
+        if a == "form":
+            keys.add(form_key(b))
+        elif a in FORM_PREFIXES:
+            keys.add(form_key(a + b))
+    return sorted(keys)
+
+def _sentences(text: str) -> List[str]:
+    out = []
+    for line in text.splitlines():
+        line = _LIST_MARKER_RE.sub("", line).strip()
+        out.extend(s.strip() for s in _SENTENCE_RE.split(line) if s.strip())
+    return out
+
+def _amount(sentence: str) -> Tuple[float | None, str | None]:
+    m = _AMOUNT_RE.search(sentence)
+    if m is None:
+        return None, None
+    value = float(m.group(2).replace(",", "")) * _MULTIPLIERS.get((m.group(3) or "").lower(), 1.0)
+    return value, _CURRENCIES.get(m.group(1).lower())
+
+def _subject(sentence: str, form_match, deadline_match) -> str:
+    """What the fact is about: the text before the deadline, minus a leading 'Form X:' label."""
+    head = sentence[:deadline_match.start()] if deadline_match else sentence
+    if form_match is not None and form_match.start() == 0:
+        head = head[form_match.end():]
+        head = re.sub(r"^\s*\([^)]*\)", "", head)
+    return head.strip(" :–—-,.").strip()[:160]
+
+def extract_facts(text: str) -> List[Dict]:
+    """
+    Deadline and penalty facts in a document, one per matching sentence and kind:
+    {"kind", "form", "form_key", "subject", "detail", "amount", "currency", "source"}.
+    """
+    facts = []
+    for sentence in _sentences(text):
+        form_m = _FORM_RE.search(sentence)
+        form = key = None
+        if form_m is not None:
+            core = re.sub(r"[\s-]+", "-", form_m.group(1).upper())
+            form, key = core + (" KYC" if form_m.group(2) else ""), form_key(core)
+        deadline_m = _DEADLINE_RE.search(sentence)
+        if deadline_m is not None:
+            facts.append({"kind": "deadline", "form": form, "form_key": key,
+                          "subject": _subject(sentence, form_m, deadline_m), "detail": deadline_m.group(0).strip(),
+                          "amount": None, "currency": None, "source": sentence})
+        if _PENALTY_RE.search(sentence):
+            amount, currency = _amount(sentence)
+            facts.append({"kind": "penalty", "form": form, "form_key": key,
+                          "subject": _subject(sentence, form_m, None), "detail": sentence,
+                          "amount": amount, "currency": currency, "source": sentence})
+    return facts
+
+def format_answer(facts: List[Dict]) -> str:
+    """One line per fact, each citing its source doc id in square brackets like LLM answers do."""
+    lines = []
+    for f in facts:
+        if f["kind"] == "deadline" and f["form"]:
+            label = f"Form {f['form']}" + (f" ({f['subject']})" if f["subject"] else "")
+            line = f"{label}: {f['detail']}"
+        else:
+            line = f["source"].rstrip(".")
+        lines.append(f"{line}. [{f['doc_id']}]")
+    return "\n".join(lines)
+
+def fact_doc(fact: Dict) -> Dict:
+    """A fact in the shape of a retrieved chunk, so callers log and render it like any other source."""
+    return {
+        "id": fact["doc_id"],
+        "chunk_id": None,
+        "text": fact["source"],
+        "score": fact["coverage"],
+        "metadata": {"id": fact["doc_id"], "version": fact["version"], "access": fact["access"],
+                     "domain": fact["domain"], "fact_kind": fact["kind"], "form": fact["form"]},
+    }
+
+
+class FactIndex:
+    """
+    SQLite sidecar of deadline / penalty facts, persisted next to the vector store.
+    Rows carry the doc id, version and access level of the doc they were extracted from;
+    a new version replaces them, retired versions are filtered at lookup and purged by compaction.
+    Matching goes through an indexed term table, so a lookup is a few index probes.
+    """
+
+    _COLUMNS = ("row", "doc_id", "version", "access", "domain", "kind", "form", "subject", "detail",
+                "amount", "currency", "source")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS facts (
+                row INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, version TEXT NOT NULL,
+                access TEXT NOT NULL, domain TEXT, kind TEXT NOT NULL, form TEXT, form_key TEXT,
+                subject TEXT, detail TEXT, amount REAL, currency TEXT, source TEXT);
+            CREATE INDEX IF NOT EXISTS ix_facts_doc ON facts(doc_id, version);
+            CREATE INDEX IF NOT EXISTS ix_facts_form ON facts(form_key, kind, access);
+            CREATE TABLE IF NOT EXISTS fact_terms (term TEXT NOT NULL, fact INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS ix_fact_terms_term ON fact_terms(term);
+            CREATE INDEX IF NOT EXISTS ix_fact_terms_fact ON fact_terms(fact);
+        """)
+        self._db.commit()
+
+    def _delete(self, where: str, params: list):
+        rows = [r for (r,) in self._db.execute(f"SELECT row FROM facts WHERE {where}", params)]
+        for i in range(0, len(rows), 500):
+            marks = ",".join("?" * len(rows[i:i + 500]))
+            self._db.execute(f"DELETE FROM fact_terms WHERE fact IN ({marks})", rows[i:i + 500])
+            self._db.execute(f"DELETE FROM facts WHERE row IN ({marks})", rows[i:i + 500])
+        return len(rows)
+
+    def replace(self, docs: List[Dict]) -> int:
+        """
+        docs: {"id", "version", "access", "domain", "facts"} per newly indexed doc version;
+        earlier versions' facts are dropped in the same transaction. Returns facts stored.
+        """
+        stored = 0
+        with self._lock, self._db:
+            for d in docs:
+                self._delete("doc_id = ?", [d["id"]])
+                for f in d["facts"]:
+                    cur = self._db.execute(
+                        "INSERT INTO facts (doc_id, version, access, domain, kind, form, form_key, subject, detail,"
+                        " amount, currency, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (d["id"], d["version"], d["access"], d["domain"], f["kind"], f["form"],
+                         f["form_key"], f["subject"], f["detail"],
+                         f["amount"], f["currency"], f["source"]))
+                    terms = set(tokenize(f["subject"] + " " + f["source"]))
+                    if d["domain"]:
+                        terms.add(d["domain"])
+                    self._db.executemany("INSERT INTO fact_terms (term, fact) VALUES (?, ?)",
+                                         [(t, cur.lastrowid) for t in terms])
+                    stored += 1
+        return stored
+
+    def remove_versions(self, entries: List[Tuple[str, str]]) -> int:
+        """Drop the facts of (doc id, version) pairs, e.g. tombstones purged by compaction."""
+        with self._lock, self._db:
+            return sum(self._delete("doc_id = ? AND version = ?", [doc_id, version]) for doc_id, version in entries)
+
+    def lookup(self, question: str, kind: str, allowed_access: List[str], domains: List[str] | None = None,
+               is_dead: Callable[[str, str], bool] | None = None, limit: int = FACT_MAX_RESULTS) -> List[Dict]:
+        """
+        Facts of `kind` answering the question, best first, each with a "coverage" score.
+        A form number in the question selects that form's facts outright; otherwise (or when
+        no fact carries that form) a fact must contain FACT_MATCH_THRESHOLD of the question's
+        content terms. Facts tied for the best score are all returned. [] = no confident match.
+        """
+        access = ",".join("?" * len(allowed_access))
+        cols = ", ".join(f"f.{c}" for c in self._COLUMNS)
+        keys = question_form_keys(question)
+        scored: List[Tuple[Dict, float]] = []
+        with self._lock:
+            if keys:
+                got = self._db.execute(
+                    f"SELECT {cols} FROM facts f WHERE f.form_key IN ({','.join('?' * len(keys))})"
+                    f" AND f.kind = ? AND f.access IN ({access}) ORDER BY f.row",
+                    [*keys, kind, *allowed_access]).fetchall()
+                scored = [(dict(zip(self._COLUMNS, r)), 1.0) for r in got]
+            if not scored:
+                terms = sorted({t for t in tokenize(question) if t not in INTENT_TERMS})
+                if not terms:
+                    return []
+                where = f"t.term IN ({','.join('?' * len(terms))}) AND f.kind = ? AND f.access IN ({access})"
+                params = [*terms, kind, *allowed_access]
+                if domains:
+                    where += f" AND f.domain IN ({','.join('?' * len(domains))})"
+                    params += list(domains)
+                got = self._db.execute(
+                    f"SELECT {cols}, COUNT(DISTINCT t.term) AS hits FROM fact_terms t JOIN facts f ON f.row = t.fact"
+                    f" WHERE {where} GROUP BY f.row ORDER BY hits DESC, f.row LIMIT ?",
+                    [*params, limit * 4]).fetchall()
+                scored = [(dict(zip(self._COLUMNS, r[:-1])), r[-1] / len(terms)) for r in got]
+        out, best = [], None
+        for fact, coverage in scored:
+            if coverage < FACT_MATCH_THRESHOLD or (is_dead is not None and is_dead(fact["doc_id"], fact["version"])):
+                continue
+            # only the best-covered facts (compared unrounded); a weaker partial match is no instant answer
+            if best is not None and coverage < best:
+                break
+            best = coverage
+            out.append({**fact, "coverage": round(coverage, 4)})
+            if len(out) == limit:
+                break
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_kind = dict(self._db.execute("SELECT kind, COUNT(*) FROM facts GROUP BY kind").fetchall())
+            docs = self._db.execute("SELECT COUNT(DISTINCT doc_id) FROM facts").fetchone()[0]
+        return {"facts": sum(by_kind.values()), "by_kind": by_kind, "docs": docs}
@@ -0,0 +1,438 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+# "flat" (exact), "ivf" (IVF-flat, trained once a partition is big enough) or "hnsw"
+FAISS_INDEX = os.getenv("FAISS_INDEX", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))                 # 0 = 4 * sqrt(n) at training time
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_IVF_MIN_TRAIN = int(os.getenv("FAISS_IVF_MIN_TRAIN", "10000"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# open saved indexes memory-mapped (read-only until the first write)
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+# rebuild an index that cannot delete in place (HNSW) once this share of its vectors is dead
+FAISS_REBUILD_DEAD_RATIO = float(os.getenv("FAISS_REBUILD_DEAD_RATIO", "0.25"))
+
+# metadata keys mirrored into indexed columns so where-clauses on them hit SQL, not a scan
+_COLUMNS = {"id": "doc_id", "version": "version", "access": "access", "domain": "domain"}
+DEFAULT_DOMAIN = "general"
+# ids per IN (...) statement, well under SQLite's bound-variable limit
+_SQL_BATCH = 500
+
+
+def matches(meta: dict, where: dict | None) -> bool:
+    """Evaluate the subset of Chroma's where-syntax the app uses against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            val = meta.get(key)
+            for op, arg in cond.items():
+                if op == "$eq" and val != arg:
+                    return False
+                if op == "$ne" and val == arg:
+                    return False
+                if op == "$in" and val not in arg:
+                    return False
+                if op == "$nin" and val in arg:
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+def _sql_prefilter(where: dict | None) -> Tuple[str, list]:
+    """SQL narrowing for top-level equality / $in clauses on mirrored columns (the rest is checked in Python)."""
+    clauses, params = [], []
+    conds = list(where.get("$and", [])) + [{k: v} for k, v in where.items() if k != "$and"] if where else []
+    for c in conds:
+        for key, cond in c.items():
+            col = _COLUMNS.get(key)
+            if col is None:
+                continue
+            if not isinstance(cond, dict):
+                clauses.append(f"{col} = ?")
+                params.append(cond)
+            elif "$in" in cond:
+                clauses.append(f"{col} IN ({','.join('?' * len(cond['$in']))})")
+                params.extend(cond["$in"])
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def allowed_values(where: dict | None, key: str) -> set | None:
+    """Values of `key` (access, domain) a where-clause restricts the search to (None = all)."""
+    if not where:
+        return None
+    for c in list(where.get("$and", [])) + [{k: v} for k, v in where.items() if k != "$and"]:
+        cond = c.get(key)
+        if cond is None:
+            continue
+        if not isinstance(cond, dict):
+            return {cond}
+        if "$in" in cond:
+            return set(cond["$in"])
+    return None
+
+def partition_key(access: str, domain: str | None) -> str:
+    return f"{access}.{domain or DEFAULT_DOMAIN}"
+
+
+class _Partition:
+    """
+    One FAISS index per (access level, regulation domain) shard, inner product on normalized
+    vectors, ids = SQLite rows. IVF takes external ids natively; flat and HNSW are wrapped
+    in an IndexIDMap2.
+    """
+
+    def __init__(self, directory: str, access: str, domain: str):
+        self.access = access
+        self.domain = domain
+        self.path = os.path.join(directory, f"{partition_key(access, domain)}.faiss")
+        self.index: faiss.Index | None = None
+        self.kind: str | None = None
+        self.mmapped = False
+        self.dirty = False
+        self.dead = 0   # vectors still in an index that cannot remove them
+        # guards this shard's index: searches of other shards never wait on it
+        self.lock = threading.RLock()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def base(self) -> faiss.Index:
+        index = faiss.downcast_index(self.index)
+        return faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+
+
+class FaissStore:
+    """
+    FAISS engine behind the slice of the LangChain Chroma API that VectorStoreHandle uses
+    (add_documents / get / delete / similarity_search_with_score / persist).
+
+    Chunk text, metadata and the raw vector live in a SQLite table; the FAISS indexes are
+    derived from it and can always be rebuilt (index type change, IVF training, HNSW deletes).
+    Scores are cosine distances, so lower is better as with Chroma.
+    """
+
+    def __init__(self, persist_directory: str, embedding_function, index_type: str = FAISS_INDEX,
+                 nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH, mmap: bool = FAISS_MMAP,
+                 ivf_min_train: int = FAISS_IVF_MIN_TRAIN):
+        if index_type not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown FAISS_INDEX '{index_type}' (choose flat, ivf or hnsw)")
+        self.directory = persist_directory
+        self.embeddings = embedding_function
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.ivf_min_train = ivf_min_train
+        # guards the shared SQLite connection and the partition table only; FAISS work runs
+        # under the per-partition locks
+        self._db_lock = threading.RLock()
+        os.makedirs(persist_directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(persist_directory, "chunks.db"), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY AUTOINCREMENT, chunk_id TEXT UNIQUE NOT NULL,
+                doc_id TEXT, version TEXT, access TEXT, text TEXT, meta TEXT, vec BLOB);
+            CREATE INDEX IF NOT EXISTS ix_chunks_doc_id ON chunks(doc_id);
+            CREATE INDEX IF NOT EXISTS ix_chunks_version ON chunks(version);
+            CREATE INDEX IF NOT EXISTS ix_chunks_access ON chunks(access);
+        """)
+        if "domain" not in {r[1] for r in self._db.execute("PRAGMA table_info(chunks)")}:
+            # stores from before domain shards: everything starts in the general shard
+            self._db.execute(f"ALTER TABLE chunks ADD COLUMN domain TEXT NOT NULL DEFAULT '{DEFAULT_DOMAIN}'")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_chunks_domain ON chunks(domain)")
+        self._db.commit()
+        self._state_path = os.path.join(persist_directory, "partitions.json")
+        self._partitions: Dict[str, _Partition] = {}
+        self._dim: int | None = None
+        self._load(mmap)
+
+    # --- index lifecycle ---
+    def _load(self, mmap: bool):
+        state = {}
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        self._dim = state.get("dim")
+        counts = self._db.execute("SELECT access, domain, COUNT(*) FROM chunks GROUP BY access, domain").fetchall()
+        for access, domain, count in counts:
+            key = partition_key(access, domain)
+            part = self._partitions[key] = _Partition(self.directory, access, domain)
+            saved = state.get("partitions", {}).get(key, {})
+            # a saved index is reused only if it matches the configured type and the rows in SQLite
+            # (deletes are persisted lazily, so a crash can leave it stale)
+            if (os.path.exists(part.path) and saved.get("count") == count
+                    and self._wanted_kind(count) == saved.get("kind")):
+                flags = (faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY) if mmap else 0
+                try:
+                    part.index, part.mmapped = faiss.read_index(part.path, flags), bool(mmap)
+                except RuntimeError:
+                    # not every index type can be mapped; fall back to reading it into memory
+                    part.index, part.mmapped = faiss.read_index(part.path), False
+                part.kind, part.dead = saved["kind"], saved.get("dead", 0)
+            else:
+                self._rebuild(access, domain)
+        # index files of shards that no longer exist (or of the per-access layout before domains)
+        for name in os.listdir(self.directory):
+            if name.endswith(".faiss") and name[:-len(".faiss")] not in self._partitions:
+                os.remove(os.path.join(self.directory, name))
+        self.persist()
+
+    def _wanted_kind(self, n: int) -> str:
+        # IVF needs training data; small partitions stay exact until they cross the threshold
+        if self.index_type == "ivf" and n < self.ivf_min_train:
+            return "flat"
+        return self.index_type
+
+    def _new_index(self, kind: str, vecs: np.ndarray) -> faiss.Index:
+        if kind == "hnsw":
+            base = faiss.IndexHNSWFlat(self._dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+        elif kind == "ivf":
+            nlist = FAISS_NLIST or min(65536, max(16, int(4 * math.sqrt(len(vecs)))))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(self._dim), self._dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(vecs)
+            return index
+        else:
+            base = faiss.IndexFlatIP(self._dim)
+        return faiss.IndexIDMap2(base)
+
+    def _rebuild(self, access: str, domain: str):
+        """Recreate a partition's index from the vectors stored in SQLite."""
+        with self._db_lock:
+            rows = self._db.execute("SELECT row, vec FROM chunks WHERE access = ? AND domain = ? ORDER BY row",
+                                    (access, domain)).fetchall()
+        part = self._partition(access, domain)
+        if not rows:
+            part.index, part.kind = None, None
+        else:
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            vecs = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+            self._dim = self._dim or vecs.shape[1]
+            part.kind = self._wanted_kind(len(rows))
+            part.index = self._new_index(part.kind, vecs)
+            part.index.add_with_ids(vecs, ids)
+            print(f"[RegiGuard] FAISS partition '{partition_key(access, domain)}' built as {part.kind} "
+                  f"({len(rows)} vectors)")
+        part.mmapped, part.dirty, part.dead = False, True, 0
+
+    def _partition(self, access: str, domain: str) -> _Partition:
+        with self._db_lock:
+            return self._partitions.setdefault(partition_key(access, domain),
+                                               _Partition(self.directory, access, domain))
+
+    def _writable(self, access: str, domain: str) -> _Partition:
+        """The shard's partition, loaded into memory for writing; call with part.lock held."""
+        part = self._partition(access, domain)
+        if part.mmapped:
+            part.index, part.mmapped = faiss.read_index(part.path), False
+        return part
+
+    def persist(self):
+        """Write changed partitions atomically, plus the small state file describing them."""
+        state = {"dim": self._dim, "partitions": {}}
+        for key, part in self._snapshot():
+            with part.lock:
+                if part.dirty:
+                    if part.index is None:
+                        if os.path.exists(part.path):
+                            os.remove(part.path)
+                    else:
+                        tmp = part.path + ".tmp"
+                        faiss.write_index(part.index, tmp)
+                        os.replace(tmp, part.path)
+                    part.dirty = False
+                if part.index is not None:
+                    state["partitions"][key] = {"kind": part.kind, "count": part.ntotal - part.dead, "dead": part.dead}
+        with self._db_lock:
+            tmp = self._state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self._state_path)
+
+    def _snapshot(self) -> List[Tuple[str, _Partition]]:
+        with self._db_lock:
+            return list(self._partitions.items())
+
+    # --- Chroma-compatible API ---
+    def add_documents(self, documents: List[Document], ids: List[str]):
+        vecs = np.asarray(self.embeddings.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+        faiss.normalize_L2(vecs)
+        self._delete_rows(self._rows_for(ids))   # re-adding a chunk id replaces it
+        by_shard: Dict[Tuple[str, str], Tuple[list, list]] = {}
+        with self._db_lock:
+            self._dim = self._dim or vecs.shape[1]
+            for doc, cid, vec in zip(documents, ids, vecs):
+                meta = doc.metadata or {}
+                shard = (meta.get("access", "public"), meta.get("domain") or DEFAULT_DOMAIN)
+                cur = self._db.execute(
+                    "INSERT INTO chunks (chunk_id, doc_id, version, access, domain, text, meta, vec) "
+                    "VALUES (?,?,?,?,?,?,?,?)",
+                    (cid, meta.get("id"), meta.get("version"), shard[0], shard[1], doc.page_content,
+                     json.dumps(meta), vec.tobytes()))
+                rows, part_vecs = by_shard.setdefault(shard, ([], []))
+                rows.append(cur.lastrowid)
+                part_vecs.append(vec)
+            self._db.commit()
+        for (access, domain), (rows, part_vecs) in by_shard.items():
+            part = self._partition(access, domain)
+            with part.lock:
+                self._writable(access, domain)
+                if part.index is None or self._wanted_kind(part.ntotal + len(rows)) != part.kind:
+                    self._rebuild(access, domain)   # first vectors, or large enough now to train IVF
+                else:
+                    part.index.add_with_ids(np.vstack(part_vecs), np.array(rows, dtype=np.int64))
+                    part.dirty = True
+
+    def _rows_for(self, ids: Iterable[str]) -> List[Tuple[int, str, str]]:
+        ids = list(ids)
+        out = []
+        with self._db_lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                out += self._db.execute(
+                    f"SELECT row, access, domain FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                    batch).fetchall()
+        return out
+
+    def _delete_rows(self, rows: List[Tuple[int, str, str]]):
+        if not rows:
+            return
+        by_shard: Dict[Tuple[str, str], list] = {}
+        for row, access, domain in rows:
+            by_shard.setdefault((access, domain), []).append(row)
+        with self._db_lock:
+            self._db.executemany("DELETE FROM chunks WHERE row = ?", [(r[0],) for r in rows])
+            self._db.commit()
+        for (access, domain), part_rows in by_shard.items():
+            part = self._partition(access, domain)
+            with part.lock:
+                self._writable(access, domain)
+                if part.index is None:
+                    continue
+                try:
+                    part.index.remove_ids(np.array(part_rows, dtype=np.int64))
+                except RuntimeError:
+                    # HNSW cannot delete: search skips rows gone from SQLite until the next rebuild
+                    part.dead += len(part_rows)
+                    if part.dead > FAISS_REBUILD_DEAD_RATIO * part.ntotal:
+                        self._rebuild(access, domain)
+                part.dirty = True
+
+    def delete(self, ids: List[str]):
+        """Rows go from SQLite at once; index files are rewritten on the next persist()."""
+        self._delete_rows(self._rows_for(ids))
+
+    def get(self, ids: List[str] | None = None, where: dict | None = None, include: List[str] | None = None,
+            limit: int | None = None, offset: int | None = None) -> Dict:
+        include = include or ["metadatas", "documents"]
+        sql, params = _sql_prefilter(where)
+        if ids is not None:
+            if not ids:
+                return {"ids": [], "metadatas": [], "documents": []}
+            sql += (" AND " if sql else " WHERE ") + f"chunk_id IN ({','.join('?' * len(ids))})"
+            params = params + list(ids)
+        # the SQL prefilter is only a narrowing; the full predicate is re-checked in Python
+        residual = bool(where)
+        query = f"SELECT chunk_id, meta, text FROM chunks{sql} ORDER BY row"
+        if not residual and limit is not None:
+            query += f" LIMIT {int(limit)} OFFSET {int(offset or 0)}"
+        with self._db_lock:
+            rows = self._db.execute(query, params).fetchall()
+        out = [(cid, json.loads(meta), text) for cid, meta, text in rows]
+        if residual:
+            out = [r for r in out if matches(r[1], where)]
+            if limit is not None:
+                out = out[offset or 0:(offset or 0) + limit]
+        return {
+            "ids": [r[0] for r in out],
+            "metadatas": [r[1] for r in out] if "metadatas" in include else None,
+            "documents": [r[2] for r in out] if "documents" in include else None,
+        }
+
+    def set_search_params(self, nprobe: int | None = None, ef_search: int | None = None):
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+
+    def _search_partition(self, part: _Partition, q: np.ndarray, n: int) -> List[Tuple[float, int]]:
+        with part.lock:
+            if part.index is None:
+                return []
+            n = min(n, part.ntotal)
+            # search parameters go with the call, never onto the shared index
+            base, params = part.base(), None
+            if isinstance(base, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(nprobe=self.nprobe)
+            elif isinstance(base, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, n))
+            sims, rows = part.index.search(q, n, params=params)
+        return [(float(s), int(r)) for s, r in zip(sims[0], rows[0]) if r >= 0]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict | None = None):
+        return self._search_vector(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search_by_vectors(self, vectors: List[List[float]], k: int = 4, filter: dict | None = None):
+        """Search with precomputed query embeddings; one (Document, distance) list per vector."""
+        return [self._search_vector(v, k, filter) for v in vectors]
+
+    def _search_vector(self, vector: List[float], k: int, filter: dict | None):
+        q = np.asarray([vector], dtype=np.float32)
+        faiss.normalize_L2(q)
+        # access and domain predicates pick whole shards; the rest is checked per hit
+        access, domains = allowed_values(filter, "access"), allowed_values(filter, "domain")
+        parts = [p for _, p in self._snapshot() if p.index is not None
+                 and (access is None or p.access in access) and (domains is None or p.domain in domains)]
+        total = sum(p.ntotal for p in parts)
+        n = min(total, k * 2)
+        while n:
+            # over-fetch for predicates FAISS can't apply (tombstoned versions, dead HNSW rows)
+            hits = sorted((h for p in parts for h in self._search_partition(p, q, n)), reverse=True)
+            found = self._hydrate([r for _, r in hits])
+            out = []
+            for sim, row in hits:
+                if row in found and matches(found[row][1], filter):
+                    cid, meta, text = found[row]
+                    out.append((Document(page_content=text, metadata=meta), 1.0 - sim))
+                    if len(out) == k:
+                        return out
+            if n >= total:
+                return out
+            n = min(total, n * 4)
+        return []
+
+    def _hydrate(self, rows: List[int]) -> Dict[int, tuple]:
+        # in batches: an over-fetched search across shards can exceed SQLite's bound-variable limit
+        out = {}
+        with self._db_lock:
+            for i in range(0, len(rows), _SQL_BATCH):
+                batch = rows[i:i + _SQL_BATCH]
+                got = self._db.execute(
+                    f"SELECT row, chunk_id, meta, text FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+                out.update((r, (cid, json.loads(meta), text)) for r, cid, meta, text in got)
+        return out
+
+    def stats(self) -> Dict:
+        return {
+            "index_type": self.index_type,
+            "nprobe": self.nprobe,
+            "ef_search": self.ef_search,
+            "partitions": {a: {"kind": p.kind, "vectors": p.ntotal - p.dead, "dead": p.dead, "mmapped": p.mmapped}
+                           for a, p in self._snapshot() if p.index is not None},
+        }
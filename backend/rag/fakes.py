@@ -0,0 +1,88 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# --- Offline stand-ins for load tests and benchmarks (no network, no model download) ---
+FAKE_LLM_LATENCY_S = float(os.getenv("FAKE_LLM_LATENCY_S", "0.3"))        # time to first token
+FAKE_LLM_TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "80"))
+FAKE_LLM_ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "60"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SOURCE_RE = re.compile(r"^\[([^\]\n]+)\]$", re.MULTILINE)
+
+
+def _hashed_vector(text: str, dim: int) -> np.ndarray:
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in _TOKEN_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(tok.encode(), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 63) == 0 else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words feature hashing. Implements both the LangChain
+    Embeddings interface and the SentenceTransformer.encode() call shape used for reflection.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [_hashed_vector(t, self.dim).tolist() for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return _hashed_vector(text, self.dim).tolist()
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, **_):
+        single = isinstance(texts, str)
+        out = np.stack([_hashed_vector(t, self.dim) for t in ([texts] if single else texts)])
+        return out[0] if single else out
+
+
+class FakeChatModel:
+    """
+    Deterministic chat model with configurable first-token latency and token rate.
+    Supports the invoke / ainvoke / astream calls RegiPipeline makes.
+    """
+
+    def __init__(self, latency_s: float = FAKE_LLM_LATENCY_S, tokens_per_s: float = FAKE_LLM_TOKENS_PER_S,
+                 answer_tokens: int = FAKE_LLM_ANSWER_TOKENS):
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.answer_tokens = answer_tokens
+
+    def _tokens(self, prompt: str) -> List[str]:
+        sources = list(dict.fromkeys(_SOURCE_RE.findall(prompt)))
+        seed = int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=4).digest(), "little")
+        words = [f"w{(seed + i) % 997}" for i in range(max(1, self.answer_tokens - len(sources)))]
+        return [w + " " for w in words] + [f"[{s}] " for s in sources]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+
+    def invoke(self, prompt: str, **_) -> AIMessage:
+        tokens = self._tokens(prompt)
+        time.sleep(self.latency_s + len(tokens) * self._token_delay())
+        return AIMessage(content="".join(tokens))
+
+    async def ainvoke(self, prompt: str, **_) -> AIMessage:
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.latency_s + len(tokens) * self._token_delay())
+        return AIMessage(content="".join(tokens))
+
+    async def astream(self, prompt: str, **_):
+        await asyncio.sleep(self.latency_s)
+        delay = self._token_delay()
+        for tok in self._tokens(prompt):
+            if delay:
+                await asyncio.sleep(delay)
+            yield AIMessageChunk(content=tok)
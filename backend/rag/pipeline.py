@@ -1,48 +1,155 @@
-from typing import List, Dict
+import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, AsyncIterator, Tuple
 from langchain_openai import ChatOpenAI
-from sentence_transformers import SentenceTransformer, util
-from .vectorstore import add_documents, query_vectorstore
+from .vectorstore import add_documents, hybrid_search, hybrid_search_batch, get_store
+from .reflection import get_reflect_model, encode_normalized
+from .embed_service import EmbedServiceClient
+from .domains import predict_domains
+from .facts import FACT_KINDS, fact_doc, format_answer
+from .cache import AnswerCache, make_scope, normalize_question, ANSWER_CACHE_ENABLED
+from .chunking import pack_context, count_tokens, CONTEXT_TOKEN_BUDGET
+from backend.metrics import STAGE_SECONDS, PROMPT_TOKENS, DOCS_RETRIEVED, QUERIES, CACHE_LOOKUPS, GATE_DECISIONS, LLM_RETRIES, DOMAIN_ROUTES, FACT_LOOKUPS, SINGLEFLIGHT_CALLS
 import numpy as np
 import os
 
 # Reflection threshold for semantic similarity check
 REFLECT_THRESHOLD = float(os.getenv("REFLECT_THRESHOLD", 0.5))
+# Threads for blocking work (encoding, Chroma search) on the async path
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+# "openai" (default) or "fake" for the deterministic offline model used in load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+# Relevance gate in front of the LLM: "off" (answer and reflect concurrently), "fail_fast"
+# (reflect first, skip the LLM below REFLECT_THRESHOLD) or "retry" (first widen k, then fail fast)
+RELEVANCE_GATE = os.getenv("RELEVANCE_GATE", "off")
+GATE_RETRY_K_FACTOR = int(os.getenv("GATE_RETRY_K_FACTOR", "3"))
+GATE_MAX_RETRIES = int(os.getenv("GATE_MAX_RETRIES", "1"))
+# Search only the regulation-domain shards the planner predicts (global search when unsure).
+# Takes effect only once every stored chunk is domain-tagged; an untagged corpus is searched globally.
+DOMAIN_ROUTING = os.getenv("DOMAIN_ROUTING", "true").lower() == "true"
+# answer deadline / penalty lookups from the ingest-time fact index when it has a confident match
+FACT_LOOKUP = os.getenv("FACT_LOOKUP", "true").lower() == "true"
+# identical questions (same normalized text, k and access scope) in flight at once share one execution
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "true").lower() == "true"
+# Batch queries: LLM calls in flight at once, and retries (exponential backoff) per failed call
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_LLM_RETRIES = int(os.getenv("BATCH_LLM_RETRIES", "2"))
+BATCH_RETRY_BACKOFF_S = float(os.getenv("BATCH_RETRY_BACKOFF_S", "0.5"))
+INSUFFICIENT_CONTEXT_ANSWER = (
+    "I could not find sufficiently relevant material in the knowledge base to answer this question. "
+    "Try rephrasing it or naming the regulation, form or article it concerns."
+)
+# whole words only: "define", "refine" and "finest" are not penalty questions
+_PENALTY_RE = re.compile(r"\b(penalt(y|ies)|fines?)\b")
 
 
 class RegiPipeline:
     def __init__(self):
         # Initialize LLM (LangChain wrapper for GPT models)
         # Uses your OPENAI_API_KEY from .env automatically
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        if LLM_BACKEND == "fake":
+            from .fakes import FakeChatModel
+            self.llm = FakeChatModel()
+        else:
+            self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
         # Local sentence transformer for reflection/relevance check
-        self.reflect_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.reflect_model = get_reflect_model()
+        # Shared vector store handle, opened once here instead of per call
+        self.store = get_store()
+        self.store.open()
+        # Answer cache in front of the pipeline; new doc versions invalidate cited answers
+        self.cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+        if self.cache is not None:
+            self.store.subscribe(self.cache.invalidate_docs)
+        # Keeps CPU-bound encoding and vector search off the event loop in arun()
+        self._executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="regipipe")
+        # singleflight: key -> future of the execution identical arun() / astream() calls wait on
+        self._inflight: Dict[tuple, asyncio.Future] = {}
 
     def add_document(self, doc_id: str, text: str, access: str = "public", meta: dict | None = None):
         payload = {"id": doc_id, "text": text, "access": access, "meta": meta or {}}
-        add_documents([payload])
+        self.add_documents([payload])
+
+    def add_documents(self, documents: List[Dict]):
+        return add_documents(documents, store=self.store)
+
+    def retire_document(self, doc_id: str, reason: str = "deleted", superseded_by: str | None = None) -> List[str]:
+        return self.store.retire(doc_id, reason=reason, superseded_by=superseded_by)
+
+    def compact(self) -> Dict:
+        return self.store.compact()
 
     def plan(self, question: str) -> Dict:
-        """Lightweight intent planning based on question keywords."""
+        """Lightweight intent and regulation-domain planning based on question keywords."""
         q = question.lower()
-        if any(tok in q for tok in ["penalty", "fine", "penalties"]):
+        if _PENALTY_RE.search(q):
             intent = "penalty_lookup"
-        elif any(tok in q for tok in ["deadline", "due date", "when is"]):
+        elif any(tok in q for tok in ["deadline", "due date", "when is", "last date", "time limit", "by when"]):
             intent = "deadline_lookup"
         else:
             intent = "general_lookup"
-        return {"intent": intent}
+        domains, confidence = predict_domains(question)
+        return {"intent": intent, "domains": domains, "domain_confidence": confidence}
 
-    def retrieve(self, question: str, role: str, k: int = 3) -> List[Dict]:
-        """Retrieve documents based on role access level."""
-        allowed = ["public"] if role == "analyst" else ["public", "internal"]
-        docs = query_vectorstore(question, k=k * 2, allowed_access=allowed)
-        docs = sorted(docs, key=lambda d: d["score"])[:k]
-        return docs
+    @staticmethod
+    def allowed_access(role: str) -> List[str]:
+        return ["public"] if role == "analyst" else ["public", "internal"]
 
-    def answer(self, question: str, docs: List[Dict]) -> str:
-        """Generate an LLM answer using retrieved documents as context."""
-        context = "\n\n".join([f"[{d['id']}]\n{d['text']}" for d in docs]) if docs else ""
-        prompt = (
+    def routing_enabled(self) -> bool:
+        # chunks ingested before domain tagging would be invisible to a routed search
+        return DOMAIN_ROUTING and self.store.domain_tagged()
+
+    def retrieve(self, question: str, role: str, k: int = 3, domains: List[str] | None = None) -> List[Dict]:
+        """
+        Retrieve documents based on role access level (BM25 + vector, rank-fused; see RETRIEVAL_MODE).
+        With `domains` from plan(), only those shards are searched; fewer than k hits there falls back to all.
+        """
+        allowed = self.allowed_access(role)
+        # access filter is pushed into both retrievers, so no over-fetch is needed for it
+        if domains and self.routing_enabled():
+            docs = hybrid_search(question, k=k, allowed_access=allowed, store=self.store, domains=domains)
+            if len(docs) >= k:
+                DOMAIN_ROUTES.inc(route="routed")
+                return docs
+            DOMAIN_ROUTES.inc(route="fallback")
+        else:
+            DOMAIN_ROUTES.inc(route="global")
+        return hybrid_search(question, k=k, allowed_access=allowed, store=self.store)
+
+    def retrieve_batch(self, questions: List[str], role: str, ks: List[int],
+                       domains: List[List[str] | None] | None = None) -> List[List[Dict]]:
+        """retrieve() for many questions from one caller: per domain route, dense lookups share one embedding pass and search."""
+        allowed = self.allowed_access(role)
+        routed = bool(domains) and self.routing_enabled()
+        routes: Dict[tuple, List[int]] = {}
+        for i in range(len(questions)):
+            route = tuple(domains[i] or ()) if routed else ()
+            routes.setdefault(route, []).append(i)
+        out: List[List[Dict] | None] = [None] * len(questions)
+        fallback = []
+        for route, idx in routes.items():
+            found = hybrid_search_batch([questions[i] for i in idx], [ks[i] for i in idx], allowed_access=allowed,
+                                        store=self.store, domains=list(route) or None)
+            for i, docs in zip(idx, found):
+                if route and len(docs) < ks[i]:
+                    DOMAIN_ROUTES.inc(route="fallback")
+                    fallback.append(i)
+                else:
+                    DOMAIN_ROUTES.inc(route="routed" if route else "global")
+                    out[i] = docs
+        if fallback:
+            found = hybrid_search_batch([questions[i] for i in fallback], [ks[i] for i in fallback],
+                                        allowed_access=allowed, store=self.store)
+            for i, docs in zip(fallback, found):
+                out[i] = docs
+        return out
+
+    def build_prompt(self, question: str, docs: List[Dict]) -> str:
+        # best chunks first, capped at CONTEXT_TOKEN_BUDGET tokens however large the docs are
+        context, _, _ = pack_context(docs, CONTEXT_TOKEN_BUDGET) if docs else ("", [], 0)
+        return (
             "You are RegiGuard, a compliance assistant. "
             "Use ONLY the provided context to answer the question.\n\n"
             f"Context:\n{context}\n\n"
@@ -50,34 +157,542 @@ class RegiPipeline:
             "Provide a concise answer (2–6 sentences). "
             "At the end, list source ids in square brackets like [doc_id]."
         )
+
+    def answer(self, question: str, docs: List[Dict], prompt: str | None = None) -> str:
+        """Generate an LLM answer using retrieved documents as context."""
         # Use .invoke() for LangChain 1.x models
-        response = self.llm.invoke(prompt)
+        response = self.llm.invoke(prompt or self.build_prompt(question, docs))
+        return response.content.strip()
+
+    async def aanswer(self, question: str, docs: List[Dict], prompt: str | None = None) -> str:
+        """Async variant of answer() using the LLM's native async client."""
+        response = await self.llm.ainvoke(prompt or self.build_prompt(question, docs))
         return response.content.strip()
 
-    def reflect(self, question: str, docs: List[Dict]) -> Dict:
+    def encode_question(self, question: str) -> np.ndarray:
+        return encode_normalized([question], self.reflect_model)[0]
+
+    def reflect(self, question: str, docs: List[Dict], q_emb: np.ndarray | None = None) -> Dict:
         """Validate retrieval quality via cosine similarity reflection."""
         if not docs:
             return {"relevance": 0.0, "ok": False}
 
-        q_emb = self.reflect_model.encode(question, convert_to_tensor=True)
-        doc_texts = [d["text"] for d in docs]
-        doc_embs = self.reflect_model.encode(doc_texts, convert_to_tensor=True)
-        sims = util.pytorch_cos_sim(q_emb, doc_embs).cpu().numpy().flatten()
+        # doc embeddings are precomputed at ingest; only the question is encoded here
+        if q_emb is None:
+            q_emb = self.encode_question(question)
+        doc_embs = self.store.reflection.vectors_for(docs, self.reflect_model)
+        sims = doc_embs @ q_emb
         max_sim = float(np.max(sims)) if len(sims) > 0 else 0.0
         ok = max_sim >= REFLECT_THRESHOLD
         return {"relevance": max_sim, "ok": ok}
 
-    def run(self, question: str, role: str = "analyst", k: int = 3) -> Dict:
-        """Full RAG cycle: plan → retrieve → answer → reflect."""
-        plan = self.plan(question)
-        docs = self.retrieve(question, role, k=k)
-        answer = self.answer(question, docs)
-        reflect_res = self.reflect(question, docs)
+    def reflect_batch(self, q_embs: np.ndarray, docs_lists: List[List[Dict]]) -> List[Dict]:
+        """reflect() for many questions; every doc vector not already indexed is encoded in one pass."""
+        flat = [d for docs in docs_lists for d in docs]
+        doc_embs = self.store.reflection.vectors_for(flat, self.reflect_model) if flat else None
+        out, offset = [], 0
+        for q_emb, docs in zip(q_embs, docs_lists):
+            if not docs:
+                out.append({"relevance": 0.0, "ok": False})
+                continue
+            max_sim = float(np.max(doc_embs[offset:offset + len(docs)] @ q_emb))
+            offset += len(docs)
+            out.append({"relevance": max_sim, "ok": max_sim >= REFLECT_THRESHOLD})
+        return out
 
-        return {
+    # --- stage timing / bookkeeping shared by run(), arun() and astream() ---
+    @staticmethod
+    def _timed(timings: Dict, stage: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            # a stage that runs twice (gate retry) reports its total
+            timings[f"{stage}_s"] = round(timings.get(f"{stage}_s", 0.0) + elapsed, 4)
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+
+    @staticmethod
+    async def _atimed(timings: Dict, stage: str, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            elapsed = time.perf_counter() - start
+            # a stage that runs twice (gate retry) reports its total
+            timings[f"{stage}_s"] = round(timings.get(f"{stage}_s", 0.0) + elapsed, 4)
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+
+    def _gated_retrieve(self, question: str, role: str, k: int, q_emb: np.ndarray, timings: Dict,
+                        domains: List[str] | None = None):
+        """
+        Retrieve and score relevance before any LLM call. Below REFLECT_THRESHOLD, "retry"
+        widens k up to GATE_MAX_RETRIES times. Returns (docs, reflect result, gate record).
+        """
+        docs = self._timed(timings, "retrieve", self.retrieve, question, role, k=k, domains=domains)
+        reflect_res = self._timed(timings, "reflect", self.reflect, question, docs, q_emb=q_emb)
+        attempts, k_used = 1, k
+        while not reflect_res["ok"] and RELEVANCE_GATE == "retry" and attempts <= GATE_MAX_RETRIES:
+            attempts += 1
+            k_used *= GATE_RETRY_K_FACTOR
+            docs = self._timed(timings, "retrieve", self.retrieve, question, role, k=k_used, domains=domains)
+            reflect_res = self._timed(timings, "reflect", self.reflect, question, docs, q_emb=q_emb)
+        return docs, reflect_res, self._gate_record(reflect_res, k_used, attempts)
+
+    def _gated_retrieve_batch(self, questions: List[str], role: str, ks: List[int], q_embs: np.ndarray,
+                              timings: Dict, domains: List[List[str]] | None = None
+                              ) -> Tuple[List[List[Dict]], List[Dict], List[Dict | None]]:
+        """
+        Bulk retrieval and reflection for a batch. With the gate on, the questions below
+        REFLECT_THRESHOLD are retried together at a wider k, as in _gated_retrieve().
+        """
+        docs_lists = self._timed(timings, "retrieve", self.retrieve_batch, questions, role, ks, domains)
+        reflects = self._timed(timings, "reflect", self.reflect_batch, q_embs, docs_lists)
+        if RELEVANCE_GATE == "off":
+            return docs_lists, reflects, [None] * len(questions)
+        attempts, k_used = [1] * len(questions), list(ks)
+        for _ in range(GATE_MAX_RETRIES if RELEVANCE_GATE == "retry" else 0):
+            retry = [i for i, r in enumerate(reflects) if not r["ok"]]
+            if not retry:
+                break
+            for i in retry:
+                attempts[i] += 1
+                k_used[i] *= GATE_RETRY_K_FACTOR
+            docs = self._timed(timings, "retrieve", self.retrieve_batch, [questions[i] for i in retry], role,
+                               [k_used[i] for i in retry], [domains[i] for i in retry] if domains else None)
+            refl = self._timed(timings, "reflect", self.reflect_batch, q_embs[retry], docs)
+            for i, d, r in zip(retry, docs, refl):
+                docs_lists[i], reflects[i] = d, r
+        gates = [self._gate_record(r, k, n) for r, k, n in zip(reflects, k_used, attempts)]
+        return docs_lists, reflects, gates
+
+    @staticmethod
+    def _gate_record(reflect_res: Dict, k: int, attempts: int) -> Dict:
+        if not reflect_res["ok"]:
+            decision = "blocked"
+        else:
+            decision = "pass" if attempts == 1 else "retry_pass"
+        GATE_DECISIONS.inc(decision=decision)
+        return {"decision": decision, "relevance": round(reflect_res["relevance"], 4),
+                "threshold": REFLECT_THRESHOLD, "k": k, "attempts": attempts}
+
+    def _insufficient(self, question: str, plan: Dict, docs: List[Dict], reflect_res: Dict,
+                      gate: Dict, timings: Dict) -> Dict:
+        """Fast response for a blocked gate: no LLM call, and never cached."""
+        result = {
+            "plan": plan,
+            "docs": docs,
+            "answer": INSUFFICIENT_CONTEXT_ANSWER,
+            "relevance": reflect_res["relevance"],
+            "ok": False,
+            "gate": gate,
+        }
+        return self._finish(question, None, None, result, timings, 0)
+
+    @staticmethod
+    def _wants_facts(plan: Dict) -> bool:
+        return FACT_LOOKUP and plan["intent"] in FACT_KINDS
+
+    def _fact_answer(self, question: str, role: str, plan: Dict, timings: Dict) -> Dict | None:
+        """
+        Deadline / penalty lookup answered straight from the fact index: no embedding, retrieval
+        or LLM call, and never cached (it is already this fast). None falls through to RAG.
+        """
+        facts = self._timed(timings, "facts", self.store.lookup_facts, question, FACT_KINDS[plan["intent"]],
+                            self.allowed_access(role), domains=plan["domains"])
+        FACT_LOOKUPS.inc(result="hit" if facts else "miss")
+        if not facts:
+            return None
+        result = {
+            "plan": plan,
+            "docs": [fact_doc(f) for f in facts],
+            "answer": format_answer(facts),
+            "relevance": facts[0]["coverage"],
+            "ok": True,
+            "gate": None,
+            "source": "facts",
+        }
+        return self._finish(question, None, None, result, timings, 0)
+
+    def _cache_lookup(self, question: str, role: str, k: int, q_emb: np.ndarray, use_cache: bool):
+        """Returns (scope, cached result or None); scope is None when the cache is bypassed."""
+        if not (use_cache and self.cache is not None):
+            CACHE_LOOKUPS.inc(result="bypass")
+            return None, None
+        scope = make_scope(self.allowed_access(role), k)
+        hit = self.cache.get(question, scope, q_emb, is_live=self.store.is_live)
+        CACHE_LOOKUPS.inc(result="hit" if hit is not None else "miss")
+        if hit is not None:
+            QUERIES.inc(cached="true")
+            return scope, {**hit, "cached": True, "timings": {}}
+        return scope, None
+
+    def _finish(self, question: str, scope, q_emb: np.ndarray, result: Dict,
+                timings: Dict, prompt_tokens: int) -> Dict:
+        DOCS_RETRIEVED.inc(len(result["docs"]))
+        PROMPT_TOKENS.observe(prompt_tokens)
+        QUERIES.inc(cached="false")
+        if scope is not None:
+            self.cache.put(question, scope, q_emb, result)
+        return {**result, "cached": False, "timings": timings, "prompt_tokens": prompt_tokens}
+
+    def run(self, question: str, role: str = "analyst", k: int = 3, use_cache: bool = True) -> Dict:
+        """Full RAG cycle: plan → retrieve → answer → reflect (served from fact index or cache when possible)."""
+        timings: Dict = {}
+        plan = self._timed(timings, "plan", self.plan, question)
+        if self._wants_facts(plan):
+            res = self._fact_answer(question, role, plan, timings)
+            if res is not None:
+                return res
+        q_emb = self._timed(timings, "encode", self.encode_question, question)
+        scope, hit = self._cache_lookup(question, role, k, q_emb, use_cache)
+        if hit is not None:
+            return hit
+
+        gate = None
+        if RELEVANCE_GATE != "off":
+            docs, reflect_res, gate = self._gated_retrieve(question, role, k, q_emb, timings, plan["domains"])
+            if gate["decision"] == "blocked":
+                return self._insufficient(question, plan, docs, reflect_res, gate, timings)
+            prompt = self.build_prompt(question, docs)
+            answer = self._timed(timings, "answer", self.answer, question, docs, prompt=prompt)
+        else:
+            docs = self._timed(timings, "retrieve", self.retrieve, question, role, k=k, domains=plan["domains"])
+            prompt = self.build_prompt(question, docs)
+            answer = self._timed(timings, "answer", self.answer, question, docs, prompt=prompt)
+            reflect_res = self._timed(timings, "reflect", self.reflect, question, docs, q_emb=q_emb)
+
+        result = {
+            "plan": plan,
+            "docs": docs,
+            "answer": answer,
+            "relevance": reflect_res["relevance"],
+            "ok": reflect_res["ok"],
+            "gate": gate,
+        }
+        return self._finish(question, scope, q_emb, result, timings, count_tokens(prompt))
+
+    def _retrieve_prompt(self, question: str, role: str, k: int, timings: Dict, domains: List[str] | None = None):
+        """retrieve(), then the prompt and its token count, in one worker-thread hop. Returns (docs, prompt, tokens)."""
+        docs = self._timed(timings, "retrieve", self.retrieve, question, role, k=k, domains=domains)
+        prompt = self.build_prompt(question, docs)
+        return docs, prompt, count_tokens(prompt)
+
+    def _gated_retrieve_prompt(self, question: str, role: str, k: int, q_emb: np.ndarray, timings: Dict,
+                               domains: List[str] | None = None):
+        """_gated_retrieve() plus the prompt (None when blocked). Returns (docs, reflect result, gate, prompt, tokens)."""
+        docs, reflect_res, gate = self._gated_retrieve(question, role, k, q_emb, timings, domains)
+        if gate["decision"] == "blocked":
+            return docs, reflect_res, gate, None, 0
+        prompt = self.build_prompt(question, docs)
+        return docs, reflect_res, gate, prompt, count_tokens(prompt)
+
+    async def _offload(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    # --- singleflight: concurrent identical questions share one pipeline execution ---
+    def _flight_key(self, question: str, role: str, k: int, use_cache: bool) -> tuple:
+        return normalize_question(question), make_scope(self.allowed_access(role), k), use_cache
+
+    def _land(self, key: tuple, flight: asyncio.Future):
+        """A finished flight takes no more followers (and its error counts as retrieved)."""
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not flight.cancelled():
+            flight.exception()
+
+    async def _join(self, key: tuple) -> Dict | None:
+        """
+        Result of the identical execution in flight, as this caller's own copy; None when
+        there is none or its streaming leader went away before finishing.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            return None
+        res = await asyncio.shield(flight)
+        if res is None:
+            return None
+        SINGLEFLIGHT_CALLS.inc(role="follower")
+        return {**res, "coalesced": True}
+
+    async def arun(self, question: str, role: str = "analyst", k: int = 3, use_cache: bool = True) -> Dict:
+        """
+        Async RAG cycle; reflection runs concurrently with answer generation. Identical
+        concurrent calls share one execution (SINGLEFLIGHT), each getting its own copy of the
+        result; the execution finishes even if the caller that started it goes away.
+        """
+        if not SINGLEFLIGHT:
+            return await self._arun(question, role, k, use_cache)
+        key = self._flight_key(question, role, k, use_cache)
+        shared = await self._join(key)
+        if shared is not None:
+            return shared
+        if key in self._inflight:
+            # a streaming leader gave up; don't pile onto whoever replaced it
+            return await self._arun(question, role, k, use_cache)
+        flight = asyncio.ensure_future(self._arun(question, role, k, use_cache))
+        self._inflight[key] = flight
+        flight.add_done_callback(lambda f: self._land(key, f))
+        SINGLEFLIGHT_CALLS.inc(role="leader")
+        return {**await asyncio.shield(flight)}
+
+    async def _arun(self, question: str, role: str, k: int, use_cache: bool) -> Dict:
+        timings: Dict = {}
+        plan = self._timed(timings, "plan", self.plan, question)
+        if self._wants_facts(plan):
+            res = await self._offload(self._fact_answer, question, role, plan, timings)
+            if res is not None:
+                return res
+        q_emb = await self._atimed(timings, "encode", self._offload(self.encode_question, question))
+        scope, hit = self._cache_lookup(question, role, k, q_emb, use_cache)
+        if hit is not None:
+            return hit
+
+        # prompt assembly and token counting ride along with retrieval, off the event loop
+        gate = None
+        if RELEVANCE_GATE != "off":
+            docs, reflect_res, gate, prompt, prompt_tokens = await self._offload(
+                self._gated_retrieve_prompt, question, role, k, q_emb, timings, plan["domains"])
+            if gate["decision"] == "blocked":
+                return self._insufficient(question, plan, docs, reflect_res, gate, timings)
+            answer = await self._atimed(timings, "answer", self.aanswer(question, docs, prompt=prompt))
+        else:
+            docs, prompt, prompt_tokens = await self._offload(
+                self._retrieve_prompt, question, role, k, timings, plan["domains"])
+            answer, reflect_res = await asyncio.gather(
+                self._atimed(timings, "answer", self.aanswer(question, docs, prompt=prompt)),
+                self._atimed(timings, "reflect", self._offload(self.reflect, question, docs, q_emb=q_emb)),
+            )
+
+        result = {
             "plan": plan,
             "docs": docs,
             "answer": answer,
             "relevance": reflect_res["relevance"],
             "ok": reflect_res["ok"],
+            "gate": gate,
+        }
+        return self._finish(question, scope, q_emb, result, timings, prompt_tokens)
+
+    async def astream(self, question: str, role: str = "analyst", k: int = 3,
+                      use_cache: bool = True) -> AsyncIterator[Dict]:
+        """
+        Streaming RAG cycle. Yields events in order:
+        {"event": "docs"}, then {"event": "token"} per answer chunk, then {"event": "result"}
+        carrying the full result dict (same shape as arun()). A question already in flight is
+        answered from that execution like a cache hit; one this call starts is shared the same way.
+        """
+        key = self._flight_key(question, role, k, use_cache) if SINGLEFLIGHT else None
+        if key is not None:
+            shared = await self._join(key)
+            if shared is not None:
+                yield {"event": "docs", "plan": shared["plan"], "docs": shared["docs"]}
+                yield {"event": "token", "text": shared["answer"]}
+                yield {"event": "result", "result": shared}
+                return
+        flight = None
+        if key is not None and key not in self._inflight:
+            flight = self._inflight[key] = asyncio.get_running_loop().create_future()
+            SINGLEFLIGHT_CALLS.inc(role="leader")
+        try:
+            async for ev in self._astream(question, role, k, use_cache):
+                if ev["event"] == "result" and flight is not None:
+                    flight.set_result({**ev["result"]})
+                yield ev
+        finally:
+            if flight is not None:
+                if not flight.done():
+                    # disconnected or failed mid-stream: followers run the question themselves
+                    flight.set_result(None)
+                self._land(key, flight)
+
+    async def _astream(self, question: str, role: str, k: int, use_cache: bool) -> AsyncIterator[Dict]:
+        timings: Dict = {}
+        plan = self._timed(timings, "plan", self.plan, question)
+        hit = await self._offload(self._fact_answer, question, role, plan, timings) if self._wants_facts(plan) else None
+        if hit is None:
+            q_emb = await self._atimed(timings, "encode", self._offload(self.encode_question, question))
+            scope, hit = self._cache_lookup(question, role, k, q_emb, use_cache)
+        if hit is not None:
+            yield {"event": "docs", "plan": hit["plan"], "docs": hit["docs"]}
+            yield {"event": "token", "text": hit["answer"]}
+            yield {"event": "result", "result": hit}
+            return
+
+        gate = None
+        if RELEVANCE_GATE != "off":
+            docs, reflect_res, gate, prompt, prompt_tokens = await self._offload(
+                self._gated_retrieve_prompt, question, role, k, q_emb, timings, plan["domains"])
+            yield {"event": "docs", "plan": plan, "docs": docs}
+            if gate["decision"] == "blocked":
+                result = self._insufficient(question, plan, docs, reflect_res, gate, timings)
+                yield {"event": "token", "text": result["answer"]}
+                yield {"event": "result", "result": result}
+                return
+            reflect_task = None
+        else:
+            docs, prompt, prompt_tokens = await self._offload(
+                self._retrieve_prompt, question, role, k, timings, plan["domains"])
+            yield {"event": "docs", "plan": plan, "docs": docs}
+            # reflection overlaps with token generation
+            reflect_task = asyncio.ensure_future(
+                self._atimed(timings, "reflect", self._offload(self.reflect, question, docs, q_emb=q_emb))
+            )
+        parts = []
+        answer_start = time.perf_counter()
+        try:
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"event": "token", "text": chunk.content}
+        except BaseException:
+            if reflect_task is not None:
+                reflect_task.cancel()
+            raise
+        answer_s = time.perf_counter() - answer_start
+        timings["answer_s"] = round(answer_s, 4)
+        STAGE_SECONDS.observe(answer_s, stage="answer")
+        if reflect_task is not None:
+            reflect_res = await reflect_task
+
+        result = {
+            "plan": plan,
+            "docs": docs,
+            "answer": "".join(parts).strip(),
+            "relevance": reflect_res["relevance"],
+            "ok": reflect_res["ok"],
+            "gate": gate,
+        }
+        yield {"event": "result", "result": self._finish(question, scope, q_emb, result, timings, prompt_tokens)}
+
+    async def _answer_with_retries(self, question: str, docs: List[Dict], prompt: str,
+                                   semaphore: asyncio.Semaphore, timings: Dict) -> str:
+        """aanswer() under the batch's concurrency limit; failed calls back off and retry outside it."""
+        for attempt in range(BATCH_LLM_RETRIES + 1):
+            try:
+                async with semaphore:
+                    return await self._atimed(timings, "answer", self.aanswer(question, docs, prompt=prompt))
+            except Exception:
+                if attempt == BATCH_LLM_RETRIES:
+                    raise
+                LLM_RETRIES.inc()
+                await asyncio.sleep(BATCH_RETRY_BACKOFF_S * 2 ** attempt)
+
+    def _fact_answers(self, questions: List[str], role: str, plans: List[Dict], timings: Dict) -> Dict[int, Dict]:
+        """_fact_answer() over a batch: index -> result for the questions the fact index answered."""
+        out = {}
+        for i, (question, plan) in enumerate(zip(questions, plans)):
+            if self._wants_facts(plan):
+                res = self._fact_answer(question, role, plan, dict(timings))
+                if res is not None:
+                    out[i] = res
+        return out
+
+    @staticmethod
+    async def _indexed(i: int, awaitable) -> Tuple[int, Dict]:
+        return i, await awaitable
+
+    async def arun_batch(self, items: List[Dict], role: str = "analyst", concurrency: int | None = None,
+                         ordered: bool = True) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Batch RAG cycle over items of {"question", "k", "use_cache"} from one caller: fact-index
+        answers first, one encoding pass for the rest, bulk retrieval and reflection, then LLM calls fanned
+        out under `concurrency` (BATCH_LLM_CONCURRENCY) with retries. Yields (index, result)
+        in input order, or as each completes when ordered=False. A question whose LLM call
+        still fails yields a result with "error" set rather than failing the batch.
+        """
+        if not items:
+            return
+        batch_timings: Dict = {}
+        questions = [it["question"] for it in items]
+        plans = [self._timed(batch_timings, "plan", self.plan, q) for q in questions]
+        ready: Dict[int, Dict] = await self._offload(self._fact_answers, questions, role, plans, batch_timings)
+
+        rest = [i for i in range(len(items)) if i not in ready]
+        q_embs: Dict[int, np.ndarray] = {}
+        if rest:
+            embs = await self._atimed(batch_timings, "encode", self._offload(
+                encode_normalized, [questions[i] for i in rest], self.reflect_model))
+            q_embs = dict(zip(rest, embs))
+        scopes: Dict[int, object] = {}
+        for i in rest:
+            scope, hit = self._cache_lookup(questions[i], role, items[i]["k"], q_embs[i], items[i]["use_cache"])
+            if hit is not None:
+                ready[i] = hit
+            else:
+                scopes[i] = scope
+        todo = list(scopes)
+        tasks: List[asyncio.Future] = []
+        if todo:
+            docs_lists, reflects, gates = await self._offload(
+                self._gated_retrieve_batch, [questions[i] for i in todo], role, [items[i]["k"] for i in todo],
+                np.stack([q_embs[i] for i in todo]), batch_timings, [plans[i]["domains"] for i in todo])
+            semaphore = asyncio.Semaphore(concurrency or BATCH_LLM_CONCURRENCY)
+
+            async def complete(i: int, plan: Dict, docs: List[Dict], reflect_res: Dict, gate: Dict | None) -> Dict:
+                timings = dict(batch_timings)
+                if gate is not None and gate["decision"] == "blocked":
+                    return self._insufficient(questions[i], plan, docs, reflect_res, gate, timings)
+                prompt = self.build_prompt(questions[i], docs)
+                result = {
+                    "plan": plan,
+                    "docs": docs,
+                    "answer": None,
+                    "relevance": reflect_res["relevance"],
+                    "ok": reflect_res["ok"],
+                    "gate": gate,
+                }
+                try:
+                    result["answer"] = await self._answer_with_retries(questions[i], docs, prompt, semaphore, timings)
+                except Exception as e:
+                    return {**result, "ok": False, "error": f"{type(e).__name__}: {e}", "timings": timings}
+                return self._finish(questions[i], scopes[i], q_embs[i], result, timings, count_tokens(prompt))
+
+            tasks = [asyncio.ensure_future(self._indexed(i, complete(i, *args)))
+                     for i, args in zip(todo, zip([plans[i] for i in todo], docs_lists, reflects, gates))]
+
+        try:
+            if ordered:
+                pending = dict(zip(todo, tasks))
+                for i in range(len(items)):
+                    yield (i, ready[i]) if i in ready else await pending[i]
+            else:
+                for i, hit in ready.items():
+                    yield i, hit
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def embed_service_stats(self) -> Dict | None:
+        """Shared embedding service stats when this worker embeds through it, else None."""
+        if not isinstance(self.store.embeddings, EmbedServiceClient):
+            return None
+        try:
+            return self.store.embeddings.stats()
+        except (ConnectionError, OSError) as e:
+            return {"error": str(e)}
+
+    def singleflight_stats(self) -> Dict:
+        leaders, followers = SINGLEFLIGHT_CALLS.value(role="leader"), SINGLEFLIGHT_CALLS.value(role="follower")
+        return {
+            "enabled": SINGLEFLIGHT,
+            "inflight": len(self._inflight),
+            "leaders": leaders,
+            "followers": followers,
+            "coalesce_rate": round(followers / (leaders + followers), 4) if leaders + followers else 0.0,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "singleflight": self.singleflight_stats(),
+            "embed_service": self.embed_service_stats(),
+            "vectorstore": self.store.stats(),
+            "bm25_memory_bytes": self.store.bm25.memory_bytes() if self.store.bm25 is not None else None,
+            "answer_cache": self.cache.stats() if self.cache is not None else None,
         }
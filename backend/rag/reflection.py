@@ -0,0 +1,331 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Dict
+import numpy as np
+from .embeddings import get_embeddings, as_encoder, providers, current_backend, default_model
+
+# a sentence-transformers model name, "shared" (reuse the retrieval embeddings instance)
+# or an embedding backend name such as "onnx" / "hash"
+REFLECT_MODEL = os.getenv("REFLECT_MODEL", "all-MiniLM-L6-v2")
+REFLECT_BATCH_SIZE = int(os.getenv("REFLECT_BATCH_SIZE", "64"))
+# vectors of not-yet-stored chunks held in memory between compactions (see ReflectionIndex.vectors_for)
+REFLECT_BACKFILL_MAX = int(os.getenv("REFLECT_BACKFILL_MAX", "20000"))
+
+# --- Shared reflection encoder ---
+_model = None
+_model_lock = threading.Lock()
+
+def get_reflect_model():
+    """Load the reflection encoder once per process (anything with a SentenceTransformer-style .encode())."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if REFLECT_MODEL == "shared":
+                    _model = as_encoder(get_embeddings())
+                elif REFLECT_MODEL in providers():
+                    _model = as_encoder(get_embeddings(backend=REFLECT_MODEL))
+                elif current_backend() == "service":
+                    # served by the shared embedding service like retrieval, not loaded per worker
+                    _model = get_embeddings(REFLECT_MODEL, backend="service")
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(REFLECT_MODEL)
+    return _model
+
+def reflect_model_name() -> str:
+    """Identity of the vectors get_reflect_model() produces; a sidecar is only reused by the same model."""
+    if REFLECT_MODEL == "shared":
+        backend = current_backend()
+        return f"{backend}:{os.getenv('EMBED_MODEL') or default_model(backend)}"
+    if REFLECT_MODEL in providers():
+        return f"{REFLECT_MODEL}:{default_model(REFLECT_MODEL)}"
+    if current_backend() == "service":
+        return f"service:{REFLECT_MODEL}"
+    return f"sentence-transformers:{REFLECT_MODEL}"
+
+def encode_normalized(texts: List[str], model=None) -> np.ndarray:
+    model = model or get_reflect_model()
+    embs = model.encode(texts, batch_size=REFLECT_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True)
+    return np.asarray(embs, dtype=np.float32).reshape(len(texts), -1)
+
+def doc_key(doc: Dict) -> str:
+    """Sidecar key for a retrieved or ingested chunk: its chunk id, else '<id>@<version>'."""
+    meta = doc.get("metadata") or doc.get("meta") or {}
+    if meta.get("chunk_id"):
+        return meta["chunk_id"]
+    return f"{meta.get('id', doc.get('id'))}@{meta.get('version', '')}"
+
+
+class ReflectionIndex:
+    """
+    float16 memory-mapped sidecar of normalized reflection embeddings,
+    keyed by chunk id (doc id + version) so a new version never reuses a stale vector.
+    The key -> row map is a small SQLite table, so an add persists only its new rows.
+    Rows are allocated inside a SQLite write transaction, so API workers sharing the
+    sidecar never hand out the same row; each picks up the others' rows as it meets them.
+    The sidecar records the model that wrote it and is discarded when opened for another.
+    """
+
+    def __init__(self, directory: str, model: str | None = None):
+        self.directory = directory
+        self.model = model
+        self._data_path = os.path.join(directory, "embeddings.f16")
+        self._legacy_index_path = os.path.join(directory, "index.json")
+        self._lock = threading.RLock()
+        self._rows: Dict[str, int] = {}
+        self._dim: int | None = None
+        self._capacity = 0
+        self._epoch = "0"   # bumped by compact(), which renumbers every row
+        self._mm: np.memmap | None = None
+        # vectors encoded at query time for chunks without a stored row; persisted by compaction
+        self._backfill: Dict[str, np.ndarray] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "rows.db"), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self._db.commit()
+        self._load()
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+
+    def _set_meta(self, **values):
+        """Caller commits (add() and compact() write meta inside their own transaction)."""
+        self._db.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                             [(k, str(v)) for k, v in values.items()])
+
+    def _load(self):
+        meta = self._meta()
+        if not meta and os.path.exists(self._legacy_index_path):
+            meta = self._import_legacy_index()
+        if not self._usable(meta):
+            # re-checked under the write lock: another process may be creating the sidecar right now
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._meta()
+                if not self._usable(meta, report=True):
+                    # rows without their vector file (or from another model) are useless; start over
+                    self._db.execute("DELETE FROM rows")
+                    self._db.execute("DELETE FROM meta")
+                    if os.path.exists(self._data_path):
+                        os.remove(self._data_path)
+                    self._db.commit()
+                    return
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        self._rows = dict(self._db.execute("SELECT key, row FROM rows").fetchall())
+        self._dim = int(meta["dim"])
+        self._epoch = meta.get("epoch", "0")
+        self._map(int(meta["capacity"]))
+
+    def _usable(self, meta: Dict[str, str], report: bool = False) -> bool:
+        if "dim" in meta and self.model and meta.get("model") != self.model:
+            # another model's vectors: a different shape, or the same shape in a different space
+            if report:
+                print(f"[RegiGuard] Reflection sidecar was written by {meta.get('model') or 'an unrecorded model'}, "
+                      f"not {self.model}; discarding it")
+            return False
+        return "dim" in meta and os.path.exists(self._data_path)
+
+    def _map(self, capacity: int):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None
+        self._capacity = capacity
+        self._mm = np.memmap(self._data_path, dtype=np.float16, mode="r+", shape=(self._capacity, self._dim))
+
+    def _catch_up(self, keys: List[str]):
+        """
+        Pick up what other processes wrote: rows stored for `keys`, a grown data file, or a
+        compaction (which renumbers everything). Caller holds self._lock.
+        """
+        # rows first, then meta: a row is committed together with the capacity that holds it
+        unknown = [k for k in dict.fromkeys(keys) if k not in self._rows]
+        found = []
+        for i in range(0, len(unknown), 500):
+            batch = unknown[i:i + 500]
+            found += self._db.execute(
+                f"SELECT key, row FROM rows WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+        meta = self._meta()
+        if "dim" not in meta:
+            return
+        if self._dim is None:
+            self._dim = int(meta["dim"])
+        if meta.get("epoch", "0") != self._epoch:
+            self._rows = dict(self._db.execute("SELECT key, row FROM rows").fetchall())
+            self._epoch = meta.get("epoch", "0")
+            self._map(int(meta["capacity"]))
+            return
+        if int(meta["capacity"]) != self._capacity:
+            self._map(int(meta["capacity"]))
+        self._rows.update(found)
+
+    def _import_legacy_index(self) -> Dict[str, str]:
+        """One-time move of a sidecar written with the old whole-file index.json."""
+        with open(self._legacy_index_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO rows (key, row) VALUES (?, ?)", state["rows"].items())
+            self._set_meta(dim=state["dim"], capacity=state["capacity"])
+        os.remove(self._legacy_index_path)
+        return self._meta()
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        if self._dim is None:
+            self._dim = dim
+        if needed <= self._capacity:
+            return
+        new_cap = max(needed, self._capacity * 2, 1024)
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None
+        with open(self._data_path, "ab") as f:
+            f.truncate(new_cap * self._dim * 2)
+        self._map(new_cap)
+        self._set_meta(dim=self._dim, capacity=self._capacity, **({"model": self.model} if self.model else {}))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, keys: List[str], vectors: np.ndarray):
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._dim is not None and vectors.shape[1] != self._dim:
+                raise ValueError(f"Reflection vectors have dimension {vectors.shape[1]}, the sidecar holds {self._dim} "
+                                 f"({self.model or 'unrecorded model'})")
+            # the write lock spans allocation, the vector writes and the row inserts, so another
+            # process can neither take the same rows nor see rows before their vectors
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up(keys)
+                if self._dim is not None and vectors.shape[1] != self._dim:
+                    raise ValueError(f"Reflection vectors have dimension {vectors.shape[1]}, "
+                                     f"the sidecar holds {self._dim} ({self.model or 'unrecorded model'})")
+                next_row = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+                new_rows: Dict[str, int] = {}
+                for key in keys:
+                    if key not in self._rows and key not in new_rows:
+                        new_rows[key] = next_row + len(new_rows)
+                self._ensure_capacity(next_row + len(new_rows), vectors.shape[1])
+                for key, vec in zip(keys, vectors):
+                    row = self._rows.get(key, new_rows.get(key))
+                    self._mm[row] = vec.astype(np.float16)
+                self._mm.flush()
+                self._db.executemany("INSERT OR REPLACE INTO rows (key, row) VALUES (?, ?)", new_rows.items())
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._rows.update(new_rows)
+            for key in keys:
+                self._backfill.pop(key, None)
+
+    def add_texts(self, keys: List[str], texts: List[str], model=None):
+        if keys:
+            self.add(keys, encode_normalized(texts, model))
+
+    def get(self, keys: List[str]) -> tuple[np.ndarray | None, List[int]]:
+        """Return (rows for known keys in order, positions of missing keys)."""
+        with self._lock:
+            rows = [self._rows.get(k) for k in keys]
+            missing = [i for i, r in enumerate(rows) if r is None]
+            found = [r for r in rows if r is not None]
+            if not found:
+                return None, missing
+            return np.asarray(self._mm[found], dtype=np.float32), missing
+
+    def vectors_for(self, docs: List[Dict], model=None) -> np.ndarray:
+        """
+        Embeddings for docs in order. Chunks without a stored vector (indexed before the
+        sidecar existed) are encoded and kept in memory; nothing is written on this query path.
+        """
+        keys = [doc_key(d) for d in docs]
+        encoded: Dict[str, np.ndarray] = {}
+        while True:
+            with self._lock:
+                missing = [i for i, k in enumerate(keys)
+                           if k not in self._rows and k not in self._backfill and k not in encoded]
+                if missing:
+                    # another worker may have stored them since we last looked
+                    self._catch_up([keys[i] for i in missing])
+                    missing = [i for i in missing if keys[i] not in self._rows]
+                if not missing:
+                    return self._stack(keys, encoded)
+            vecs = encode_normalized([docs[i]["text"] for i in missing], model)
+            encoded.update(zip((keys[i] for i in missing), vecs))
+            with self._lock:
+                if len(self._backfill) + len(encoded) > REFLECT_BACKFILL_MAX:
+                    self._backfill.clear()
+                self._backfill.update(encoded)
+
+    def _stack(self, keys: List[str], encoded: Dict[str, np.ndarray]) -> np.ndarray:
+        if not keys:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        out = []
+        for k in keys:
+            row = self._rows.get(k)
+            if row is not None:
+                out.append(np.asarray(self._mm[row], dtype=np.float32))
+            else:
+                out.append(encoded[k] if k in encoded else self._backfill[k])
+        return np.stack(out)
+
+    def persist_backfill(self) -> int:
+        """Store the vectors vectors_for() encoded at query time (run off the query path, by compaction)."""
+        with self._lock:
+            pending = {k: v for k, v in self._backfill.items() if k not in self._rows}
+            self._backfill.clear()
+        if pending:
+            self.add(list(pending), np.stack(list(pending.values())))
+        return len(pending)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+
+    def compact(self, drop_keys: set) -> Dict:
+        """Rewrite the sidecar without `drop_keys`; returns rows and bytes reclaimed."""
+        with self._lock:
+            if self._mm is None or not drop_keys:
+                return {"rows_removed": 0, "bytes_reclaimed": 0}
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # every process's rows, not just the ones this one has seen
+                self._epoch = None
+                self._catch_up([])
+                keep = [(k, r) for k, r in self._rows.items() if k not in drop_keys]
+                removed = len(self._rows) - len(keep)
+                if not removed:
+                    self._db.rollback()
+                    return {"rows_removed": 0, "bytes_reclaimed": 0}
+                old_bytes = os.path.getsize(self._data_path)
+                new_cap = max(len(keep), 1024)
+                tmp = self._data_path + ".tmp"
+                new_mm = np.memmap(tmp, dtype=np.float16, mode="w+", shape=(new_cap, self._dim))
+                for new_row, (_, old_row) in enumerate(keep):
+                    new_mm[new_row] = self._mm[old_row]
+                new_mm.flush()
+                del new_mm
+                self._mm = None
+                os.replace(tmp, self._data_path)
+                self._rows = {k: i for i, (k, _) in enumerate(keep)}
+                self._map(new_cap)
+                self._epoch = str(int(self._meta().get("epoch", "0")) + 1)
+                self._db.execute("DELETE FROM rows")
+                self._db.executemany("INSERT INTO rows (key, row) VALUES (?, ?)", self._rows.items())
+                self._set_meta(capacity=self._capacity, epoch=self._epoch)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            return {"rows_removed": removed, "bytes_reclaimed": old_bytes - os.path.getsize(self._data_path)}
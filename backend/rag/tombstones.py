@@ -0,0 +1,68 @@
+import os
+import json
+import datetime
+import threading
+from typing import Dict, List, Tuple
+
+
+class TombstoneLog:
+    """
+    Retired doc versions, persisted next to the vector store.
+    Queries exclude tombstoned versions immediately; compaction purges them later.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}   # '<id>@<version>' -> record
+        self._read()
+
+    def _read(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def reload(self):
+        """Re-read the file after another process changed it."""
+        with self._lock:
+            self._read()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+    def add(self, doc_id: str, versions: List[str], reason: str = "deleted", superseded_by: str | None = None):
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock:
+            self._read()   # keep what other processes added since we last looked
+            for v in versions:
+                self._entries[f"{doc_id}@{v}"] = {
+                    "id": doc_id, "version": v, "reason": reason,
+                    "superseded_by": superseded_by, "at": now,
+                }
+            self._save()
+
+    def remove(self, keys: List[str]):
+        with self._lock:
+            self._read()
+            for key in keys:
+                self._entries.pop(key, None)
+            self._save()
+
+    def is_dead(self, doc_id: str, version: str) -> bool:
+        return f"{doc_id}@{version}" in self._entries
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Dead (doc id, version) pairs; a version string alone may be shared by other docs."""
+        with self._lock:
+            return sorted((e["id"], e["version"]) for e in self._entries.values())
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            return [dict(e, key=k) for k, e in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
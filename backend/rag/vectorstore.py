@@ -1,73 +1,667 @@
 import os
+import json
+import time
+import hashlib
 import datetime
-from typing import List
-# modern LangChain provider imports 
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import threading
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from dotenv import load_dotenv
+from .embeddings import get_embeddings, current_backend, default_model
+from .reflection import ReflectionIndex, doc_key, reflect_model_name
+from .bm25 import BM25Index, identifiers
+from .domains import classify_document
+from .chunking import chunk_id, split_document
+from .tombstones import TombstoneLog
+from .changes import ChangeLog
+from .facts import FactIndex, extract_facts
+from backend.metrics import RETRIEVER_SECONDS, RETRIEVALS
 
 load_dotenv()
 
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
-EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-large")
+# "chroma" (default) or "faiss" (see faiss_store.py for index type and search parameters)
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma")
+COMPACT_BATCH_SIZE = int(os.getenv("COMPACT_BATCH_SIZE", "500"))
+# "hybrid" (BM25 + vector, rank-fused), "vector" or "bm25"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = int(os.getenv("RRF_K", "60"))
+# candidates pulled from each retriever before fusion, as a multiple of k
+HYBRID_FETCH = int(os.getenv("HYBRID_FETCH", "4"))
+# striped per-doc-id ingest locks (a doc id always maps to the same stripe)
+INGEST_LOCK_STRIPES = int(os.getenv("INGEST_LOCK_STRIPES", "64"))
+# how long compaction keeps change-log entries; a worker further behind rebuilds its keyword index
+CHANGE_LOG_RETENTION_S = float(os.getenv("CHANGE_LOG_RETENTION_S", "86400"))
 
-def get_embeddings():
+def _config_from_env() -> dict:
+    """Current store config; re-read on access so .env / env changes trigger a reload."""
+    backend = current_backend()
+    return {
+        "persist_directory": os.getenv("CHROMA_DIR", CHROMA_DIR),
+        "engine": os.getenv("VECTOR_ENGINE", VECTOR_ENGINE),
+        "embed_backend": backend,
+        "embed_model": os.getenv("EMBED_MODEL") or default_model(backend),
+    }
+
+
+class VectorStoreHandle:
     """
-    Try OpenAI embeddings first; on any failure, fall back to a HuggingFace sentence-transformer.
+    Process-wide Chroma store + embedding client.
+    Opened once and shared across threads; reopened only when the config changes.
     """
+
+    def __init__(self, persist_directory: str | None = None, embed_model: str | None = None,
+                 embeddings=None, engine: str | None = None):
+        # explicit arguments pin the config; otherwise it follows the environment
+        self._pinned = {"persist_directory": persist_directory, "embed_model": embed_model, "engine": engine}
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._vs = None
+        # a caller-supplied embedding client (benchmarks, tests) is never rebuilt
+        self._fixed_embeddings = embeddings
+        self._embeddings = embeddings
+        self._config: dict | None = None
+        self.reflection: ReflectionIndex | None = None
+        self.tombstones: TombstoneLog | None = None
+        self.facts: FactIndex | None = None
+        self.bm25: BM25Index | None = None
+        self.bm25_build_seconds: float | None = None
+        # other processes' writes reach this one through the shared change log (see sync())
+        self.changes: ChangeLog | None = None
+        self._seen_change = 0
+        self._sync_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._doc_locks = [threading.Lock() for _ in range(INGEST_LOCK_STRIPES)]
+        self._listeners = []
+        self.open_seconds: float | None = None
+        self.opened_at: str | None = None
+        self.reloads = 0
+
+    def _desired_config(self) -> dict:
+        config = _config_from_env()
+        for key, val in self._pinned.items():
+            if val:
+                config[key] = val
+        return config
+
+    def open(self, force: bool = False):
+        """Return the live Chroma store, (re)opening it if needed."""
+        config = self._desired_config()
+        vs = self._vs
+        if vs is not None and not force and config == self._config:
+            self.sync()
+            return vs
+
+        with self._lock:
+            # another thread may have reopened while we waited
+            if self._vs is not None and not force and config == self._config:
+                return self._vs
+
+            start = time.perf_counter()
+            embeddings = self._embeddings
+            if self._fixed_embeddings is not None:
+                embeddings = self._fixed_embeddings
+            elif embeddings is None or force or any(
+                    (self._config or {}).get(key) != config[key] for key in ("embed_backend", "embed_model")):
+                embeddings = get_embeddings(config["embed_model"], config["embed_backend"])
+            vs = _open_engine(config, embeddings)
+            reflection, tombstones, facts, changes = self.reflection, self.tombstones, self.facts, self.changes
+            if reflection is None or (self._config or {}).get("persist_directory") != config["persist_directory"]:
+                reflection = ReflectionIndex(os.path.join(config["persist_directory"], "reflection"),
+                                             model=reflect_model_name())
+                tombstones = TombstoneLog(os.path.join(config["persist_directory"], "tombstones.json"))
+                facts = FactIndex(os.path.join(config["persist_directory"], "facts.db"))
+                changes = ChangeLog(os.path.join(config["persist_directory"], "changes.db"))
+
+            bm25, seen = self.bm25, self._seen_change
+            if bm25 is None or force or (self._config or {}).get("persist_directory") != config["persist_directory"]:
+                # read the position first: changes made during the build are replayed (idempotently)
+                seen = changes.latest()
+                tombstones.reload()
+                bm25 = self._build_bm25(vs)
+
+            if self._vs is not None:
+                self.reloads += 1
+            self._vs, self._embeddings, self._config = vs, embeddings, config
+            self.reflection, self.tombstones, self.facts, self.bm25 = reflection, tombstones, facts, bm25
+            self.changes, self._seen_change = changes, seen
+            self.open_seconds = time.perf_counter() - start
+            self.opened_at = datetime.datetime.utcnow().isoformat()
+            print(f"[RegiGuard] Vector store opened in {self.open_seconds:.2f}s ({config['persist_directory']})")
+            return vs
+
+    def _build_bm25(self, vs, page: int = 5000) -> BM25Index:
+        """Index every stored chunk; the inverted index itself is never persisted."""
+        start = time.perf_counter()
+        index = BM25Index()
+        offset = 0
+        while True:
+            got = vs.get(include=["documents", "metadatas"], limit=page, offset=offset)
+            ids = got.get("ids") or []
+            if not ids:
+                break
+            index.add(ids, got.get("documents") or [], got.get("metadatas") or [])
+            offset += len(ids)
+        self.bm25_build_seconds = time.perf_counter() - start
+        return index
+
+    def reload(self):
+        return self.open(force=True)
+
+    @property
+    def vectorstore(self):
+        return self.open()
+
+    @property
+    def embeddings(self):
+        self.open()
+        return self._embeddings
+
+    def add(self, docs: List[Document], ids: List[str] | None = None):
+        vs = self.open()
+        # the keyword index needs to know each chunk's id, so never let Chroma invent them
+        ids = ids or [str(uuid.uuid4()) for _ in docs]
+        # Chroma's sqlite backend serializes writers anyway; keep ours orderly
+        with self._write_lock:
+            vs.add_documents(docs, ids=ids)
+            self.bm25.add(ids, [d.page_content for d in docs], [d.metadata for d in docs])
+            _persist(vs)
+            self._record("add", ids)
+
+    def get_chunks(self, where: dict | None) -> tuple[List[str], List[dict]]:
+        """Ids and metadata of stored chunks matching a metadata predicate (None = all)."""
+        got = self.open().get(where=where, include=["metadatas"])
+        return list(got.get("ids") or []), list(got.get("metadatas") or [])
+
+    def live_versions(self, doc_id: str) -> List[str]:
+        _, metas = self.get_chunks({"id": doc_id})
+        return sorted({m["version"] for m in metas if not self.tombstones.is_dead(doc_id, m["version"])})
+
+    def is_live(self, doc_id: str, version: str) -> bool:
+        """Whether this doc version is stored and not retired, as of every process's writes."""
+        self.open()
+        return self.bm25.has_version(doc_id, version) and not self.tombstones.is_dead(doc_id, version)
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        vs = self.open()
+        with self._write_lock:
+            vs.delete(ids=ids)
+            self.bm25.remove(ids)
+            self._record("delete", ids)
+
+    def retire(self, doc_id: str, reason: str = "deleted", superseded_by: str | None = None) -> List[str]:
+        """Tombstone every live version of a doc; it drops out of the very next query."""
+        self.open()
+        versions = self.live_versions(doc_id)
+        if versions:
+            self.tombstones.add(doc_id, versions, reason=reason, superseded_by=superseded_by)
+            self._record("retire", [doc_id])
+            self.notify_changed([doc_id])
+        return versions
+
+    def compact(self, batch_size: int = COMPACT_BATCH_SIZE) -> dict:
+        """
+        Physically purge tombstoned chunks and orphaned reflection rows.
+        Deletes go in small batches under the write lock, so searches keep running.
+        """
+        with self._compact_lock:
+            vs = self.open()
+            start = time.perf_counter()
+            entries = self.tombstones.entries()
+
+            removed = 0
+            for e in entries:
+                ids, metas = self.get_chunks({"version": e["version"]})
+                ids = [i for i, m in zip(ids, metas) if m.get("id") == e["id"]]
+                for i in range(0, len(ids), batch_size):
+                    self.delete(ids[i:i + batch_size])
+                removed += len(ids)
+
+            # reflection rows whose chunk no longer exists (tombstoned or replaced versions)
+            backfilled = self.reflection.persist_backfill()
+            known_rows = set(self.reflection.keys())
+            live_ids, _ = self.get_chunks(None)
+            reflection_report = self.reflection.compact(known_rows - set(live_ids))
+            facts_removed = self.facts.remove_versions([(e["id"], e["version"]) for e in entries])
+
+            self.tombstones.remove([e["key"] for e in entries])
+            self._record("tombstones", [])
+            self.changes.trim(CHANGE_LOG_RETENTION_S)
+            _persist(vs)
+            # counts, not a directory-size delta: WAL growth and index files that only shrink
+            # on a rebuild made that delta meaningless (often negative)
+            return {
+                "tombstones_purged": len(entries),
+                "vectors_removed": removed,
+                "reflection_rows_removed": reflection_report["rows_removed"],
+                "reflection_bytes_reclaimed": reflection_report["bytes_reclaimed"],
+                "reflection_rows_backfilled": backfilled,
+                "facts_removed": facts_removed,
+                "seconds": round(time.perf_counter() - start, 3),
+                "finished_at": datetime.datetime.utcnow().isoformat(),
+            }
+
+    # --- cross-process consistency ---
+    def _record(self, op: str, ids: List[str]):
+        """Log a change this process has already applied, so other processes replay it."""
+        seq = self.changes.append(op, ids)
+        with self._sync_lock:
+            if seq == self._seen_change + 1:
+                # nothing from elsewhere in between: no need to replay our own change
+                self._seen_change = seq
+
+    def sync(self):
+        """
+        Apply other processes' changes from the shared log: their chunks enter or leave the
+        keyword index, tombstones are re-read and listeners (the answer cache) hear about the
+        affected docs. One SQLite read when nothing changed.
+        """
+        if self.changes is None or self.changes.latest() == self._seen_change:
+            return
+        with self._sync_lock:
+            latest = self.changes.latest()
+            if latest <= self._seen_change:
+                return
+            pending = self.changes.since(self._seen_change)
+            changed_docs = set()
+            if pending is None:
+                # too far behind to replay (log trimmed): start again from the store
+                self.bm25 = self._build_bm25(self._vs)
+                self.tombstones.reload()
+            else:
+                reload_tombstones = False
+                for _, op, ids in pending:
+                    if op == "add":
+                        got = self._vs.get(ids=ids, include=["documents", "metadatas"])
+                        metas = got.get("metadatas") or []
+                        self.bm25.add(got.get("ids") or [], got.get("documents") or [], metas)
+                        changed_docs.update(m.get("id") for m in metas if m)
+                    elif op == "delete":
+                        self.bm25.remove(ids)
+                    else:
+                        reload_tombstones = True
+                        changed_docs.update(ids)
+                if reload_tombstones:
+                    self.tombstones.reload()
+            self._seen_change = latest if pending is None else pending[-1][0]
+        if changed_docs or pending is None:
+            self.notify_changed(sorted(d for d in changed_docs if d))
+
+    def subscribe(self, callback):
+        """Register callback(doc_ids) fired after documents are indexed or retired."""
+        self._listeners.append(callback)
+
+    def domain_tagged(self) -> bool:
+        """Whether every stored chunk has a domain tag, i.e. domain-routed search cannot miss any."""
+        self.open()
+        return self.bm25.domain_tagged()
+
+    @contextmanager
+    def doc_locks(self, doc_ids: List[str]):
+        """Hold the ingest locks of these doc ids (taken in stripe order, so batches never deadlock)."""
+        stripes = sorted({int(hashlib.sha1(i.encode("utf-8")).hexdigest(), 16) % len(self._doc_locks)
+                          for i in doc_ids})
+        with ExitStack() as stack:
+            for n in stripes:
+                stack.enter_context(self._doc_locks[n])
+            yield
+
+    def notify_changed(self, doc_ids: List[str]):
+        for callback in list(self._listeners):
+            try:
+                callback(doc_ids)
+            except Exception as e:
+                print(f"[RegiGuard] index listener failed: {e}")
+
+    def similarity_search(self, query: str, k: int = 3, filter: dict | None = None):
+        return self.open().similarity_search_with_score(query, k=k, filter=filter)
+
+    def similarity_search_by_vectors(self, vectors: List[List[float]], k: int = 3, filter: dict | None = None):
+        """One search for many query embeddings: a list of (Document, distance) lists, one per vector."""
+        vs = self.open()
+        if hasattr(vs, "similarity_search_by_vectors"):
+            return vs.similarity_search_by_vectors(vectors, k=k, filter=filter)
+        # Chroma takes every query embedding in a single collection query
+        got = vs._collection.query(query_embeddings=vectors, n_results=k, where=filter,
+                                   include=["documents", "metadatas", "distances"])
+        return [[(Document(page_content=text, metadata=meta or {}), dist) for text, meta, dist in zip(*row)]
+                for row in zip(got["documents"], got["metadatas"], got["distances"])]
+
+    def keyword_search(self, query: str, k: int = 3, allowed_access: list | None = None,
+                       domains: list | None = None) -> List[dict]:
+        """BM25 hits hydrated from Chroma: (chunk id, text, metadata, bm25) dicts, best first."""
+        vs = self.open()
+        hits = self.bm25.search(query, k=k, allowed_access=allowed_access, is_dead=self.tombstones.is_dead,
+                                domains=domains)
+        if not hits:
+            return []
+        got = vs.get(ids=[h["chunk_id"] for h in hits], include=["documents", "metadatas"])
+        found = {cid: (text, meta) for cid, text, meta in
+                 zip(got.get("ids") or [], got.get("documents") or [], got.get("metadatas") or [])}
+        out = []
+        for h in hits:
+            if h["chunk_id"] in found:   # a concurrent delete may have won the race
+                text, meta = found[h["chunk_id"]]
+                out.append({**h, "text": text, "metadata": dict(meta or {})})
+        return out
+
+    def lookup_facts(self, question: str, kind: str, allowed_access: list,
+                     domains: list | None = None) -> List[dict]:
+        """Deadline / penalty facts answering the question from live doc versions (see facts.py)."""
+        self.open()
+        return self.facts.lookup(question, kind, allowed_access, domains=domains, is_dead=self.tombstones.is_dead)
+
+    def stats(self) -> dict:
+        return {
+            "open": self._vs is not None,
+            "persist_directory": (self._config or {}).get("persist_directory"),
+            "engine": (self._config or {}).get("engine"),
+            "faiss": self._vs.stats() if (self._config or {}).get("engine") == "faiss" else None,
+            "embed_backend": (self._config or {}).get("embed_backend"),
+            "embed_model": (self._config or {}).get("embed_model"),
+            "open_seconds": round(self.open_seconds, 3) if self.open_seconds is not None else None,
+            "opened_at": self.opened_at,
+            "reloads": self.reloads,
+            "reflection_vectors": len(self.reflection) if self.reflection is not None else 0,
+            "tombstones": len(self.tombstones) if self.tombstones is not None else 0,
+            "facts": self.facts.stats() if self.facts is not None else None,
+            "bm25": {**self.bm25.stats(), "build_seconds": round(self.bm25_build_seconds or 0.0, 3)}
+            if self.bm25 is not None else None,
+        }
+
+
+def _open_engine(config: dict, embeddings):
+    if config["engine"] == "faiss":
+        from .faiss_store import FaissStore
+        return FaissStore(os.path.join(config["persist_directory"], "faiss"), embeddings)
+    if config["engine"] != "chroma":
+        raise ValueError(f"Unknown VECTOR_ENGINE '{config['engine']}' (choose chroma or faiss)")
+    return Chroma(persist_directory=config["persist_directory"], embedding_function=embeddings)
+
+def _persist(vs):
     try:
-        return OpenAIEmbeddings(model=EMBED_MODEL)
-    except Exception as e:
-        # fallback to local HuggingFace embeddings (offline)
-        print(f"[RegiGuard] OpenAIEmbeddings failed, falling back to HuggingFace: {e}")
-        return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        vs.persist()
+    except Exception:
+        # some Chroma versions persist automatically; ignore persistence errors
+        pass
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# --- Process-wide handle ---
+_store = VectorStoreHandle()
+
+def get_store() -> VectorStoreHandle:
+    return _store
 
 def get_vectorstore(persist_directory: str = CHROMA_DIR):
-    embeddings = get_embeddings()
-    vs = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
-    return vs
+    if persist_directory == _config_from_env()["persist_directory"]:
+        return _store.vectorstore
+    return VectorStoreHandle(persist_directory=persist_directory).vectorstore
+
+def access_filter(allowed_access: list | None) -> dict | None:
+    """Chroma metadata predicate restricting search to the allowed access levels."""
+    if not allowed_access:
+        return None
+    if len(allowed_access) == 1:
+        return {"access": allowed_access[0]}
+    return {"access": {"$in": list(allowed_access)}}
+
+def domain_filter(domains: list | None) -> dict | None:
+    """Metadata predicate restricting search to the routed regulation-domain shards."""
+    if not domains:
+        return None
+    if len(domains) == 1:
+        return {"domain": domains[0]}
+    return {"domain": {"$in": list(domains)}}
 
-def add_documents(documents: List[dict]):
+def search_filter(allowed_access: list | None, store: VectorStoreHandle, domains: list | None = None) -> dict | None:
+    """Access (and domain) predicate plus exclusion of tombstoned versions awaiting compaction."""
+    clauses = [c for c in (access_filter(allowed_access), domain_filter(domains)) if c]
+    dead = store.tombstones.pairs() if store.tombstones is not None else []
+    # per (id, version) pair: other docs ingested in the same batch share the version string
+    clauses.extend({"$or": [{"id": {"$ne": doc_id}}, {"version": {"$ne": version}}]} for doc_id, version in dead)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def content_hash(doc: dict) -> str:
+    """Hash of everything that changes what gets indexed for a doc."""
+    h = hashlib.sha256()
+    h.update(doc["text"].encode("utf-8"))
+    h.update(b"\0" + doc.get("access", "public").encode("utf-8"))
+    if doc.get("meta"):
+        h.update(b"\0" + json.dumps(doc["meta"], sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+def add_documents(documents: List[dict], store: VectorStoreHandle | None = None) -> List[dict]:
     """
     documents: list of {"id": str, "text": str, "access": "public"|"internal", "meta": {...}}
-    Each added doc will get a version timestamp in metadata.
+    Each doc gets a version timestamp and a regulation-domain tag (domains.py) and is
+    split into overlapping token chunks, stored under stable chunk ids
+    '<id>@<version>#<n>'. Each chunk's reflection
+    embedding is computed once here and stored in the sidecar index, and its deadlines
+    and penalties go into the fact index (facts.py).
+
+    Ingest is idempotent: a doc whose content hash matches the indexed version is
+    skipped without re-embedding; a changed doc replaces its previous version. If a batch
+    repeats an id, only its last entry is ingested. Concurrent ingests of the same doc id
+    are serialized, so the hash check, add and stale delete see a consistent version.
+    Returns one {"id", "status": "new"|"updated"|"skipped", "version", "chunks"} per input doc.
     """
-    vs = get_vectorstore()
-    docs = []
-    for d in documents:
+    store = store or _store
+    with store.doc_locks([d["id"] for d in documents]):
+        return _add_documents_locked(documents, store)
+
+def _add_documents_locked(documents: List[dict], store: VectorStoreHandle) -> List[dict]:
+    docs, ids, stale_ids, results, fact_docs = [], [], [], [], []
+    last = {d["id"]: n for n, d in enumerate(documents)}   # doc id -> its last entry in this batch
+    for n, d in enumerate(documents):
+        if last[d["id"]] != n:
+            results.append({"id": d["id"], "status": "skipped", "version": None, "chunks": 0})
+            continue
+        digest = content_hash(d)
+
+        existing_ids, existing_meta = store.get_chunks({"id": d["id"]})
+        # tombstoned chunks are still on disk until compaction but no longer count as indexed
+        live_meta = [m for m in existing_meta if not store.tombstones.is_dead(d["id"], m.get("version", ""))]
+        if live_meta and live_meta[0].get("content_hash") == digest:
+            results.append({"id": d["id"], "status": "skipped",
+                            "version": live_meta[0].get("version"), "chunks": 0})
+            continue
+
         version = datetime.datetime.utcnow().isoformat()
-        meta = {"id": d["id"], "access": d.get("access", "public"), "version": version}
-        if d.get("meta"):
-            meta.update(d["meta"])
-        docs.append(Document(page_content=d["text"], metadata=meta))
+        domain = classify_document(d)
+        pieces = split_document(d["text"])
+        for i, piece in enumerate(pieces):
+            cid = chunk_id(d["id"], version, i)
+            meta = {"id": d["id"], "access": d.get("access", "public"), "version": version,
+                    "chunk_id": cid, "chunk_index": i, "chunk_count": len(pieces),
+                    "content_hash": digest}
+            if d.get("meta"):
+                meta.update(d["meta"])
+            meta["domain"] = domain
+            docs.append(Document(page_content=piece, metadata=meta))
+            ids.append(cid)
+        stale_ids.extend(existing_ids)
+        fact_docs.append({"id": d["id"], "version": version, "access": d.get("access", "public"),
+                          "domain": domain, "facts": extract_facts(d["text"])})
+        results.append({"id": d["id"], "status": "updated" if live_meta else "new",
+                        "version": version, "chunks": len(pieces), "domain": domain})
+
     if docs:
-        # Chroma may persist automatically; add_documents then persist is safe
-        vs.add_documents(docs)
-        try:
-            vs.persist()
-        except Exception:
-            # some Chroma versions persist automatically; ignore persistence errors
-            pass
-    return True
-
-def query_vectorstore(query: str, k: int = 3, allowed_access: list | None = None):
-    """
-    Returns list of dicts: {id, text, score, metadata}
-    """
-    vs = get_vectorstore()
-    results = vs.similarity_search_with_score(query, k=k)
+        # add the new version before dropping the old one so the doc never disappears
+        store.add(docs, ids=ids)
+        store.reflection.add_texts(
+            [doc_key({"metadata": doc.metadata}) for doc in docs],
+            [doc.page_content for doc in docs],
+        )
+        store.facts.replace(fact_docs)
+        new_ids = set(ids)
+        stale = [i for i in stale_ids if i not in new_ids]
+        if stale:
+            store.delete(stale)
+        store.notify_changed(sorted({doc.metadata["id"] for doc in docs}))
+    return results
+
+def _chunk_dicts(results, allowed_access: list | None, store: VectorStoreHandle) -> List[Dict]:
     out = []
     for doc, score in results:
         meta = dict(doc.metadata or {})
         access = meta.get("access", "public")
         if allowed_access and access not in allowed_access:
+            # defensive: the predicate above should already exclude these
+            continue
+        if store.tombstones.is_dead(meta.get("id", ""), meta.get("version", "")):
             continue
         out.append({
             "id": meta.get("id", "unknown"),
+            "chunk_id": meta.get("chunk_id"),
             "text": doc.page_content,
             "score": float(score),
             "metadata": meta
         })
     return out
+
+def query_vectorstore(query: str, k: int = 3, allowed_access: list | None = None,
+                      store: VectorStoreHandle | None = None, domains: list | None = None):
+    """
+    Returns list of chunk dicts: {id (parent doc id), chunk_id, text, score, metadata}
+    Access filtering runs inside the search, so up to k permitted hits come back.
+    """
+    store = store or _store
+    store.open()
+    start = time.perf_counter()
+    results = store.similarity_search(query, k=k, filter=search_filter(allowed_access, store, domains))
+    RETRIEVER_SECONDS.observe(time.perf_counter() - start, retriever="vector")
+    return _chunk_dicts(results, allowed_access, store)
+
+def query_vectorstore_batch(queries: List[str], k: int = 3, allowed_access: list | None = None,
+                            store: VectorStoreHandle | None = None, domains: list | None = None) -> List[List[Dict]]:
+    """query_vectorstore() for many queries: one batched embedding call and one multi-vector search."""
+    store = store or _store
+    store.open()
+    if not queries:
+        return []
+    start = time.perf_counter()
+    vectors = store.embeddings.embed_documents(list(queries))
+    results = store.similarity_search_by_vectors(vectors, k=k, filter=search_filter(allowed_access, store, domains))
+    RETRIEVER_SECONDS.observe(time.perf_counter() - start, retriever="vector_batch")
+    return [_chunk_dicts(r, allowed_access, store) for r in results]
+
+def keyword_search(query: str, k: int = 3, allowed_access: list | None = None,
+                   store: VectorStoreHandle | None = None, domains: list | None = None) -> List[Dict]:
+    """BM25 counterpart of query_vectorstore(): same chunk dict shape plus a 'bm25' score."""
+    store = store or _store
+    start = time.perf_counter()
+    hits = store.keyword_search(query, k=k, allowed_access=allowed_access, domains=domains)
+    RETRIEVER_SECONDS.observe(time.perf_counter() - start, retriever="bm25")
+    return [{"id": h["id"], "chunk_id": h["chunk_id"], "text": h["text"], "bm25": h["bm25"],
+             "metadata": h["metadata"]} for h in hits]
+
+def rank_fuse(ranked_lists: List[List[Dict]], k: int, rrf_k: int = RRF_K) -> List[Dict]:
+    """
+    Reciprocal rank fusion: each chunk scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    'score' becomes 1 - rrf / best_rrf so lower still means better, as with vector distances;
+    the vector distance, if any, is kept as 'vector_score'.
+    """
+    fused: Dict[str, Dict] = {}
+    for docs in ranked_lists:
+        for rank, d in enumerate(docs):
+            key = d.get("chunk_id") or d["id"]
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {k_: v for k_, v in d.items() if k_ != "score"}
+                entry["rrf"] = 0.0
+            if "score" in d:
+                entry["vector_score"] = d["score"]
+            entry["rrf"] += 1.0 / (rrf_k + rank + 1)
+    ranked = sorted(fused.values(), key=lambda d: d["rrf"], reverse=True)[:k]
+    best = ranked[0]["rrf"] if ranked else 1.0
+    for d in ranked:
+        d["score"] = round(1.0 - d["rrf"] / best, 6)
+        d["rrf"] = round(d["rrf"], 6)
+    return ranked
+
+def _exact_hit(query: str, keyword: List[Dict], k: int) -> bool:
+    """True when the query names provisions and every top BM25 hit contains one of them."""
+    named = set(identifiers(query))
+    return bool(named) and bool(keyword) and all(named & set(identifiers(d["text"])) for d in keyword[:k])
+
+def hybrid_search(query: str, k: int = 3, allowed_access: list | None = None,
+                  store: VectorStoreHandle | None = None, mode: str | None = None,
+                  domains: list | None = None) -> List[Dict]:
+    """
+    Retrieve k chunks by RETRIEVAL_MODE, from the given domain shards only if `domains`
+    is set. In hybrid mode, BM25 runs first; when the query names provisions ("Form 8")
+    and every top BM25 hit contains one of them, the vector search (and its embedding
+    call) is skipped.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode == "vector":
+        RETRIEVALS.inc(mode="vector")
+        return sorted(query_vectorstore(query, k=k, allowed_access=allowed_access, store=store, domains=domains),
+                      key=lambda d: d["score"])[:k]
+
+    fetch = k * HYBRID_FETCH if mode == "hybrid" else k
+    keyword = keyword_search(query, k=fetch, allowed_access=allowed_access, store=store, domains=domains)
+    exact = _exact_hit(query, keyword, k)
+    if mode == "bm25" or exact:
+        RETRIEVALS.inc(mode="exact" if exact and mode != "bm25" else "bm25")
+        return rank_fuse([keyword], k)
+
+    RETRIEVALS.inc(mode="hybrid")
+    dense = sorted(query_vectorstore(query, k=fetch, allowed_access=allowed_access, store=store, domains=domains),
+                   key=lambda d: d["score"])
+    return rank_fuse([dense, keyword], k)
+
+def hybrid_search_batch(queries: List[str], ks: List[int], allowed_access: list | None = None,
+                        store: VectorStoreHandle | None = None, mode: str | None = None,
+                        domains: list | None = None) -> List[List[Dict]]:
+    """
+    hybrid_search() for many queries sharing one access scope (and domain route). BM25 runs
+    per query; the queries that still need dense results share one embedding call and one
+    vector search.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode == "vector":
+        dense = query_vectorstore_batch(queries, k=max(ks, default=0), allowed_access=allowed_access, store=store,
+                                        domains=domains)
+        RETRIEVALS.inc(len(queries), mode="vector")
+        return [sorted(d, key=lambda d_: d_["score"])[:k] for d, k in zip(dense, ks)]
+
+    out: List[List[Dict] | None] = [None] * len(queries)
+    keywords: Dict[int, List[Dict]] = {}
+    for i, (query, k) in enumerate(zip(queries, ks)):
+        fetch = k * HYBRID_FETCH if mode == "hybrid" else k
+        keyword = keyword_search(query, k=fetch, allowed_access=allowed_access, store=store, domains=domains)
+        exact = _exact_hit(query, keyword, k)
+        if mode == "bm25" or exact:
+            RETRIEVALS.inc(mode="exact" if exact and mode != "bm25" else "bm25")
+            out[i] = rank_fuse([keyword], k)
+        else:
+            keywords[i] = keyword
+
+    if keywords:
+        pending = list(keywords)
+        fetch = max(ks[i] for i in pending) * HYBRID_FETCH
+        dense = query_vectorstore_batch([queries[i] for i in pending], k=fetch,
+                                        allowed_access=allowed_access, store=store, domains=domains)
+        RETRIEVALS.inc(len(pending), mode="hybrid")
+        for i, d in zip(pending, dense):
+            d = sorted(d, key=lambda d_: d_["score"])[:ks[i] * HYBRID_FETCH]
+            out[i] = rank_fuse([d, keywords[i]], ks[i])
+    return out
@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import text
+from sqlmodel import Session, select, func
+
+from backend.models import QueryLog, QueryRollup, ROLLUP_LATENCY_BUCKETS
+
+FEEDBACK_COLUMNS = {"useful": "fb_useful", "partial": "fb_partial", "wrong": "fb_wrong"}
+
+
+def minute_of(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+def _bucket_column(latency: float) -> str:
+    return f"lat_b{bisect_left(ROLLUP_LATENCY_BUCKETS, latency)}"
+
+def _deltas(acc: dict, ts: datetime, role: str) -> dict:
+    return acc.setdefault((minute_of(ts), role), defaultdict(int))
+
+def _upsert(session: Session, acc: dict):
+    """
+    Add per-(minute, role) column deltas atomically: one INSERT ... ON CONFLICT DO UPDATE
+    per key, so concurrent writers (several API workers) never lose increments or collide
+    on a new minute. Feedback counts never drop below zero.
+    """
+    table = QueryRollup.__table__
+    dialect = session.get_bind().dialect.name
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    floor = func.max if dialect == "sqlite" else func.greatest
+    counters = [c.name for c in table.columns if c.name not in ("minute", "role")]
+    for (minute, role), deltas in acc.items():
+        deltas = {col: val for col, val in deltas.items() if val}
+        if not deltas:
+            continue
+        values = {col: 0 for col in counters}
+        values.update({col: max(val, 0) if col in FEEDBACK_COLUMNS.values() else val for col, val in deltas.items()})
+        stmt = insert(table).values(minute=minute, role=role, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["minute", "role"],
+            set_={col: floor(table.c[col] + val, 0) if col in FEEDBACK_COLUMNS.values()
+                  else table.c[col] + stmt.excluded[col] for col, val in deltas.items()},
+        )
+        session.execute(stmt)
+
+# --- Incremental maintenance (called inside the audit writer's transaction) ---
+def apply_inserts(session: Session, rows: Iterable[QueryLog]):
+    acc: dict = {}
+    for row in rows:
+        d = _deltas(acc, row.timestamp, row.role)
+        d["queries"] += 1
+        if row.latency_s is not None:
+            d["latency_sum"] += row.latency_s
+            d["latency_n"] += 1
+            d[_bucket_column(row.latency_s)] += 1
+        if row.relevance_score is not None:
+            d["relevance_sum"] += row.relevance_score
+            d["relevance_n"] += 1
+        if row.feedback in FEEDBACK_COLUMNS:
+            d[FEEDBACK_COLUMNS[row.feedback]] += 1
+    _upsert(session, acc)
+
+def apply_feedback_change(session: Session, row: QueryLog, old: str | None, new: str | None):
+    if old == new:
+        return
+    acc: dict = {}
+    d = _deltas(acc, row.timestamp, row.role)
+    if old in FEEDBACK_COLUMNS:
+        d[FEEDBACK_COLUMNS[old]] -= 1
+    if new in FEEDBACK_COLUMNS:
+        d[FEEDBACK_COLUMNS[new]] += 1
+    _upsert(session, acc)
+
+# --- One-off backfill for logs written before rollups existed ---
+def rebuild_if_empty(engine, batch: int = 5000) -> int:
+    """
+    Backfill rollups from the raw log when the rollup table is empty. The emptiness check
+    and the backfill share one write-locked transaction, so of several workers starting
+    together exactly one backfills; the others wait, then see the rows and return 0.
+    """
+    with Session(engine) as session:
+        if engine.dialect.name == "sqlite":
+            session.execute(text("BEGIN IMMEDIATE"))
+        else:
+            session.execute(text(f"LOCK TABLE {QueryRollup.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+        if session.exec(select(func.count()).select_from(QueryRollup)).one():
+            return 0
+        total, last_ts, last_id = 0, None, ""
+        while True:
+            stmt = select(QueryLog).order_by(QueryLog.timestamp, QueryLog.id).limit(batch)
+            if last_ts is not None:
+                stmt = stmt.where((QueryLog.timestamp > last_ts) |
+                                  ((QueryLog.timestamp == last_ts) & (QueryLog.id > last_id)))
+            rows = session.exec(stmt).all()
+            if not rows:
+                break
+            apply_inserts(session, rows)
+            total += len(rows)
+            last_ts, last_id = rows[-1].timestamp, rows[-1].id
+            session.flush()
+            session.expunge_all()
+        session.commit()
+        return total
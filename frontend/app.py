@@ -1,11 +1,9 @@
 import streamlit as st
 import requests
 import json
+import time
 import base64
 from datetime import datetime
-from io import BytesIO
-from PyPDF2 import PdfReader
-import docx
 
 API_URL = "http://127.0.0.1:8000"
 
@@ -49,6 +47,20 @@ def login(username, password):
         st.error(f"Login failed: {e}")
         return False
 
+# --- Server-sent events reader for /query/stream ---
+def iter_sse(response):
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif line == "" and event:
+            yield event, json.loads("\n".join(data) or "{}")
+            event, data = None, []
+
 # --- Sidebar Login ---
 st.sidebar.header("🔐 Authentication")
 if not st.session_state.token:
@@ -93,13 +105,30 @@ with tab1:
         if not q.strip():
             st.warning("Enter a question.")
         else:
-            r = requests.post(f"{API_URL}/query", headers=headers, json={"question": q})
+            r = requests.post(f"{API_URL}/query/stream", headers=headers, json={"question": q}, stream=True)
             if r.status_code == 200:
-                res = r.json()
+                res = {"answer": "", "docs": []}
                 st.markdown("### 🧠 Answer")
-                st.write(res.get("answer", ""))
+                answer_box = st.empty()
+                for event, data in iter_sse(r):
+                    if event == "docs":
+                        res["docs"] = data.get("docs", [])
+                    elif event == "token":
+                        res["answer"] += data.get("text", "")
+                        answer_box.markdown(res["answer"] + "▌")
+                    elif event == "done":
+                        res.update(data)
+                    elif event == "error":
+                        res.update(data)
+                answer_box.markdown(res["answer"])
+                if res.get("error"):
+                    st.error(f"Query failed: {res['error']}")
                 st.markdown(f"**Relevance:** {res.get('relevance', 0):.2f}")
+                if (res.get("gate") or {}).get("decision") == "blocked":
+                    st.caption("Retrieved context was below the relevance threshold; the LLM was not called.")
                 st.markdown(f"**Query ID:** `{res.get('query_id', 'N/A')}`")
+                if res.get("ttft_s") is not None:
+                    st.caption(f"First token after {res['ttft_s']:.2f}s · total {res.get('latency_s', 0):.2f}s")
 
                 st.session_state.chat_history.append({
                     "question": q,
@@ -145,26 +174,36 @@ if st.session_state.role == "admin":
         access = st.selectbox("Access Level", ["public", "internal"])
 
         if uploaded_files and st.button("Add Documents"):
-            all_docs = []
-            for file in uploaded_files:
-                ext = file.name.split(".")[-1].lower()
-                text = ""
-                try:
-                    if ext == "txt":
-                        text = file.read().decode("utf-8")
-                    elif ext == "pdf":
-                        reader = PdfReader(BytesIO(file.read()))
-                        text = "\n".join([p.extract_text() for p in reader.pages if p.extract_text()])
-                    elif ext == "docx":
-                        doc = docx.Document(BytesIO(file.read()))
-                        text = "\n".join([p.text for p in doc.paragraphs])
-                    all_docs.append({"id": file.name, "text": text, "access": access})
-                except Exception as e:
-                    st.error(f"Error reading {file.name}: {e}")
-
-            if all_docs:
-                r = requests.post(f"{API_URL}/admin/add_doc", headers=headers, json=all_docs)
-                if r.status_code == 200:
-                    st.success(f"Uploaded and indexed {len(all_docs)} document(s).")
+            # Files are streamed to the backend, which parses, embeds and indexes them in a background job
+            multipart = [("files", (f.name, f, f.type)) for f in uploaded_files]
+            auth_only = {"Authorization": headers["Authorization"]}
+            r = requests.post(f"{API_URL}/admin/jobs", headers=auth_only, files=multipart, data={"access": access})
+            if r.status_code == 200:
+                st.session_state.ingest_job = r.json()["id"]
+            else:
+                st.error(f"Upload failed: {r.status_code} — {r.text}")
+
+        job_id = st.session_state.get("ingest_job")
+        if job_id:
+            r = requests.get(f"{API_URL}/admin/jobs/{job_id}", headers=headers)
+            if r.status_code == 200:
+                job = r.json()
+                st.progress(job["progress"], text=f"Ingest job `{job_id[:8]}` — {job['status']}")
+                st.caption(
+                    f"{job['docs_indexed']}/{job['files_total']} docs · {job['chunks_indexed']} chunks · "
+                    f"{job['docs_per_s']} docs/s · {job['chunks_per_s']} chunks/s"
+                )
+                for err in job["errors"]:
+                    st.error(f"{err['file']}: {err['error']}")
+                if job["status"] in ("done", "failed"):
+                    o = job["outcomes"]
+                    summary = (f"{o.get('new', 0)} new, {o.get('updated', 0)} updated, "
+                               f"{o.get('skipped', 0)} unchanged.")
+                    if job["status"] == "failed":
+                        st.error(f"Ingest job failed after {job['files_parsed']}/{job['files_total']} file(s): {summary}")
+                    else:
+                        st.success(f"Processed {job['files_total']} file(s): {summary}")
+                    st.session_state.ingest_job = None
                 else:
-                    st.error(f"Upload failed: {r.status_code} — {r.text}")
+                    time.sleep(1)
+                    st.rerun()
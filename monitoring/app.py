@@ -4,57 +4,142 @@ import sqlite3
 import time
 import plotly.express as px
 import os
+import sys
+from datetime import datetime, time as dtime
+from sqlalchemy import create_engine
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "../regiguard.db")
 DB_PATH = os.path.abspath(DB_PATH)
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+from backend.archive import query_audit, ARCHIVE_DIR  # noqa: E402
+
+# Mirrors backend.models.ROLLUP_LATENCY_BUCKETS (lat_b0..lat_b8; lat_b9 is the overflow)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+RECENT_ROWS = 500          # raw rows kept in memory for the log table
+TREND_DAYS = int(os.getenv("MONITOR_TREND_DAYS", "7"))
 
 
 st.set_page_config(page_title="RegiGuard Monitor", layout="wide")
 st.title("🛡️ RegiGuard Monitoring Dashboard")
 
+def connect():
+    # read-only; WAL mode lets this run alongside the backend's audit writer
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+
+# ---- Aggregates come from the queryrollup summary table, never the raw log ----
 @st.cache_data(ttl=30)
-def load_data():
+def load_summary():
+    try:
+        conn = connect()
+        bucket_sums = ", ".join(f"SUM(lat_b{i}) AS lat_b{i}" for i in range(len(LATENCY_BUCKETS) + 1))
+        totals = pd.read_sql_query(
+            f"""SELECT SUM(queries) AS queries,
+                       SUM(latency_sum) AS latency_sum, SUM(latency_n) AS latency_n,
+                       SUM(relevance_sum) AS relevance_sum, SUM(relevance_n) AS relevance_n,
+                       SUM(fb_useful) AS useful, SUM(fb_partial) AS partial, SUM(fb_wrong) AS wrong,
+                       {bucket_sums}
+                FROM queryrollup""", conn)
+        by_role = pd.read_sql_query(
+            "SELECT role AS Role, SUM(queries) AS Count FROM queryrollup GROUP BY role ORDER BY Count DESC", conn)
+        trend = pd.read_sql_query(
+            """SELECT strftime('%Y-%m-%d %H:00', minute) AS hour,
+                      SUM(queries) AS queries,
+                      SUM(relevance_sum) / NULLIF(SUM(relevance_n), 0) AS relevance_score,
+                      SUM(latency_sum) / NULLIF(SUM(latency_n), 0) AS latency_s
+               FROM queryrollup
+               WHERE minute >= datetime('now', ?)
+               GROUP BY hour ORDER BY hour""", conn, params=(f"-{TREND_DAYS} days",))
+        conn.close()
+        trend["hour"] = pd.to_datetime(trend["hour"])
+        return totals.iloc[0].fillna(0), by_role, trend
+    except Exception as e:
+        st.error(f"Failed to load DB: {e}")
+        return None, pd.DataFrame(), pd.DataFrame()
+
+def latency_percentile(totals, p: float) -> float:
+    """Upper bound of the histogram bucket containing the p-th percentile."""
+    counts = [int(totals[f"lat_b{i}"]) for i in range(len(LATENCY_BUCKETS) + 1)]
+    n = sum(counts)
+    if not n:
+        return 0.0
+    target, running = p / 100 * n, 0
+    for bound, c in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+        running += c
+        if running >= target:
+            return bound
+    return float("inf")
+
+# ---- Recent raw rows: only rows past the last rowid watermark are fetched ----
+# rowid follows commit order (SQLite serialises writers), unlike timestamp, which is set
+# before a row is queued and can commit late. The trailing overlap re-reads the newest
+# rows so feedback given after they were first shown is picked up.
+FEEDBACK_OVERLAP_ROWS = 100
+
+def load_recent():
+    recent = st.session_state.get("recent_logs")
+    watermark = st.session_state.get("log_watermark")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM querylog ORDER BY timestamp DESC", conn)
+        conn = connect()
+        if watermark is None:
+            new = pd.read_sql_query(
+                "SELECT rowid AS seq, * FROM querylog ORDER BY rowid DESC LIMIT ?", conn, params=(RECENT_ROWS,))
+        else:
+            new = pd.read_sql_query(
+                "SELECT rowid AS seq, * FROM querylog WHERE rowid > ? ORDER BY rowid DESC LIMIT ?",
+                conn, params=(watermark - FEEDBACK_OVERLAP_ROWS, RECENT_ROWS))
         conn.close()
-        if "timestamp" in df.columns:
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
-        return df
     except Exception as e:
         st.error(f"Failed to load DB: {e}")
-        return pd.DataFrame()
+        return recent if recent is not None else pd.DataFrame()
 
-df = load_data()
+    if not new.empty:
+        st.session_state.log_watermark = max(int(new["seq"].max()), watermark or 0)
+        new["timestamp"] = pd.to_datetime(new["timestamp"])
+        if recent is not None:
+            # re-fetched rows replace their stale copies
+            new = pd.concat([new, recent], ignore_index=True).drop_duplicates("id", keep="first")
+        recent = new.sort_values("seq", ascending=False).head(RECENT_ROWS).reset_index(drop=True)
+    st.session_state.recent_logs = recent
+    return recent if recent is not None else pd.DataFrame()
 
-if df.empty:
+totals, role_chart, trend = load_summary()
+
+if totals is None or not totals["queries"]:
     st.warning("No query logs yet. Generate some traffic first.")
     st.stop()
 
 # ---- METRICS ----
-total_queries = len(df)
-avg_relevance = round(df["relevance_score"].mean(), 3)
-avg_latency = round(df["latency_s"].mean(), 3)
-feedback_counts = df["feedback"].value_counts().to_dict()
+total_queries = int(totals["queries"])
+avg_relevance = round(totals["relevance_sum"] / totals["relevance_n"], 3) if totals["relevance_n"] else 0.0
+avg_latency = round(totals["latency_sum"] / totals["latency_n"], 3) if totals["latency_n"] else 0.0
 
 c1, c2, c3 = st.columns(3)
 c1.metric("Total Queries", total_queries)
 c2.metric("Avg Relevance", avg_relevance)
 c3.metric("Avg Latency (s)", avg_latency)
 
+p1, p2, p3 = st.columns(3)
+p1.metric("Latency p50 (≤ s)", latency_percentile(totals, 50))
+p2.metric("Latency p95 (≤ s)", latency_percentile(totals, 95))
+p3.metric("Latency p99 (≤ s)", latency_percentile(totals, 99))
+
 # ---- CHARTS ----
 st.subheader("Query Volume by Role")
-role_chart = df["role"].value_counts().reset_index()
-role_chart.columns = ["Role", "Count"]
 st.plotly_chart(px.bar(role_chart, x="Role", y="Count", color="Role", title="Queries by Role"))
 
-st.subheader("Relevance Score Over Time")
-fig = px.line(df.sort_values("timestamp"), x="timestamp", y="relevance_score", markers=True)
-st.plotly_chart(fig)
+st.subheader(f"Relevance Score Over Time (hourly, last {TREND_DAYS} days)")
+if not trend.empty:
+    fig = px.line(trend, x="hour", y="relevance_score", markers=True)
+    st.plotly_chart(fig)
 
 st.subheader("Feedback Distribution")
-fb = df["feedback"].value_counts().reset_index()
-fb.columns = ["Feedback", "Count"]
+fb = pd.DataFrame({
+    "Feedback": ["useful", "partial", "wrong"],
+    "Count": [int(totals["useful"]), int(totals["partial"]), int(totals["wrong"])],
+})
+fb = fb[fb["Count"] > 0]
 if not fb.empty:
     st.plotly_chart(px.pie(fb, names="Feedback", values="Count", title="Feedback Summary"))
 else:
@@ -63,10 +148,31 @@ else:
 
 # ---- Recent Logs ----
 st.subheader("Recent Query Logs")
-st.dataframe(
-    df[["timestamp", "username", "role", "question", "relevance_score", "latency_s", "feedback"]].head(30),
-    use_container_width=True
-)
+df = load_recent()
+if not df.empty:
+    st.dataframe(
+        df[["timestamp", "username", "role", "question", "relevance_score", "latency_s", "feedback"]].head(30),
+        use_container_width=True
+    )
+
+# ---- Audit Search (live SQLite + archived Parquet) ----
+with st.expander("🔎 Audit Search (includes archived logs)"):
+    a1, a2, a3, a4 = st.columns(4)
+    start_d = a1.date_input("From", value=None)
+    end_d = a2.date_input("To", value=None)
+    role_f = a3.text_input("Role")
+    user_f = a4.text_input("Username")
+    if st.button("Search audit log"):
+        rows = query_audit(
+            start=datetime.combine(start_d, dtime.min) if start_d else None,
+            end=datetime.combine(end_d, dtime.max) if end_d else None,
+            role=role_f or None, username=user_f or None, limit=1000,
+            archive_dir=os.path.join(ROOT, ARCHIVE_DIR) if not os.path.isabs(ARCHIVE_DIR) else ARCHIVE_DIR,
+            engine=create_engine(f"sqlite:///{DB_PATH}"),
+        )
+        st.caption(f"{len(rows)} row(s)")
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
 
 st.caption("🔄 Auto-refresh every 30 seconds (live mode)")
 # Streamlit 1.50+ uses st.rerun(), older versions used experimental_rerun
@@ -0,0 +1,17 @@
+"""
+Move QueryLog rows older than N days to day-partitioned zstd Parquet.
+Safe to run from cron while the backend is up (SQLite is in WAL mode).
+
+    python -m scripts.archive_querylog --days 90
+"""
+import argparse
+from backend.archive import archive_querylog, ARCHIVE_DIR, ARCHIVE_RETENTION_DAYS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=ARCHIVE_RETENTION_DAYS)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+    report = archive_querylog(days=args.days, archive_dir=args.archive_dir)
+    print(f"Archived {report['rows_archived']} rows older than {report['cutoff']} "
+          f"into {report['files_written']} file(s) under {report['archive_dir']}")
@@ -0,0 +1,90 @@
+"""
+Benchmark: analyst (public-only) retrieval as the internal/public ratio grows.
+
+Compares the old post-filter path (fetch k*2, drop internal docs) with the
+access predicate pushed into the Chroma search. Runs fully offline.
+
+    python -m scripts.bench_access_filter --public 200 --ratios 1 4 16 64
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.rag.vectorstore import VectorStoreHandle, access_filter
+from scripts.bench_utils import HashingEmbeddings, synthetic_docs, latency_summary, write_results
+
+
+def build_store(tmpdir: str, docs: list[dict], embeddings) -> VectorStoreHandle:
+    store = VectorStoreHandle(persist_directory=tmpdir, embeddings=embeddings)
+    batch = 500
+    for i in range(0, len(docs), batch):
+        store.add([
+            Document(page_content=d["text"], metadata={"id": d["id"], "access": d["access"]})
+            for d in docs[i:i + batch]
+        ])
+    return store
+
+def exact_topk(query_vec: np.ndarray, public_ids: list[str], public_mat: np.ndarray, k: int) -> set:
+    sims = public_mat @ query_vec
+    return {public_ids[i] for i in np.argsort(-sims)[:k]}
+
+def run_ratio(n_public: int, ratio: int, k: int, n_queries: int) -> dict:
+    embeddings = HashingEmbeddings()
+    public = synthetic_docs(n_public, "public", "pub")
+    internal = synthetic_docs(n_public * ratio, "internal", "int")
+    queries = [d["text"][:200] for d in synthetic_docs(n_queries, "public", "q", seed=1)]
+
+    public_ids = [d["id"] for d in public]
+    public_mat = np.array(embeddings.embed_documents([d["text"] for d in public]), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = build_store(tmpdir, public + internal, embeddings)
+        where = access_filter(["public"])
+        modes = {"post_filter": ([], []), "pushdown": ([], [])}
+        for q in queries:
+            truth = exact_topk(np.array(embeddings.embed_query(q), dtype=np.float32), public_ids, public_mat, k)
+
+            t0 = time.perf_counter()
+            hits = store.similarity_search(q, k=k * 2)
+            got = [d.metadata["id"] for d, _ in hits if d.metadata.get("access") == "public"][:k]
+            modes["post_filter"][0].append(time.perf_counter() - t0)
+            modes["post_filter"][1].append(len(truth.intersection(got)) / k)
+
+            t0 = time.perf_counter()
+            hits = store.similarity_search(q, k=k, filter=where)
+            got = [d.metadata["id"] for d, _ in hits]
+            modes["pushdown"][0].append(time.perf_counter() - t0)
+            modes["pushdown"][1].append(len(truth.intersection(got)) / k)
+
+    return {
+        "ratio": ratio,
+        "public": n_public,
+        "internal": n_public * ratio,
+        **{
+            mode: {"recall_at_k": round(float(np.mean(recalls)), 3), **latency_summary(lat)}
+            for mode, (lat, recalls) in modes.items()
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--public", type=int, default=200)
+    parser.add_argument("--ratios", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--out", default=None, help="optional JSON results path")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'int:pub':>8} | {'post-filter recall':>18} {'p50 ms':>8} | {'pushdown recall':>15} {'p50 ms':>8}")
+    for ratio in args.ratios:
+        row = run_ratio(args.public, ratio, args.k, args.queries)
+        rows.append(row)
+        pf, pd_ = row["post_filter"], row["pushdown"]
+        print(f"{ratio:>6}:1 | {pf['recall_at_k']:>18.3f} {pf['p50_ms']:>8.2f} | {pd_['recall_at_k']:>15.3f} {pd_['p50_ms']:>8.2f}")
+    write_results(args.out, {"benchmark": "access_filter", "k": args.k, "rows": rows})
+
+if __name__ == "__main__":
+    main()
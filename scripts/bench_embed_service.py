@@ -0,0 +1,124 @@
+"""
+Benchmark: per-worker embedding models vs the shared micro-batching embedding service.
+
+Simulates N API workers (processes), each with T request threads encoding
+single questions. "inproc" loads the model in every worker, as RegiPipeline
+does by default; "service" starts `backend.rag.embed_service` once and the
+workers go through EmbedServiceClient. Reports throughput, per-request latency,
+resident memory per worker (plus the service) and the service's micro-batch
+size distribution.
+
+    python -m scripts.bench_embed_service --workers 4 --threads 8 --requests 50 --backend huggingface
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import get_context
+
+from backend.metrics import process_rss_bytes
+from scripts.bench_utils import sample_sentences, latency_summary, write_results
+
+
+def worker(mode: str, backend: str, socket_path: str, threads: int, requests: int, start_at: float, out):
+    if mode == "service":
+        from backend.rag.embed_service import EmbedServiceClient
+        encoder = EmbedServiceClient(socket_path=socket_path)
+    else:
+        from backend.rag.embeddings import get_embeddings, as_encoder
+        encoder = as_encoder(get_embeddings(backend=backend))
+    sentences = sample_sentences()
+    encoder.encode(sentences[:1])   # warm-up (and model load for inproc)
+    latencies, lock = [], threading.Lock()
+
+    def run(tid: int):
+        mine = []
+        for i in range(requests):
+            t0 = time.perf_counter()
+            encoder.encode([sentences[(tid * requests + i) % len(sentences)]])
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(mine)
+
+    time.sleep(max(0.0, start_at - time.time()))   # all workers start together
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put({"elapsed_s": time.perf_counter() - t0, "latencies": latencies, "rss_bytes": process_rss_bytes()})
+
+def run_mode(mode: str, args, socket_path: str) -> dict:
+    ctx = get_context("spawn")
+    out = ctx.Queue()
+    # generous head start so every worker has loaded its model before the clock starts
+    start_at = time.time() + args.startup_s
+    procs = [ctx.Process(target=worker, args=(mode, args.backend, socket_path, args.threads, args.requests,
+                                              start_at, out)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    total = args.workers * args.threads * args.requests
+    return {
+        "mode": mode,
+        "requests": total,
+        "req_per_s": round(total / max(r["elapsed_s"] for r in results), 1),
+        "worker_rss_mib": round(sum(r["rss_bytes"] for r in results) / len(results) / 2**20, 1),
+        **latency_summary([x for r in results for x in r["latencies"]]),
+    }
+
+def wait_for_socket(path: str, proc: subprocess.Popen, timeout: float = 300.0):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if proc.poll() is not None or time.time() > deadline:
+            raise RuntimeError("embedding service did not start")
+        time.sleep(0.2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent requests per worker")
+    parser.add_argument("--requests", type=int, default=50, help="encodes per thread")
+    parser.add_argument("--backend", default="huggingface")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--startup-s", type=float, default=30.0, help="delay for workers to load before timing")
+    parser.add_argument("--out", default=None, help="optional JSON results path")
+    args = parser.parse_args()
+
+    rows = [run_mode("inproc", args, "")]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "embed.sock")
+        service = subprocess.Popen([sys.executable, "-m", "backend.rag.embed_service", "--socket", socket_path,
+                                    "--backend", args.backend, "--max-batch", str(args.max_batch),
+                                    "--max-wait-ms", str(args.max_wait_ms), "--preload"])
+        try:
+            wait_for_socket(socket_path, service)
+            rows.append(run_mode("service", args, socket_path))
+            from backend.rag.embed_service import EmbedServiceClient
+            stats = EmbedServiceClient(socket_path=socket_path).stats()
+        finally:
+            service.terminate()
+            service.wait()
+    rows[-1]["service_rss_mib"] = round(stats["rss_bytes"] / 2**20, 1)
+
+    print(f"{'mode':>8} | {'req/s':>8} | {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} | {'worker MiB':>10} {'total MiB':>10}")
+    for r in rows:
+        total_mib = r["worker_rss_mib"] * args.workers + r.get("service_rss_mib", 0.0)
+        print(f"{r['mode']:>8} | {r['req_per_s']:>8.1f} | {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} | "
+              f"{r['worker_rss_mib']:>10.1f} {total_mib:>10.1f}")
+    print(f"service: {stats['batches']} batches, {stats['requests_per_batch']} requests/batch, "
+          f"batch size p50 {stats['batch_size']['p50']} / p95 {stats['batch_size']['p95']}, "
+          f"encode p95 {stats['encode_seconds']['p95']}s")
+    print("batch size histogram:", ", ".join(f"<={k}: {v}" for k, v in stats["batch_size"]["buckets"].items() if v))
+    write_results(args.out, {"benchmark": "embed_service", "workers": args.workers, "threads": args.threads,
+                             "backend": args.backend, "rows": rows, "service": stats})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: torch sentence-transformers vs onnxruntime (fp32 and int8) embeddings on CPU.
+
+Encodes the same synthetic corpus with each backend and reports throughput,
+single-query latency and accuracy against the torch reference: per-text cosine
+agreement and top-k neighbour overlap for retrieval queries.
+
+    python -m scripts.bench_embeddings --docs 2000 --batch-size 64 --threads 4
+"""
+import argparse
+import time
+import numpy as np
+
+from backend.rag.embeddings import OnnxEmbeddings, LOCAL_MODEL
+from scripts.bench_utils import synthetic_docs, latency_summary, write_results
+
+
+def load_torch(model: str, threads: int):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model, device="cpu")
+
+def encode(encoder, texts: list[str], batch_size: int) -> np.ndarray:
+    embs = encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+    return np.asarray(embs, dtype=np.float32)
+
+def topk(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+def run_backend(name: str, encoder, docs: list[str], queries: list[str], batch_size: int) -> dict:
+    encode(encoder, docs[:batch_size], batch_size)   # warm-up
+    t0 = time.perf_counter()
+    doc_embs = encode(encoder, docs, batch_size)
+    elapsed = time.perf_counter() - t0
+    single = []
+    for q in queries:
+        t = time.perf_counter()
+        encode(encoder, [q], 1)
+        single.append(time.perf_counter() - t)
+    return {
+        "backend": name,
+        "docs_per_s": round(len(docs) / elapsed, 1),
+        "encode_s": round(elapsed, 3),
+        "query": latency_summary(single),
+        "_doc_embs": doc_embs,
+        "_query_embs": encode(encoder, queries, batch_size),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=LOCAL_MODEL)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = runtime default)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--out", default=None, help="optional JSON results path")
+    args = parser.parse_args()
+
+    docs = [d["text"] for d in synthetic_docs(args.docs, "public", "doc")]
+    queries = [d["text"][:200] for d in synthetic_docs(args.queries, "public", "q", seed=1)]
+
+    backends = {
+        "torch": lambda: load_torch(args.model, args.threads),
+        "onnx_fp32": lambda: OnnxEmbeddings(args.model, quantize=False, threads=args.threads),
+        "onnx_int8": lambda: OnnxEmbeddings(args.model, quantize=True, threads=args.threads),
+    }
+    rows = []
+    for name, load in backends.items():
+        t0 = time.perf_counter()
+        encoder = load()
+        row = run_backend(name, encoder, docs, queries, args.batch_size)
+        row["load_s"] = round(time.perf_counter() - t0 - row["encode_s"], 3)
+        rows.append(row)
+
+    ref = rows[0]
+    ref_topk = topk(ref["_query_embs"], ref["_doc_embs"], args.k)
+    print(f"{'backend':>10} | {'docs/s':>8} {'speedup':>7} | {'query p50 ms':>12} | {'cos mean':>8} {'cos min':>8} | {'top-k overlap':>13}")
+    for row in rows:
+        cos = np.sum(row["_doc_embs"] * ref["_doc_embs"], axis=1)
+        got = topk(row["_query_embs"], row["_doc_embs"], args.k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(got, ref_topk)])
+        row.update({
+            "speedup": round(row["docs_per_s"] / ref["docs_per_s"], 2),
+            "cosine_mean": round(float(cos.mean()), 5),
+            "cosine_min": round(float(cos.min()), 5),
+            "topk_overlap": round(float(overlap), 4),
+        })
+        print(f"{row['backend']:>10} | {row['docs_per_s']:>8.1f} {row['speedup']:>6.2f}x | {row['query']['p50_ms']:>12.2f} | "
+              f"{row['cosine_mean']:>8.4f} {row['cosine_min']:>8.4f} | {row['topk_overlap']:>13.3f}")
+
+    for row in rows:
+        del row["_doc_embs"], row["_query_embs"]
+    write_results(args.out, {"benchmark": "embeddings", "model": args.model, "batch_size": args.batch_size,
+                             "threads": args.threads, "k": args.k, "rows": rows})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: recall@k vs latency for the FAISS engine (flat / IVF / HNSW) against Chroma.
+
+Builds each store over the same synthetic corpus (half public, half internal),
+then runs analyst-style (public-only) queries and compares the hits with an
+exact numpy top-k. IVF and HNSW are swept over nprobe / efSearch. Also reports
+build time, cold-open time (memory-mapped for FAISS) and size on disk.
+Runs fully offline.
+
+    python -m scripts.bench_faiss --docs 20000 --queries 200 --k 5
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from backend.rag.faiss_store import FaissStore
+from backend.rag.vectorstore import access_filter, _dir_size
+from scripts.bench_utils import HashingEmbeddings, synthetic_docs, latency_summary, write_results
+
+
+def as_documents(docs: list[dict]) -> list[Document]:
+    return [Document(page_content=d["text"], metadata={"id": d["id"], "access": d["access"], "version": "v1",
+                                                       "chunk_id": f"{d['id']}@v1#0"}) for d in docs]
+
+def fill(store, docs: list[dict], batch: int = 1000) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch):
+        part = docs[i:i + batch]
+        store.add_documents(as_documents(part), ids=[f"{d['id']}@v1#0" for d in part])
+    if hasattr(store, "persist"):
+        store.persist()
+    return time.perf_counter() - start
+
+def evaluate(store, queries: list[str], truth: list[set], k: int) -> dict:
+    where = access_filter(["public"])
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        hits = store.similarity_search_with_score(q, k=k, filter=where)
+        latencies.append(time.perf_counter() - t0)
+        recalls.append(len(expected & {d.metadata["id"] for d, _ in hits}) / k)
+    return {"recall_at_k": round(float(np.mean(recalls)), 4), **latency_summary(latencies)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--out", default=None, help="optional JSON results path")
+    args = parser.parse_args()
+
+    embeddings = HashingEmbeddings()
+    docs = synthetic_docs(args.docs // 2, "public", "pub") + synthetic_docs(args.docs - args.docs // 2, "internal", "int")
+    queries = [d["text"][:200] for d in synthetic_docs(args.queries, "public", "q", seed=1)]
+
+    public = [d for d in docs if d["access"] == "public"]
+    mat = np.array(embeddings.embed_documents([d["text"] for d in public]), dtype=np.float32)
+    qmat = np.array(embeddings.embed_documents(queries), dtype=np.float32)
+    truth = [{public[i]["id"] for i in np.argsort(-(mat @ q))[:args.k]} for q in qmat]
+
+    # train IVF once a partition has all its vectors, not on the first ingest batch
+    train_at = args.docs // 2
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not args.skip_chroma:
+            path = os.path.join(tmpdir, "chroma")
+            build_s = fill(Chroma(persist_directory=path, embedding_function=embeddings), docs)
+            t0 = time.perf_counter()
+            store = Chroma(persist_directory=path, embedding_function=embeddings)
+            open_s = time.perf_counter() - t0
+            rows.append({"engine": "chroma", "params": {}, "build_s": round(build_s, 3), "open_s": round(open_s, 3),
+                         "disk_bytes": _dir_size(path), **evaluate(store, queries, truth, args.k)})
+
+        for index_type, sweep_key, sweep in (("flat", None, [None]), ("ivf", "nprobe", args.nprobe),
+                                             ("hnsw", "ef_search", args.ef_search)):
+            path = os.path.join(tmpdir, f"faiss_{index_type}")
+            build_s = fill(FaissStore(path, embeddings, index_type=index_type, ivf_min_train=train_at), docs)
+            t0 = time.perf_counter()
+            store = FaissStore(path, embeddings, index_type=index_type, ivf_min_train=train_at, mmap=True)
+            open_s = time.perf_counter() - t0
+            for value in sweep:
+                params = {sweep_key: value} if sweep_key else {}
+                store.set_search_params(**params)
+                rows.append({"engine": f"faiss_{index_type}", "params": params, "build_s": round(build_s, 3),
+                             "open_s": round(open_s, 3), "disk_bytes": _dir_size(path),
+                             **evaluate(store, queries, truth, args.k)})
+
+    print(f"{'engine':>11} {'params':>16} | {'recall@k':>8} | {'p50 ms':>8} {'p95 ms':>8} | {'build s':>8} {'open s':>7} {'MiB':>7}")
+    for r in rows:
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['engine']:>11} {params:>16} | {r['recall_at_k']:>8.3f} | {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} | "
+              f"{r['build_s']:>8.2f} {r['open_s']:>7.3f} {r['disk_bytes'] / 2**20:>7.1f}")
+    write_results(args.out, {"benchmark": "faiss", "docs": args.docs, "k": args.k, "rows": rows})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: regulation-domain shard routing vs global search.
+
+Builds a corpus of pseudo-documents per regulation domain (sentences of one
+sample_docs file each, tagged at ingest by the domain classifier), then runs
+passage queries twice: searching everything, and routed to the planner's
+predicted domain shards with the same fallback as RegiPipeline.retrieve().
+Reports hit@k, overlap with the global top-k, latency, how often queries were
+routed / fell back, and ingest tagging accuracy. Runs fully offline.
+
+    python -m scripts.bench_routing --docs 20000 --queries 300 --engine faiss
+"""
+import argparse
+import random
+import tempfile
+import time
+from collections import Counter
+from langchain_core.documents import Document
+
+from backend.rag.domains import classify_document, predict_domains
+from backend.rag.vectorstore import VectorStoreHandle, hybrid_search
+from scripts.bench_utils import SAMPLE_DIR, HashingEmbeddings, latency_summary, write_results
+
+DOMAIN_FILES = {"gdpr": "gdpr_", "hipaa": "hipaa_", "iso27001": "iso27001_", "mca": "mca_", "sebi": "sebi_"}
+
+
+def domain_sentences() -> dict:
+    out = {}
+    for domain, prefix in DOMAIN_FILES.items():
+        lines = []
+        for path in sorted(SAMPLE_DIR.glob(f"{prefix}*.txt")):
+            lines += [l.strip() for l in path.read_text(encoding="utf-8").splitlines() if len(l.split()) >= 4]
+        out[domain] = lines
+    return out
+
+def build_corpus(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    sentences = domain_sentences()
+    docs = []
+    for i in range(n):
+        domain = list(DOMAIN_FILES)[i % len(DOMAIN_FILES)]
+        picked = rng.sample(sentences[domain], k=min(3, len(sentences[domain])))
+        # a few rare tokens per doc so passage queries have one right answer
+        salt = " ".join(f"ref{rng.randrange(10**6):06d}" for _ in range(3))
+        docs.append({"id": f"doc_{i:06d}", "text": " ".join(picked) + " " + salt, "access": "public",
+                     "truth": domain})
+    return docs
+
+def build_queries(docs: list[dict], n: int, seed: int = 1) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        d = rng.choice(docs)
+        words = d["text"].split()
+        start = rng.randrange(max(1, len(words) - 15))
+        out.append((" ".join(words[start:start + 15]), d["id"]))
+    return out
+
+def routed_search(query: str, k: int, store: VectorStoreHandle, outcomes: Counter) -> list[dict]:
+    """Mirror of RegiPipeline.retrieve(): predicted shards first, global search when unsure or short."""
+    domains, _ = predict_domains(query)
+    if domains:
+        docs = hybrid_search(query, k=k, allowed_access=["public"], store=store, domains=domains)
+        if len(docs) >= k:
+            outcomes["routed"] += 1
+            return docs
+        outcomes["fallback"] += 1
+    else:
+        outcomes["global"] += 1
+    return hybrid_search(query, k=k, allowed_access=["public"], store=store)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--engine", default="chroma", choices=["chroma", "faiss"])
+    parser.add_argument("--out", default=None, help="optional JSON results path")
+    args = parser.parse_args()
+
+    docs = build_corpus(args.docs)
+    queries = build_queries(docs, args.queries)
+    tags = {d["id"]: classify_document(d) for d in docs}
+    tag_accuracy = sum(tags[d["id"]] == d["truth"] for d in docs) / len(docs)
+    truth = {d["id"]: d["truth"] for d in docs}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = VectorStoreHandle(persist_directory=tmpdir, embeddings=HashingEmbeddings(), engine=args.engine)
+        for i in range(0, len(docs), 500):
+            batch = docs[i:i + 500]
+            store.add([Document(page_content=d["text"],
+                                metadata={"id": d["id"], "access": "public", "version": "v1", "domain": tags[d["id"]],
+                                          "chunk_id": f"{d['id']}@v1#0"}) for d in batch],
+                      ids=[f"{d['id']}@v1#0" for d in batch])
+
+        rows, global_hits = [], {}
+        for mode in ("global", "routed"):
+            outcomes: Counter = Counter()
+            latencies, hits, overlap, route_correct = [], [], [], []
+            for query, expected in queries:
+                t0 = time.perf_counter()
+                if mode == "global":
+                    got = hybrid_search(query, k=args.k, allowed_access=["public"], store=store)
+                else:
+                    got = routed_search(query, args.k, store, outcomes)
+                latencies.append(time.perf_counter() - t0)
+                ids = [d["id"] for d in got]
+                hits.append(expected in ids)
+                if mode == "global":
+                    global_hits[query] = set(ids)
+                else:
+                    overlap.append(len(global_hits[query] & set(ids)) / args.k)
+                    predicted, _ = predict_domains(query)
+                    if predicted:
+                        route_correct.append(truth[expected] in predicted)
+            row = {"mode": mode, "hit_at_k": round(sum(hits) / len(hits), 3), **latency_summary(latencies)}
+            if mode == "routed":
+                row.update({
+                    "overlap_with_global": round(sum(overlap) / len(overlap), 3),
+                    "routed": round(outcomes["routed"] / len(queries), 3),
+                    "fallback": round(outcomes["fallback"] / len(queries), 3),
+                    "global": round(outcomes["global"] / len(queries), 3),
+                    "route_accuracy": round(sum(route_correct) / len(route_correct), 3) if route_correct else None,
+                })
+            rows.append(row)
+
+    print(f"ingest tagging accuracy: {tag_accuracy:.3f}")
+    print(f"{'mode':>7} | {'hit@k':>6} | {'p50 ms':>8} {'p95 ms':>8} | {'routed':>6} {'fallbk':>6} {'global':>6} | "
+          f"{'route acc':>9} {'overlap':>7}")
+    for r in rows:
+        print(f"{r['mode']:>7} | {r['hit_at_k']:>6.3f} | {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} | "
+              f"{r.get('routed', 0):>6.2f} {r.get('fallback', 0):>6.2f} {r.get('global', 1):>6.2f} | "
+              f"{r.get('route_accuracy') or 0:>9.3f} {r.get('overlap_with_global', 1):>7.3f}")
+    write_results(args.out, {"benchmark": "domain_routing", "engine": args.engine, "docs": args.docs, "k": args.k,
+                             "tag_accuracy": round(tag_accuracy, 3), "rows": rows})
+
+if __name__ == "__main__":
+    main()
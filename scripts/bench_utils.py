@@ -0,0 +1,54 @@
+import json
+import random
+from pathlib import Path
+import numpy as np
+
+from backend.rag.fakes import HashingEmbeddings  # noqa: F401  (re-exported for benchmarks)
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "sample_docs"
+
+
+# --- Synthetic corpus ---
+def sample_sentences() -> list[str]:
+    out = []
+    for path in sorted(SAMPLE_DIR.glob("*.txt")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if len(line.split()) >= 5:
+                out.append(line)
+    return out
+
+def synthetic_docs(n: int, access: str, prefix: str, seed: int = 0) -> list[dict]:
+    """Shuffle sample_docs sentences into n distinct pseudo-documents."""
+    rng = random.Random(f"{seed}:{prefix}")
+    sentences = sample_sentences()
+    docs = []
+    for i in range(n):
+        picked = rng.sample(sentences, k=min(3, len(sentences)))
+        words = " ".join(picked).split()
+        rng.shuffle(words)
+        docs.append({"id": f"{prefix}_{i:06d}", "text": " ".join(words), "access": access})
+    return docs
+
+
+# --- Reporting ---
+def percentile(values: list[float], p: float) -> float:
+    return float(np.percentile(values, p)) if values else 0.0
+
+def latency_summary(values: list[float]) -> dict:
+    """Seconds in, milliseconds out."""
+    ms = [v * 1000 for v in values]
+    return {
+        "n": len(ms),
+        "mean_ms": round(float(np.mean(ms)), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+    }
+
+def write_results(path: str | None, results):
+    if not path:
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
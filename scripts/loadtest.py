@@ -0,0 +1,217 @@
+"""
+Offline load test for the RegiGuard API.
+
+For each corpus size this seeds a throwaway database + vector store from
+sample_docs/, starts uvicorn with the fake chat model and hashing embeddings
+(no OpenAI calls), drives /query, /feedback and /admin/add_doc at the given
+concurrency and role mix, and reports p50/p95/p99 latency, QPS and per-stage
+pipeline timings. Results are written as JSON for run-to-run comparison.
+
+    python -m scripts.loadtest --docs 1000 10000 --concurrency 32 --requests 1000
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import subprocess
+import httpx
+
+from scripts.bench_utils import synthetic_docs, sample_sentences, latency_summary, write_results
+
+USERS = {"admin": "adminpass", "officer": "officerpass", "analyst": "analystpass"}
+STAGES = ("encode", "plan", "retrieve", "answer", "reflect")
+
+
+def parse_mix(spec: str) -> dict:
+    """'a=0.5,b=0.5' -> {'a': 0.5, 'b': 0.5}"""
+    out = {}
+    for part in spec.split(","):
+        key, _, weight = part.partition("=")
+        out[key.strip()] = float(weight or 1)
+    return out
+
+def pick(rng: random.Random, mix: dict) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+# --- Seeding (runs in a subprocess with the benchmark environment) ---
+def seed(n_docs: int, internal_ratio: float, batch: int = 500):
+    from backend.db import init_db, get_session_ctx
+    from backend.auth import hash_password
+    from backend.models import User
+    from backend.rag.vectorstore import add_documents
+
+    init_db()
+    with get_session_ctx() as session:
+        for username, password in USERS.items():
+            session.add(User(username=username, hashed_password=hash_password(password), role=username))
+        session.commit()
+
+    n_internal = int(n_docs * internal_ratio)
+    docs = synthetic_docs(n_docs - n_internal, "public", "pub") + synthetic_docs(n_internal, "internal", "int")
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch):
+        add_documents(docs[i:i + batch])
+    print(json.dumps({"seed_s": round(time.perf_counter() - start, 3), "docs": len(docs)}))
+
+def bench_env(workdir: str, args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_DIR": os.path.join(workdir, "chroma_db"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'regiguard.db')}",
+        "LLM_BACKEND": "fake",
+        "EMBED_BACKEND": "hash",
+        "REFLECT_MODEL": "hash",
+        "FAKE_LLM_LATENCY_S": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_S": str(args.token_rate),
+        "ANSWER_CACHE_ENABLED": "true" if args.cache else "false",
+        "COMPACT_INTERVAL_S": "0",
+    })
+    return env
+
+def start_server(env: dict, port: int, timeout: float = 120.0) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        time.sleep(0.5)
+    proc.terminate()
+    raise TimeoutError("uvicorn did not become healthy in time")
+
+# --- Load driver ---
+async def drive(base_url: str, args) -> dict:
+    rng = random.Random(args.seed)
+    role_mix, op_mix = parse_mix(args.role_mix), parse_mix(args.op_mix)
+    questions = sample_sentences()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        tokens = {}
+        for username, password in USERS.items():
+            r = await client.post("/token", data={"username": username, "password": password})
+            r.raise_for_status()
+            tokens[username] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        latencies = {op: [] for op in op_mix}
+        errors = {op: 0 for op in op_mix}
+        stages = {s: [] for s in STAGES}
+        query_ids: list = []
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int):
+            op = pick(rng, op_mix)
+            if op == "feedback" and not query_ids:
+                op = "query"
+            role = "admin" if op == "add_doc" else pick(rng, role_mix)
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    if op == "query":
+                        r = await client.post("/query", headers=tokens[role],
+                                              json={"question": rng.choice(questions), "max_docs": args.k})
+                    elif op == "feedback":
+                        r = await client.post("/feedback", headers=tokens[role], json={
+                            "query_id": rng.choice(query_ids), "feedback": "useful", "comments": "loadtest"})
+                    else:
+                        doc = synthetic_docs(1, "public", f"lt{i}", seed=i)[0]
+                        r = await client.post("/admin/add_doc", headers=tokens["admin"], json=[doc])
+                    elapsed = time.perf_counter() - t0
+                    if r.status_code != 200:
+                        errors[op] += 1
+                        return
+                except httpx.HTTPError:
+                    errors[op] += 1
+                    return
+            latencies[op].append(elapsed)
+            if op == "query":
+                body = r.json()
+                query_ids.append(body.get("query_id"))
+                for stage in STAGES:
+                    if (body.get("timings") or {}).get(f"{stage}_s") is not None:
+                        stages[stage].append(body["timings"][f"{stage}_s"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall = time.perf_counter() - start
+
+    return {
+        "wall_s": round(wall, 3),
+        "qps": round(sum(len(v) for v in latencies.values()) / wall, 2) if wall else 0.0,
+        "endpoints": {
+            op: {**latency_summary(lat), "qps": round(len(lat) / wall, 2) if wall else 0.0, "errors": errors[op]}
+            for op, lat in latencies.items()
+        },
+        "stages": {s: latency_summary(v) for s, v in stages.items() if v},
+    }
+
+def run_size(n_docs: int, args, port: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="regiguard-bench-") as workdir:
+        env = bench_env(workdir, args)
+        out = subprocess.run(
+            [sys.executable, "-m", "scripts.loadtest", "--seed-only", str(n_docs),
+             "--internal-ratio", str(args.internal_ratio)],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        seeded = json.loads(out.stdout.strip().splitlines()[-1])
+        server = start_server(env, port)
+        try:
+            result = asyncio.run(drive(f"http://127.0.0.1:{port}", args))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return {"docs": n_docs, **seeded, **result}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--role-mix", default="analyst=0.5,officer=0.4,admin=0.1")
+    parser.add_argument("--op-mix", default="query=0.85,feedback=0.1,add_doc=0.05")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--internal-ratio", type=float, default=0.5)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=80, help="fake LLM tokens per second")
+    parser.add_argument("--cache", action="store_true", help="leave the answer cache enabled")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results path (default bench_results/loadtest-<ts>.json)")
+    parser.add_argument("--seed-only", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed_only is not None:
+        seed(args.seed_only, args.internal_ratio)
+        return
+
+    started = datetime.datetime.utcnow()
+    config = {k: v for k, v in vars(args).items() if k not in ("seed_only", "out")}
+    runs = []
+    for n in args.docs:
+        print(f"--- corpus: {n} docs ---")
+        row = run_size(n, args, args.port)
+        runs.append(row)
+        q = row["endpoints"].get("query", {})
+        print(f"seed {row['seed_s']}s | {row['qps']} req/s | query p50 {q.get('p50_ms')}ms "
+              f"p95 {q.get('p95_ms')}ms p99 {q.get('p99_ms')}ms | errors "
+              f"{sum(e['errors'] for e in row['endpoints'].values())}")
+        for stage, summary in row["stages"].items():
+            print(f"    {stage:<9} p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms")
+
+    out = args.out or f"bench_results/loadtest-{started.strftime('%Y%m%dT%H%M%S')}.json"
+    write_results(out, {"benchmark": "loadtest", "started_at": started.isoformat(), "config": config, "runs": runs})
+
+if __name__ == "__main__":
+    main()
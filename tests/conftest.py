@@ -0,0 +1,42 @@
+import os
+
+# offline stand-ins (backend/rag/fakes.py), set before any backend module reads its config
+os.environ.setdefault("EMBED_BACKEND", "hash")
+os.environ.setdefault("REFLECT_MODEL", "hash")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_S", "0")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_S", "0")
+
+import pytest  # noqa: E402
+
+from backend.rag.fakes import HashingEmbeddings  # noqa: E402
+from backend.rag.vectorstore import VectorStoreHandle  # noqa: E402
+
+# one public and one internal MCA doc, one public GDPR doc
+DOCS = [
+    {"id": "annual-return", "access": "public",
+     "text": "Form MGT-7 is the annual return. File Form 8 within 60 days of the annual general meeting."},
+    {"id": "board-minutes", "access": "internal",
+     "text": "Board minutes record Form 8 filing decisions and the annual general meeting agenda."},
+    {"id": "breach", "access": "public",
+     "text": "Article 33 requires notifying a personal data breach to the supervisory authority within 72 hours."},
+]
+
+
+def open_store(directory, engine: str = "faiss") -> VectorStoreHandle:
+    store = VectorStoreHandle(persist_directory=str(directory), embeddings=HashingEmbeddings(), engine=engine)
+    store.open()
+    return store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return open_store(tmp_path / "store")
+
+
+@pytest.fixture
+def pipeline(store, monkeypatch):
+    """RegiPipeline with the fake LLM and hash models over a fresh store."""
+    from backend.rag import pipeline as pipeline_module
+    monkeypatch.setattr(pipeline_module, "get_store", lambda: store)
+    return pipeline_module.RegiPipeline()
@@ -0,0 +1,58 @@
+import numpy as np
+from conftest import open_store
+
+from backend.rag.cache import AnswerCache, make_scope
+from backend.rag.fakes import HashingEmbeddings
+from backend.rag.vectorstore import add_documents
+
+EMBED = HashingEmbeddings()
+DOC = {"id": "annual-return", "access": "public", "text": "Form MGT-7 is the annual return, due within 60 days."}
+
+
+def _vec(text: str) -> np.ndarray:
+    return np.asarray(EMBED.embed_query(text), dtype=np.float32)
+
+
+def _result(doc_id: str, version: str) -> dict:
+    return {"answer": "Within 60 days.", "docs": [{"metadata": {"id": doc_id, "version": version}}]}
+
+
+def test_hits_stay_within_their_access_scope():
+    cache = AnswerCache(threshold=0.9)
+    q = "When is the annual return due?"
+    cache.put(q, make_scope(["public"], 3), _vec(q), _result("annual-return", "v1"))
+
+    assert cache.get("  when is the ANNUAL return due ", make_scope(["public"], 3)) is not None
+    assert cache.get(q, make_scope(["public", "internal"], 3), _vec(q)) is None
+    assert cache.get(q, make_scope(["public"], 5), _vec(q)) is None
+    stats = cache.stats()
+    assert stats["hits_exact"] == 1 and stats["misses"] == 2
+
+
+def test_invalidation_drops_citing_and_uncited_answers():
+    cache = AnswerCache()
+    scope = make_scope(["public"], 3)
+    cache.put("a", scope, _vec("a"), _result("annual-return", "v1"))
+    cache.put("b", scope, _vec("b"), _result("breach", "v1"))
+    cache.put("c", scope, _vec("c"), {"answer": "Not covered.", "docs": []})
+
+    cache.invalidate_docs(["annual-return"])
+    assert cache.get("a", scope) is None and cache.get("c", scope) is None
+    assert cache.get("b", scope) is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_hit_citing_a_version_replaced_elsewhere_is_dropped(tmp_path):
+    mine = open_store(tmp_path / "store")
+    other = open_store(tmp_path / "store")
+    version = add_documents([DOC], store=mine)[0]["version"]
+
+    # not subscribed to the store: only the per-hit version check can catch the change
+    cache = AnswerCache()
+    scope = make_scope(["public"], 3)
+    cache.put("due date", scope, _vec("due date"), _result("annual-return", version))
+    assert cache.get("due date", scope, is_live=mine.is_live) is not None
+
+    add_documents([dict(DOC, text=DOC["text"] + " Late filing attracts a fee.")], store=other)
+    assert cache.get("due date", scope, is_live=mine.is_live) is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from backend.rag.facts import FactIndex, extract_facts, question_form_keys
+
+CALENDAR = (Path(__file__).resolve().parent.parent / "sample_docs" / "mca_compliance_calendar.txt").read_text(
+    encoding="utf-8")
+
+
+def _index(tmp_path) -> FactIndex:
+    index = FactIndex(str(tmp_path / "facts.db"))
+    index.replace([{"id": "mca_compliance_calendar", "version": "v1", "access": "public", "domain": "mca",
+                    "facts": extract_facts(CALENDAR)}])
+    return index
+
+
+def test_tied_facts_are_all_returned(tmp_path):
+    facts = _index(tmp_path).lookup("What is the deadline for filing the annual return?", "deadline", ["public"])
+    forms = {f["form"] for f in facts}
+    assert "MGT-7" in forms
+    assert len({f["coverage"] for f in facts}) == 1
+
+
+def test_form_reference_selects_that_form(tmp_path):
+    facts = _index(tmp_path).lookup("When is MGT-7 due?", "deadline", ["public"])
+    assert [f["form"] for f in facts] == ["MGT-7"]
+    assert question_form_keys("Form 8 penalty") == ["form8"]
+    assert question_form_keys("Is aoc4 due?") == ["formaoc4"]
+
+
+def test_phrases_that_only_look_like_form_references():
+    assert question_form_keys("What changed in 2024?") == []
+    assert question_form_keys("Deadline under Article 33") == []
+    assert question_form_keys("Must breaches be reported within 72 hours?") == []
+
+
+def test_unknown_form_falls_back_to_term_matching(tmp_path):
+    facts = _index(tmp_path).lookup("Form MGT-9 deadline for the annual return", "deadline", ["public"])
+    assert "MGT-7" in {f["form"] for f in facts}
@@ -0,0 +1,38 @@
+from conftest import DOCS, open_store
+
+from backend.rag.vectorstore import add_documents, query_vectorstore
+
+
+def _ids(hits):
+    return [h["id"] for h in hits]
+
+
+def test_chunks_land_in_access_and_domain_shards(store):
+    add_documents(DOCS, store=store)
+    parts = store.stats()["faiss"]["partitions"]
+    assert {name: p["vectors"] for name, p in parts.items()} == {"public.mca": 1, "internal.mca": 1, "public.gdpr": 1}
+
+    assert _ids(query_vectorstore("Form 8 board minutes", k=3, allowed_access=["public"], store=store)) \
+        == ["annual-return", "breach"]
+    assert _ids(query_vectorstore("Form 8 filing", k=3, allowed_access=["public"], store=store,
+                                  domains=["gdpr"])) == ["breach"]
+    assert _ids(query_vectorstore("Form 8 board minutes", k=1, allowed_access=["public", "internal"],
+                                  store=store, domains=["mca"])) == ["board-minutes"]
+
+
+def test_retired_doc_disappears_at_once_and_compaction_purges_its_shard(tmp_path):
+    store = open_store(tmp_path / "store")
+    add_documents(DOCS, store=store)
+
+    store.retire("breach")
+    assert "breach" not in _ids(query_vectorstore("Article 33 breach", k=3, allowed_access=["public"], store=store))
+    assert store.stats()["faiss"]["partitions"]["public.gdpr"]["vectors"] == 1   # still on disk
+
+    report = store.compact()
+    assert report["tombstones_purged"] == 1 and report["vectors_removed"] == 1
+    assert store.stats()["faiss"]["partitions"]["public.gdpr"]["vectors"] == 0
+
+    reopened = open_store(tmp_path / "store")
+    assert "public.gdpr" not in reopened.stats()["faiss"]["partitions"]
+    assert _ids(query_vectorstore("annual return", k=3, allowed_access=["public", "internal"], store=reopened)) \
+        == ["annual-return", "board-minutes"]
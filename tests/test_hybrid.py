@@ -0,0 +1,64 @@
+from conftest import DOCS, open_store
+
+from backend.rag.bm25 import BM25Index
+from backend.rag.faiss_store import matches
+from backend.rag.vectorstore import add_documents, hybrid_search, keyword_search, rank_fuse, search_filter
+
+
+def test_rank_fusion_rewards_chunks_found_by_both_retrievers():
+    dense = [{"id": "a", "chunk_id": "a#0", "score": 0.1}, {"id": "b", "chunk_id": "b#0", "score": 0.2}]
+    keyword = [{"id": "b", "chunk_id": "b#0", "bm25": 3.0}, {"id": "c", "chunk_id": "c#0", "bm25": 2.0}]
+    fused = rank_fuse([dense, keyword], k=3)
+    assert [d["chunk_id"] for d in fused] == ["b#0", "a#0", "c#0"]
+    assert fused[0]["score"] == 0.0 and fused[0]["vector_score"] == 0.2
+    assert all(a["score"] <= b["score"] for a, b in zip(fused, fused[1:]))
+    assert len(rank_fuse([dense, keyword], k=1)) == 1
+
+
+def test_bm25_filters_by_access_and_tombstones():
+    index = BM25Index()
+    index.add(["p#0", "i#0"], ["form 8 filing deadline", "form 8 board notes"],
+              [{"id": "p", "access": "public", "version": "v1"}, {"id": "i", "access": "internal", "version": "v1"}])
+    assert {h["id"] for h in index.search("form 8", k=5)} == {"p", "i"}
+    assert [h["id"] for h in index.search("form 8", k=5, allowed_access=["public"])] == ["p"]
+    assert index.search("form 8", k=5, allowed_access=["public"], is_dead=lambda d, v: d == "p") == []
+
+
+def test_hybrid_search_respects_access_and_exact_identifiers(store):
+    add_documents(DOCS, store=store)
+    public = hybrid_search("Form 8 filing", k=3, allowed_access=["public"], store=store)
+    assert public and {d["id"] for d in public} <= {"annual-return", "breach"}
+    assert public[0]["id"] == "annual-return"
+    everyone = hybrid_search("Form 8 board minutes", k=3, allowed_access=["public", "internal"], store=store)
+    assert everyone[0]["id"] == "board-minutes"
+
+
+def test_tombstone_filter_spares_other_docs_with_the_same_version(store):
+    store.tombstones.add("breach", ["2024-01-01T00:00:00"])
+    where = search_filter(["public"], store)
+    assert not matches({"id": "breach", "version": "2024-01-01T00:00:00", "access": "public"}, where)
+    assert matches({"id": "annual-return", "version": "2024-01-01T00:00:00", "access": "public"}, where)
+    assert matches({"id": "breach", "version": "2024-02-01T00:00:00", "access": "public"}, where)
+
+
+def test_writes_through_one_handle_reach_another(tmp_path):
+    writer = open_store(tmp_path / "store")
+    reader = open_store(tmp_path / "store")
+    assert keyword_search("Article 33 breach", k=3, allowed_access=["public"], store=reader) == []
+
+    add_documents(DOCS, store=writer)
+    hits = keyword_search("Article 33 breach", k=3, allowed_access=["public"], store=reader)
+    assert hits[0]["id"] == "breach"
+    assert reader.domain_tagged()
+    heard = []
+    reader.subscribe(heard.extend)
+
+    writer.retire("breach")
+    assert [h["id"] for h in keyword_search("Article 33 breach", k=3, store=reader)] != ["breach"]
+    assert "breach" in heard
+
+    changed = [dict(DOCS[0], text=DOCS[0]["text"] + " Late filing attracts Rs 100 per day.")]
+    add_documents(changed, store=writer)
+    live = {c.split("#")[0] for c in writer.get_chunks({"id": "annual-return"})[0]}
+    hits = keyword_search("MGT-7 annual return", k=5, allowed_access=["public"], store=reader)
+    assert {h["chunk_id"].split("#")[0] for h in hits if h["id"] == "annual-return"} == live
@@ -0,0 +1,85 @@
+import asyncio
+
+from conftest import DOCS
+
+from backend.rag.vectorstore import add_documents
+
+
+def test_plan_matches_penalty_words_not_substrings(pipeline):
+    assert pipeline.plan("What is the fine for late filing of MGT-7?")["intent"] == "penalty_lookup"
+    assert pipeline.plan("Which penalties apply under Article 83?")["intent"] == "penalty_lookup"
+    assert pipeline.plan("Define a personal data breach")["intent"] == "general_lookup"
+    assert pipeline.plan("How do I refine my search?")["intent"] == "general_lookup"
+    assert pipeline.plan("When is the annual return due?")["intent"] == "deadline_lookup"
+
+
+def _count_llm_calls(pipeline, monkeypatch):
+    calls = []
+    for name in ("invoke", "ainvoke"):
+        original = getattr(pipeline.llm, name)
+        monkeypatch.setattr(pipeline.llm, name, lambda prompt, _f=original, **kw: calls.append(prompt) or _f(prompt, **kw))
+    return calls
+
+
+def test_gate_answers_relevant_questions_and_skips_the_llm_otherwise(pipeline, store, monkeypatch):
+    from backend.rag import pipeline as pipeline_module
+    add_documents(DOCS, store=store)
+    monkeypatch.setattr(pipeline_module, "RELEVANCE_GATE", "fail_fast")
+    calls = _count_llm_calls(pipeline, monkeypatch)
+
+    res = pipeline.run("Notify a personal data breach to the supervisory authority", k=1)
+    assert res["gate"]["decision"] == "pass" and res["ok"]
+    assert res["answer"] != pipeline_module.INSUFFICIENT_CONTEXT_ANSWER and len(calls) == 1
+
+    for _ in range(2):   # blocked answers are never cached
+        res = pipeline.run("xyzzy plugh quux", k=1)
+        assert res["gate"]["decision"] == "blocked" and not res["ok"] and not res["cached"]
+        assert res["answer"] == pipeline_module.INSUFFICIENT_CONTEXT_ANSWER
+    assert len(calls) == 1
+
+
+def test_gate_retry_widens_k_before_blocking(pipeline, store, monkeypatch):
+    from backend.rag import pipeline as pipeline_module
+    add_documents(DOCS, store=store)
+    monkeypatch.setattr(pipeline_module, "RELEVANCE_GATE", "retry")
+    monkeypatch.setattr(pipeline_module, "GATE_MAX_RETRIES", 1)
+    monkeypatch.setattr(pipeline_module, "GATE_RETRY_K_FACTOR", 3)
+
+    res = asyncio.run(pipeline.arun("xyzzy plugh quux", k=1, use_cache=False))
+    assert res["gate"] == {**res["gate"], "decision": "blocked", "k": 3, "attempts": 2}
+    assert {d["id"] for d in res["docs"]} == {"annual-return", "breach"}   # every public doc
+
+
+def test_identical_concurrent_queries_share_one_execution(pipeline, store, monkeypatch):
+    add_documents(DOCS, store=store)
+    monkeypatch.setattr(pipeline.llm, "latency_s", 0.05)
+    calls = _count_llm_calls(pipeline, monkeypatch)
+    question = "Notify a personal data breach to the supervisory authority"
+
+    async def burst():
+        same = [pipeline.arun(question, k=1, use_cache=False) for _ in range(4)]
+        other_scope = pipeline.arun(question, role="admin", k=1, use_cache=False)
+        return await asyncio.gather(*same, other_scope)
+
+    *same, other = asyncio.run(burst())
+    assert len(calls) == 2   # one execution per access scope
+    assert sorted(bool(r.get("coalesced")) for r in same) == [False, True, True, True]
+    assert len({r["answer"] for r in same}) == 1 and not other.get("coalesced")
+    same[0]["answer"] = "changed"   # each caller gets its own copy
+    assert same[1]["answer"] != "changed"
+
+
+def test_streaming_follower_is_answered_from_the_leaders_execution(pipeline, store, monkeypatch):
+    add_documents(DOCS, store=store)
+    monkeypatch.setattr(pipeline.llm, "latency_s", 0.05)
+    question = "Notify a personal data breach to the supervisory authority"
+
+    async def collect():
+        return [ev async for ev in pipeline.astream(question, k=1, use_cache=False)]
+
+    async def burst():
+        return await asyncio.gather(collect(), pipeline.arun(question, k=1, use_cache=False))
+
+    events, joined = asyncio.run(burst())
+    assert [ev["event"] for ev in events][0] == "docs" and events[-1]["event"] == "result"
+    assert joined["coalesced"] and joined["answer"] == events[-1]["result"]["answer"]
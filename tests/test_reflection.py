@@ -0,0 +1,60 @@
+import multiprocessing
+
+import numpy as np
+
+from backend.rag.fakes import HashingEmbeddings
+from backend.rag.reflection import ReflectionIndex
+
+MODEL = HashingEmbeddings(dim=64)
+
+
+def _texts(prefix: str, n: int):
+    return [f"{prefix}-{i}" for i in range(n)], [f"{prefix} chunk {i} about form {i} filing" for i in range(n)]
+
+
+def _ingest(directory: str, prefix: str, n: int, batch: int):
+    index = ReflectionIndex(directory, model="hash")
+    keys, texts = _texts(prefix, n)
+    for i in range(0, n, batch):
+        index.add_texts(keys[i:i + batch], texts[i:i + batch], model=MODEL)
+
+
+def test_concurrent_processes_never_share_rows(tmp_path):
+    directory = str(tmp_path / "reflection")
+    ReflectionIndex(directory, model="hash")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_ingest, args=(directory, prefix, 600, 25)) for prefix in ("a", "b")]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    index = ReflectionIndex(directory, model="hash")
+    for prefix in ("a", "b"):
+        keys, texts = _texts(prefix, 600)
+        stored, missing = index.get(keys)
+        assert missing == []
+        expected = MODEL.encode(texts).astype(np.float16).astype(np.float32)
+        assert np.allclose(stored, expected, atol=1e-3)
+
+
+def test_rows_added_elsewhere_and_compaction_are_picked_up(tmp_path):
+    directory = str(tmp_path / "reflection")
+    reader = ReflectionIndex(directory, model="hash")
+    writer = ReflectionIndex(directory, model="hash")
+    keys, texts = _texts("doc", 10)
+    writer.add_texts(keys, texts, model=MODEL)
+
+    docs = [{"text": t, "metadata": {"chunk_id": k}} for k, t in zip(keys, texts)]
+    vecs = reader.vectors_for(docs, model=MODEL)
+    assert reader._backfill == {}   # read from the shared sidecar, not re-encoded
+    assert np.allclose(vecs, MODEL.encode(texts), atol=1e-3)
+
+    writer.compact({keys[0]})
+    more_keys, more_texts = _texts("new", 3)
+    reader.add_texts(more_keys, more_texts, model=MODEL)
+    final = ReflectionIndex(directory, model="hash")
+    stored, missing = final.get(keys[1:] + more_keys)
+    assert missing == []
+    assert np.allclose(stored, MODEL.encode(texts[1:] + more_texts), atol=1e-3)